@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+# ==== 告警队列 ====
+# 信号评估只把告警放进内存队列就返回，推送交给后台线程，webhook 慢、限流、失败都拖不住下一根 bar：
+#   - 去重：同一标的同一条消息（消息里带信号 bar 的时间）只发一次，最近发过的键随队列一起落盘；
+#   - 合并：第一条告警到达后再等 window 秒，期间到的告警（多标的 / 连续几根 bar）合成尽量少的几条；
+#   - 限流：只有 429 / 5xx / 连接失败超时才重试，异常带 retry_after（http_io.HttpError）就按它等，否则指数退避，
+#     告警留在队列里不丢；其余 4xx（webhook 失效、消息被拒）重发也不会成功，可能已经送达的（异常带 maybe_sent，
+#     见 http_io）重发会推两遍，这两种都把这一组移进死信、记一次日志就跳过；
+#   - 落盘：未送达的告警写在本地 JSON（原子替换），崩溃或超时退出后，下次启动先补发；
+#   - 送达：入队时带上信号 bar 的收盘时刻（since），送达后把每条“收盘 → webhook 接收”的秒数交给 report。
+DISCORD_LIMIT = 2000  # 单条消息字数上限
+WINDOW = 1.0
+BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+SEEN_KEYS = 1000
+DEAD_LETTERS = 100
+
+def retryable(error):
+    # 没有状态码的（连接失败 / 超时 / 非 HTTP 异常）、429、5xx 值得重试；可能已经送达的不重试
+    if getattr(error, "maybe_sent", False):
+        return False
+    status = getattr(error, "status", None)
+    return status is None or status == 429 or status >= 500
+
+def chunk_alerts(alerts, limit=DISCORD_LIMIT):
+    # [(标的, 消息)] 按顺序分组，每组拼成一条消息不超过 limit
+    groups, group, size = [], [], 0
+    for symbol, msg in alerts:
+        line = f"{symbol} {msg}"
+        if group and size + len(line) + 1 > limit:
+            groups.append(group)
+            group, size = [], 0
+        group.append((symbol, msg))
+        size += len(line) + 1
+    if group:
+        groups.append(group)
+    return groups
+
+def format_batch(group):
+    return "\n".join(f"{symbol} {msg}" for symbol, msg in group)
+
+def batch_alerts(alerts, limit=DISCORD_LIMIT):
+    # [(标的, 消息)] 合并成尽量少的几条，每条不超过 Discord 上限
+    return [format_batch(group) for group in chunk_alerts(alerts, limit)]
+
+class AlertQueue:
+    # send(文本)：实际推送，失败抛异常；path 为 None 时不落盘；report(每条送达延迟秒数的列表) 在送达后调用
+    def __init__(self, send, path=None, window=WINDOW, limit=DISCORD_LIMIT, backoff=BACKOFF,
+                 max_backoff=MAX_BACKOFF, clock=time.monotonic, report=None, wall=time.time):
+        self.send = send
+        self.report = report
+        self.wall = wall
+        self.path = path
+        self.window = window
+        self.limit = limit
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.pending = []                   # [(键, 标的, 消息, 收盘时刻)]，只有发送线程从头部删
+        self.seen = deque(maxlen=SEEN_KEYS)  # 最近入队过的键
+        self.dead = deque(maxlen=DEAD_LETTERS)  # 被拒收的告警 [(键, 标的, 消息, 收盘时刻, 原因)]
+        self.first_at = 0.0                 # 队列由空变非空的时刻，合并窗口从这里算
+        self.retry_at = 0.0                 # 限流 / 失败后最早的重试时刻
+        self.failures = 0
+        self.sent = 0
+        self.messages = 0
+        self.dropped = 0
+        self.closing = False
+        self.stopped = False  # close 超时后发送线程退出，剩下的只留在盘上
+        self.cond = threading.Condition()
+        self._load()
+        self.thread = threading.Thread(target=self._run, name="alert-queue", daemon=True)
+        self.thread.start()
+
+    # ---- 落盘 ----
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.pending = [(tuple(item) + (None,))[:4] for item in saved.get("pending", [])]  # 旧文件没有收盘时刻
+        self.seen.extend(saved.get("seen", []))
+        self.dead.extend(tuple(item) for item in saved.get("dead", []))
+        if self.pending:
+            print(f"[通知] 补发上次未送达的告警 {len(self.pending)} 条")
+
+    def _save(self):
+        # 调用方持有 self.cond
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"pending": self.pending, "seen": list(self.seen), "dead": list(self.dead)}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print("[通知] 告警队列落盘失败：", e)
+
+    # ---- 入队 ----
+    def put(self, symbol, message, key=None, since=None):
+        # 不阻塞：去重、入队、落盘后立即返回；重复的返回 False。since 为信号 bar 收盘的 epoch 秒
+        key = key or f"{symbol} {message}"
+        with self.cond:
+            if key in self.seen:
+                self.dropped += 1
+                return False
+            if not self.pending:
+                self.first_at = self.clock()
+            self.seen.append(key)
+            self.pending.append((key, symbol, message, since))
+            self._save()
+            self.cond.notify_all()
+        return True
+
+    def __len__(self):
+        with self.cond:
+            return len(self.pending)
+
+    # ---- 发送线程 ----
+    def _next(self):
+        # 等到可以发：队列非空、合并窗口已过（关闭时不等）、不在重试等待里。返回本次要发的那组
+        with self.cond:
+            while True:
+                if self.stopped:
+                    return None
+                if not self.pending:
+                    if self.closing:
+                        return None
+                    self.cond.wait()
+                    continue
+                ready = max(self.retry_at, self.first_at + (0 if self.closing else self.window))
+                now = self.clock()
+                if now >= ready:
+                    return chunk_alerts([item[1:3] for item in self.pending], self.limit)[0]
+                self.cond.wait(ready - now)
+
+    def _run(self):
+        while True:
+            group = self._next()
+            if group is None:
+                return
+            try:
+                self.send(format_batch(group))
+            except Exception as e:
+                if not retryable(e):
+                    self._dead_letter(group, e)
+                    continue
+                wait = getattr(e, "retry_after", None)
+                if wait is None:
+                    wait = min(self.backoff * 2 ** self.failures, self.max_backoff)
+                print(f"[通知] 发送失败，{wait:g} 秒后重试：{e}")
+                with self.cond:
+                    self.failures += 1
+                    self.retry_at = self.clock() + wait
+                continue
+            done = self.wall()
+            with self.cond:
+                lags = [done - item[3] for item in self.pending[:len(group)] if item[3] is not None]
+                del self.pending[:len(group)]
+                self.failures = 0
+                self.sent += len(group)
+                self.messages += 1
+                self._save()
+                self.cond.notify_all()
+            if self.report is not None and lags:
+                self.report(lags)
+
+    def _dead_letter(self, group, error):
+        print(f"[通知] 发送被拒或可能已送达，{len(group)} 条告警移入死信不再重试：{error}")
+        with self.cond:
+            items = self.pending[:len(group)]
+            del self.pending[:len(group)]
+            self.dead.extend((*item, str(error)) for item in items)
+            self.failures = 0
+            self._save()
+            self.cond.notify_all()
+
+    # ---- 收尾 ----
+    def flush(self, timeout=None):
+        # 等队列发空；超时返回 False（剩下的已在盘上）
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while self.pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        # 不再等合并窗口，尽快发完；超时未送达的留在盘上，下次启动补发
+        with self.cond:
+            self.closing = True
+            self.cond.notify_all()
+        if not self.flush(timeout):
+            with self.cond:
+                self.stopped = True
+                self.cond.notify_all()
+            where = f"已保存到 {self.path}，下次启动补发" if self.path else "未落盘，已丢弃"
+            print(f"[通知] {len(self)} 条告警未送达，{where}")
+            return False
+        self.thread.join(timeout)
+        return True
@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from zoneinfo import ZoneInfo
+from strategy import INDICATOR_COLUMNS
+from condition_bits import COND_COLUMN
+
+# ==== 紧凑列式 K 线 ====
+# 一块预分配的连续内存装下整段数据：int64 纳秒时间戳、float64 价格列、指标列（float64，可选 float32）、
+# uint8 条件标记列（入场 / 出场 / 趋势中继 / 震荡）、uint32 子条件位图列 COND（condition_bits）。
+# 每列都是这块内存上的一段视图：
+#   - 指标内核直接写进列里（strategy.fill_indicators），不产生中间 DataFrame；
+#   - 去掉无效行在原地前移压缩，一次只动一列，没有整表拷贝；
+#   - 整块可以建在 SharedMemory 里给多个进程直接挂载（param_sweep），不复制。
+# 省内存只在指标列用 float32 时成立：一年 1 分钟线结果约 21 MiB，DataFrame 约 26 MiB；
+# float64 时多了标记列和 COND 列，反而略大（约 28 MiB），只用于要与 DataFrame 路径逐位一致的场合。
+# 所以回测命令行的 compact 默认 float32（spy_backtest.COMPACT_DTYPE），benchmark.py --memory 两种都报。
+EST = ZoneInfo("America/New_York")
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+FLAG_COLUMNS = ["call_entry", "put_entry", "call_exit", "put_exit", "call_cont", "put_cont", "sideways"]
+
+def _align8(n):
+    return -(-n // 8) * 8
+
+def _layout(capacity, n_prices, n_indicators, indicator_dtype, n_flags):
+    # 各块在缓冲区里的偏移（8 字节对齐）与总字节数
+    ts = 0
+    prices = ts + _align8(capacity * 8)
+    indicators = prices + _align8(n_prices * capacity * 8)
+    flags = indicators + _align8(n_indicators * capacity * np.dtype(indicator_dtype).itemsize)
+    cond = flags + _align8(n_flags * capacity)
+    return {"ts": ts, "prices": prices, "indicators": indicators, "flags": flags, "cond": cond,
+            "size": max(1, cond + _align8(capacity * 4))}
+
+class BarColumns:
+    def __init__(self, buffer, capacity, length, prices=PRICE_COLUMNS, indicators=INDICATOR_COLUMNS,
+                 flags=FLAG_COLUMNS, indicator_dtype=np.float64, shm=None, attrs=None):
+        self.buffer = buffer
+        self.capacity = capacity
+        self.length = length
+        self.prices, self.indicators, self.flags = list(prices), list(indicators), list(flags)
+        self.indicator_dtype = np.dtype(indicator_dtype)
+        self.shm = shm  # 建在共享内存里时持有句柄，防止被回收
+        self.attrs = attrs or {}  # 随数据保存的元数据（如 COND 的位布局）
+        lay = _layout(capacity, len(self.prices), len(self.indicators), self.indicator_dtype, len(self.flags))
+        self._ts = np.ndarray(capacity, np.int64, buffer, lay["ts"])
+        self._prices = np.ndarray((len(self.prices), capacity), np.float64, buffer, lay["prices"])
+        self._indicators = np.ndarray((len(self.indicators), capacity), self.indicator_dtype, buffer, lay["indicators"])
+        self._flags = np.ndarray((len(self.flags), capacity), np.uint8, buffer, lay["flags"])
+        self._cond = np.ndarray((1, capacity), np.uint32, buffer, lay["cond"])
+        self._where = {name: (self._prices, i) for i, name in enumerate(self.prices)}
+        self._where.update({name: (self._indicators, i) for i, name in enumerate(self.indicators)})
+        self._where.update({name: (self._flags, i) for i, name in enumerate(self.flags)})
+        self._where[COND_COLUMN] = (self._cond, 0)
+        self._index = None
+
+    # ---- 构建 ----
+    @classmethod
+    def allocate(cls, capacity, prices=PRICE_COLUMNS, indicators=INDICATOR_COLUMNS, flags=FLAG_COLUMNS,
+                 indicator_dtype=np.float64, shared=False):
+        # shared=True 时整块建在 SharedMemory 里，spec() 交给子进程 attach 即可
+        size = _layout(capacity, len(prices), len(indicators), indicator_dtype, len(flags))["size"]
+        shm = shared_memory.SharedMemory(create=True, size=size) if shared else None
+        buffer = shm.buf if shared else np.zeros(size, dtype=np.uint8)
+        bars = cls(buffer, capacity, capacity, prices, indicators, flags, indicator_dtype, shm)
+        bars._flags[:] = 0
+        bars._cond[:] = 0
+        return bars
+
+    @classmethod
+    def from_records(cls, rec, indicators=INDICATOR_COLUMNS, indicator_dtype=np.float64, shared=False):
+        # bar_store 的结构数组（ts + OHLCV）-> 列式；指标列留空（NaN），由 strategy.fill_indicators 填
+        bars = cls.allocate(len(rec), indicators=indicators, indicator_dtype=indicator_dtype, shared=shared)
+        bars._ts[:] = rec["ts"]
+        for name in bars.prices:
+            bars[name] = rec[name] if name in rec.dtype.names else np.nan
+        bars._indicators[:] = np.nan
+        return bars
+
+    @classmethod
+    def from_frame(cls, df, indicator_dtype=np.float64, shared=False):
+        indicators = [c for c in INDICATOR_COLUMNS if c in df.columns]
+        bars = cls.allocate(len(df), indicators=indicators, indicator_dtype=indicator_dtype, shared=shared)
+        bars._ts[:] = df.index.as_unit("ns").asi8
+        for name in bars.prices + indicators:
+            bars[name] = df[name].to_numpy(dtype=np.float64) if name in df.columns else np.nan
+        return bars
+
+    # ---- 列访问 ----
+    def __len__(self):
+        return self.length
+
+    def __contains__(self, name):
+        return name in self._where
+
+    def __getitem__(self, name):
+        block, i = self._where[name]
+        return block[i, :self.length]
+
+    def __setitem__(self, name, values):
+        self[name][...] = values
+
+    @property
+    def columns(self):
+        return self.prices + self.indicators + self.flags + [COND_COLUMN]
+
+    @property
+    def ts(self):
+        return self._ts[:self.length]
+
+    @property
+    def index(self):
+        # 信号文本 / 交易时段判断要用的 DatetimeIndex，按需构建并缓存
+        if self._index is None or len(self._index) != self.length:
+            index = pd.DatetimeIndex(self.ts.view("datetime64[ns]"), name="Datetime")
+            self._index = index.tz_localize("UTC").tz_convert(EST)
+        return self._index
+
+    @property
+    def nbytes(self):
+        # 实际占用（按当前行数，不含压缩后空出来的容量）
+        return self.length * (8 + 8 * len(self.prices) + self.indicator_dtype.itemsize * len(self.indicators)
+                              + len(self.flags) + 4)
+
+    # ---- 条件标记 ----
+    def set_flags(self, masks):
+        # masks：Strategy.masks 的返回值（布尔数组），存成 uint8
+        for name, mask in masks.items():
+            self[name] = mask
+
+    def flag_masks(self):
+        # uint8 -> bool 视图，不复制，可直接交给 run_position_machine
+        return {name: self[name].view(bool) for name in self.flags}
+
+    # ---- 原地压缩 ----
+    def take(self, keep):
+        # 只保留 keep 为 True 的行：逐列前移，临时内存只有一列大小
+        keep = np.asarray(keep, dtype=bool)
+        n = int(keep.sum())
+        if n == self.length:
+            return self
+        for block in (self._ts[None, :], self._prices, self._indicators, self._flags, self._cond):
+            for row in block:
+                row[:n] = row[:self.length][keep]
+        self.length = n
+        self._index = None
+        return self
+
+    def dropna(self, subset):
+        keep = np.ones(self.length, dtype=bool)
+        for name in subset:
+            keep &= ~np.isnan(self[name])
+        return self.take(keep)
+
+    # ---- 共享 ----
+    def _meta(self):
+        return {"capacity": self.capacity, "length": self.length, "prices": self.prices,
+                "indicators": self.indicators, "flags": self.flags, "indicator_dtype": self.indicator_dtype.str,
+                "attrs": self.attrs}
+
+    def spec(self):
+        # 可 pickle 的描述，子进程用 BarColumns.attach(spec) 挂载同一块共享内存
+        if self.shm is None:
+            raise ValueError("不在共享内存里，先用 allocate(..., shared=True)")
+        return dict(self._meta(), name=self.shm.name)
+
+    @classmethod
+    def attach(cls, spec):
+        shm = shared_memory.SharedMemory(name=spec["name"])
+        return cls(shm.buf, spec["capacity"], spec["length"], spec["prices"], spec["indicators"], spec["flags"],
+                   spec["indicator_dtype"], shm, spec["attrs"])
+
+    def close(self, unlink=False):
+        # 释放共享内存句柄；创建方用完后 unlink。外面还拿着列视图时 SharedMemory 会拒绝关闭
+        if self.shm is not None:
+            self._ts = self._prices = self._indicators = self._flags = self._cond = self._where = self.buffer = None
+            self._index = None
+            self.shm.close()
+            if unlink:
+                self.shm.unlink()
+            self.shm = None
+
+    def to_frame(self):
+        return pd.DataFrame({name: self[name] for name in self.prices + self.indicators}, index=self.index)
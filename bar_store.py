@@ -0,0 +1,203 @@
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from market_calendar import get_calendar
+from bar_validation import BarValidator, revised_bars
+
+# ==== 本地分钟线仓库 ====
+# 按 标的/交易日 分区，每天一个结构化 .npy（已转美东时区、已去重），读取时 mmap。
+# 已收盘的交易日下载一次后永久复用；当天（仍在交易/盘后）只补拉最后几分钟之后的增量。
+# 读出的每一天都经过 bar_validation 校验（缺失分钟 / 零成交 / 修订），落盘的仍是数据源原样。
+EST = ZoneInfo("America/New_York")
+UTC = ZoneInfo("UTC")
+BAR_STORE = os.environ.get("BAR_STORE", os.path.join(".cache", "bars"))
+FINAL_AFTER = time(20, 5)  # 盘后 20:00 结束，留 5 分钟给数据源落地
+REQUEST_DAYS = 7  # yfinance 1 分钟线单次请求最多 8 天，按 7 个自然日切
+REVISION_MINUTES = 5  # 当天补拉时往回多要几分钟，与缓存比对发现数据源修订过的 bar
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+BAR_DTYPE = np.dtype([("ts", "<i8")] + [(c, "<f8") for c in COLUMNS])
+
+# ==== 数据源 ====
+def normalize_bars(df):
+    # 与原 fetch_data/get_data 相同的清洗：拍平列、转美东、去重
+    if df is None or df.empty:
+        return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], tz=EST, name="Datetime"))
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df.index.name = "Datetime"
+    if df.index.tz is None:
+        df.index = df.index.tz_localize("UTC").tz_convert(EST)
+    else:
+        df.index = df.index.tz_convert(EST)
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    return df[[c for c in COLUMNS if c in df.columns]]
+
+def yfinance_provider(symbol, start, end):
+    # 用 Ticker.history 而不是 yf.download：后者共用模块级结果表，多线程并发会串数据
+    import yfinance as yf
+    return yf.Ticker(symbol).history(
+        interval="1m",
+        start=start.astimezone(UTC).replace(tzinfo=None),
+        end=end.astimezone(UTC).replace(tzinfo=None),
+        prepost=True, auto_adjust=True,
+    )
+
+class FrameProvider:
+    # 离线数据源：从给定 DataFrame 切片返回，记录每次请求区间
+    def __init__(self, df):
+        self.df = normalize_bars(df.copy())
+        self.calls = []
+
+    def __call__(self, symbol, start, end):
+        self.calls.append((symbol, start, end))
+        idx = self.df.index
+        return self.df[(idx >= start) & (idx < end)].copy()
+
+# ==== 仓库 ====
+def _day_bounds(day):
+    start = datetime.combine(day, time(0, 0), tzinfo=EST)
+    return start, datetime.combine(day + timedelta(days=1), time(0, 0), tzinfo=EST)
+
+def _to_records(df):
+    rec = np.empty(len(df), dtype=BAR_DTYPE)
+    rec["ts"] = df.index.as_unit("ns").asi8
+    for c in COLUMNS:
+        rec[c] = df[c].to_numpy(dtype=np.float64) if c in df.columns else np.nan
+    return rec
+
+def to_frame(rec):
+    ts = np.ascontiguousarray(rec["ts"]).view("datetime64[ns]")
+    index = pd.DatetimeIndex(ts, name="Datetime").tz_localize("UTC").tz_convert(EST)
+    return pd.DataFrame({c: np.asarray(rec[c]) for c in COLUMNS}, index=index)
+
+class BarStore:
+    def __init__(self, root=BAR_STORE, provider=yfinance_provider, validator=None):
+        self.root = root
+        self.provider = provider
+        self.validator = validator or BarValidator()
+
+    def _path(self, symbol, day, partial=False):
+        name = f"{day.isoformat()}.partial.npy" if partial else f"{day.isoformat()}.npy"
+        return os.path.join(self.root, symbol, name)
+
+    def _write(self, path, rec):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp.npy"
+        np.save(tmp, rec)
+        os.replace(tmp, path)
+
+    def _read(self, path):
+        return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+    def is_final(self, day, now):
+        now = now.astimezone(EST)
+        return day < now.date() or (day == now.date() and now.time() >= FINAL_AFTER)
+
+    def _fetch_days(self, symbol, days):
+        # 连续缺失的交易日合并成一次请求，单次请求不超过 REQUEST_DAYS 个自然日
+        runs, run = [], []
+        for d in days:
+            if run and ((d - run[-1]).days > 4 or (d - run[0]).days >= REQUEST_DAYS):
+                runs.append(run); run = []
+            run.append(d)
+        if run:
+            runs.append(run)
+        for run in runs:
+            start, _ = _day_bounds(run[0])
+            _, end = _day_bounds(run[-1])
+            df = normalize_bars(self.provider(symbol, start, end))
+            by_day = dict(iter(df.groupby(df.index.date))) if len(df) else {}
+            for d in run:
+                # 数据源没给数据的收盘日也落一个空文件作“无数据”标记，之后不再重复请求；
+                # 有当天盘中缓存就拿它顶上。删掉该文件即可重新下载
+                if d in by_day:
+                    rec = _to_records(by_day[d])
+                else:
+                    cached = self._read(self._path(symbol, d, partial=True))
+                    rec = np.array(cached) if cached is not None else np.empty(0, dtype=BAR_DTYPE)
+                self._write(self._path(symbol, d), rec)
+                partial = self._path(symbol, d, partial=True)
+                if os.path.exists(partial):
+                    os.remove(partial)
+
+    def _refresh_open_day(self, symbol, day, now):
+        # 当天：已有部分数据就从最后一根（可能未走完）往前 REVISION_MINUTES 分钟开始补拉；
+        # 重叠部分里最后一根之前的 bar 数值变了记为修订（最后一根本来就可能没走完，不算）。
+        # 只替换数据源这次返回了的 bar：返回空（限流 / 短暂故障）时缓存原样保留、不重写
+        path = self._path(symbol, day, partial=True)
+        cached = self._read(path)
+        start, _ = _day_bounds(day)
+        if cached is not None and len(cached):
+            last = int(cached["ts"][-1])
+            start = max(start, pd.Timestamp(last - REVISION_MINUTES * 60_000_000_000, tz="UTC")
+                        .tz_convert(EST).to_pydatetime())
+        fresh = normalize_bars(self.provider(symbol, start, now.astimezone(EST)))
+        if cached is not None and len(cached):
+            old = to_frame(np.array(cached))
+            if not len(fresh):
+                return old
+            settled = np.array(cached[cached["ts"] < last])
+            self.validator.note_revised(symbol, day, revised_bars(settled, _to_records(fresh)))
+            fresh = pd.concat([old, fresh])
+            fresh = fresh[~fresh.index.duplicated(keep='last')].sort_index()
+        if len(fresh):
+            self._write(path, _to_records(fresh))
+        return fresh
+
+    def _day_records(self, symbol, start_date, end_date, now=None):
+        # [(交易日, 当天结构数组)]，没有数据的日子不返回；已收盘的日子是只读 mmap
+        now = now or datetime.now(tz=EST)
+        calendar = get_calendar(start_date, end_date)
+        days = [d for d in pd.date_range(start_date, end_date, freq="D").date
+                if calendar.is_session_day(d)]
+        final = [d for d in days if self.is_final(d, now)]
+        missing = [d for d in final if not os.path.exists(self._path(symbol, d))]
+        if missing:
+            self._fetch_days(symbol, missing)
+
+        parts = []
+        for d in days:
+            if d in final:
+                rec = self._read(self._path(symbol, d))
+                if rec is not None and len(rec):
+                    parts.append((d, self.validator.apply(symbol, d, rec, calendar)))
+            else:
+                fresh = self._refresh_open_day(symbol, d, now)
+                if len(fresh):
+                    parts.append((d, self.validator.apply(symbol, d, _to_records(fresh), calendar, live=True)))
+        return parts
+
+    def fetch_records(self, symbol, start_date, end_date, now=None):
+        # 整段结构数组（ts + OHLCV），没有数据返回 None；给 bar_columns.BarColumns.from_records 用
+        parts = [rec for _, rec in self._day_records(symbol, start_date, end_date, now)]
+        if not parts:
+            return None
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    def fetch(self, symbol, start_date, end_date, now=None):
+        rec = self.fetch_records(symbol, start_date, end_date, now)
+        return normalize_bars(None) if rec is None else to_frame(rec)
+
+    def validate_frame(self, symbol, df):
+        # 不从仓库取的现成分钟线（如回放的参考回测）按同一策略校验，结果与 fetch 取出的一致
+        if df.empty:
+            return df
+        validator = BarValidator(self.validator.gaps, self.validator.zero_volume)
+        calendar = get_calendar(df.index[0].date(), df.index[-1].date())
+        parts = [validator.apply(symbol, d, _to_records(part), calendar) for d, part in df.groupby(df.index.date)]
+        return to_frame(np.concatenate(parts))
+
+    def iter_records(self, symbol, start_date, end_date, chunk_days=REQUEST_DAYS, now=None):
+        # 长区间按块拉取、逐个交易日产出 (日期, 当天结构数组)，不转 DataFrame
+        day = start_date
+        while day <= end_date:
+            stop = min(end_date, day + timedelta(days=chunk_days - 1))
+            yield from self._day_records(symbol, day, stop, now)
+            day = stop + timedelta(days=1)
+
+    def iter_days(self, symbol, start_date, end_date, chunk_days=REQUEST_DAYS, now=None):
+        # 同上，产出 (日期, 当天分钟线)，内存里同时只有一块
+        for day, rec in self.iter_records(symbol, start_date, end_date, chunk_days, now):
+            yield day, to_frame(rec)
@@ -0,0 +1,161 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from zoneinfo import ZoneInfo
+
+# ==== 分钟线校验 ====
+# bar_store 每取出一天的结构数组（ts + OHLCV）都先过这里，回测（整段 / 紧凑 / 流式 / 并行）和实盘看到的是同一份数据：
+#   - 缺失分钟：按日历的常规时段（半日市按实际收盘）生成应有的分钟网格，与实际时间戳比对；
+#     BAR_GAPS=flag 只记录，fill 补一根平价 bar（OHLC 取上一根收盘，量 0），EMA20 / RSI / 震荡回看按时间对齐；
+#   - 零成交：常规时段外成交量为 0 的 bar（数据源重复报价），BAR_ZERO_VOLUME=drop 时去掉，默认保留只计数；
+#   - 修订：当天增量补拉时与本地缓存重叠比对（bar_store.REVISION_MINUTES），已入库的 bar 数值变了记为修订，
+#     实盘据此重建指标引擎。
+# 当天的数据按 (标的, 日期) 记住已经查到哪一分钟，每个 tick 只查新来的几根；已收盘的日子一次查完不留状态。
+EST = ZoneInfo("America/New_York")
+MINUTE_NS = 60_000_000_000
+GAP_POLICY = os.environ.get("BAR_GAPS", "flag")
+ZERO_VOLUME_POLICY = os.environ.get("BAR_ZERO_VOLUME", "keep")
+PRICE_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+
+def session_grid(calendar, lo_ns, hi_ns):
+    # [lo_ns, hi_ns] 内常规时段每分钟的起点（纳秒，升序）
+    i0 = int(np.searchsorted(calendar.close_ns, lo_ns, side="right"))
+    i1 = int(np.searchsorted(calendar.open_ns, hi_ns, side="right"))
+    opens, closes = calendar.open_ns[i0:i1], calendar.close_ns[i0:i1]
+    counts = np.maximum((closes - opens) // MINUTE_NS, 0)
+    if not counts.sum():
+        return np.empty(0, dtype=np.int64)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    grid = np.repeat(opens, counts) + (np.arange(counts.sum()) - first) * MINUTE_NS
+    return grid[(grid >= lo_ns) & (grid <= hi_ns)]
+
+def _present(ts, minutes):
+    # minutes 里每个时间戳是否在升序的 ts 里
+    pos = np.searchsorted(ts, minutes)
+    ok = pos < len(ts)
+    ok[ok] = ts[pos[ok]] == minutes[ok]
+    return ok
+
+def missing_minutes(ts, grid):
+    return grid[~_present(ts, grid)]
+
+def zero_volume_mask(rec, calendar):
+    # 常规时段外、成交量为 0 的 bar
+    ts = np.asarray(rec["ts"])
+    pos = np.searchsorted(calendar.open_ns, ts, side="right") - 1
+    regular = pos >= 0
+    regular[regular] = ts[regular] < calendar.close_ns[pos[regular]]
+    return ~regular & (np.asarray(rec["Volume"]) == 0)
+
+def revised_bars(old, new):
+    # 两份结构数组都有的时间戳里，OHLCV 任一不同（NaN 与 NaN 视为相同）的那些
+    common, i, j = np.intersect1d(old["ts"], new["ts"], assume_unique=True, return_indices=True)
+    changed = np.zeros(len(common), dtype=bool)
+    for c in PRICE_FIELDS:
+        a, b = np.asarray(old[c])[i], np.asarray(new[c])[j]
+        changed |= (a != b) & ~(np.isnan(a) & np.isnan(b))
+    return common[changed]
+
+def fill_gaps(rec, missing):
+    # 在缺失的分钟插入平价 bar：OHLC 取前一根收盘（当天第一根之前缺的取第一根开盘），量 0
+    if not len(missing):
+        return rec
+    at = np.searchsorted(rec["ts"], missing)
+    rows = np.empty(len(missing), dtype=rec.dtype)
+    rows["ts"] = missing
+    price = np.where(at > 0, np.asarray(rec["Close"])[np.maximum(at - 1, 0)],
+                     np.asarray(rec["Open"])[np.minimum(at, len(rec) - 1)])
+    for c in ("Open", "High", "Low", "Close"):
+        rows[c] = price
+    rows["Volume"] = 0.0
+    return np.insert(rec, at, rows)
+
+def _clock(ts_ns):
+    return pd.Timestamp(int(ts_ns), tz="UTC").tz_convert(EST).strftime("%H:%M")
+
+class BarValidator:
+    def __init__(self, gaps=GAP_POLICY, zero_volume=ZERO_VOLUME_POLICY, verbose=True):
+        if gaps not in ("flag", "fill") or zero_volume not in ("keep", "drop"):
+            raise ValueError(f"未知的校验策略：BAR_GAPS={gaps} BAR_ZERO_VOLUME={zero_volume}")
+        self.gaps = gaps
+        self.zero_volume = zero_volume
+        self.verbose = verbose
+        self.checked = {}   # (标的, 日期) -> 已校验到的最后一根时间戳
+        self.missing = {}   # (标的, 日期) -> 已发现仍缺的分钟
+        self.revised = {}   # 标的 -> 还没被取走的修订时间戳，见 take_revised
+        self.counted = set()  # 已计入 stats 的已收盘交易日（流式回测会把同一天读两遍）
+        self.stats = {"gaps": 0, "zero_volume": 0, "revised": 0}
+        self.lock = threading.RLock()  # scan_symbols 多线程同时取不同标的
+
+    def __getstate__(self):
+        # 并行回测把 BarStore 连同校验器交给子进程，锁不能 pickle
+        return {k: v for k, v in self.__dict__.items() if k != "lock"}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    def _log(self, symbol, day, what, ts):
+        if self.verbose and len(ts):
+            head = "、".join(_clock(t) for t in ts[:5]) + (" …" if len(ts) > 5 else "")
+            print(f"[数据] {symbol} {day} {what} {len(ts)} 根：{head}")
+
+    def note_revised(self, symbol, day, ts):
+        # bar_store 补拉时发现的修订
+        with self.lock:
+            self._revise(symbol, day, ts)
+
+    def _revise(self, symbol, day, ts):
+        if len(ts):
+            self.stats["revised"] += len(ts)
+            self.revised[symbol] = np.union1d(self.revised.get(symbol, np.empty(0, dtype=np.int64)), ts)
+            self._log(symbol, day, "修订", ts)
+
+    def take_revised(self, symbol):
+        # 取走并清空该标的的修订时间戳（实盘据此判断指标状态是否要重建）
+        with self.lock:
+            return self.revised.pop(symbol, None)
+
+    def apply(self, symbol, day, rec, calendar, live=False):
+        # 返回校验 / 补齐后的结构数组（没有要改的直接返回原数组，不复制）。
+        # live=True（当天、还在增长）时只查上次之后的新 bar，已发现的缺口留到后面每次一起补
+        if not len(rec):
+            return rec
+        ts = np.asarray(rec["ts"])
+        key = (symbol, day)
+        with self.lock:
+            lo = self.checked.get(key) if live else None
+            start = 0 if lo is None else int(np.searchsorted(ts, lo, side="right"))
+            grid = session_grid(calendar, ts[0] if lo is None else lo + 1, ts[-1])
+            new_gaps = missing_minutes(ts, grid)
+            zero = zero_volume_mask(rec, calendar)
+            if live or key not in self.counted:
+                self.stats["zero_volume"] += int(zero[start:].sum())
+                self.stats["gaps"] += len(new_gaps)
+                if not live:
+                    self.counted.add(key)
+
+            missing = new_gaps
+            if live:
+                self._log(symbol, day, "缺失分钟", new_gaps)
+                known = self.missing.get(key, np.empty(0, dtype=np.int64))
+                late = known[_present(ts, known)]
+                if len(late):
+                    # 之前缺的分钟后来补到了（迟到的 bar / 替换补上的平价 bar），对已喂过的指标等于修订
+                    self._revise(symbol, day, late)
+                missing = np.union1d(known[~_present(ts, known)], new_gaps)
+                self.missing[key] = missing
+                self.checked[key] = int(ts[-1])
+
+        if self.zero_volume == "drop" and zero.any():
+            rec = rec[~zero]
+        if self.gaps == "fill":
+            rec = fill_gaps(rec, missing)
+        return rec
+
+    def summary(self):
+        s = self.stats
+        return (f"缺失分钟 {s['gaps']}（{'已补齐' if self.gaps == 'fill' else '仅标记'}），"
+                f"盘前盘后零成交 {s['zero_volume']}（{'已丢弃' if self.zero_volume == 'drop' else '保留'}），"
+                f"修订 {s['revised']}")
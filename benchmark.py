@@ -0,0 +1,362 @@
+import os
+import sys
+import re
+import atexit
+import subprocess
+import shutil
+import json
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+# ==== 基准测试 ====
+# 确定性的合成 1 分钟线（04:00–19:59，工作日），分 1 天 / 1 月 / 1 年 / 10 年四档，
+# 对指标、震荡判断、信号状态机、逐行回测、实盘单次 tick 计时，记录吞吐（bar/s）和峰值内存，
+# 与基线文件对比，变慢或内存上涨超过容差直接以非零状态退出。
+EST = ZoneInfo("America/New_York")
+BASELINE = os.environ.get("BENCH_BASELINE", "benchmark_baseline.json")
+SIZES = {"1d": 1, "1m": 21, "1y": 252, "10y": 2520}
+DEFAULT_SIZES = ["1d", "1m", "1y"]
+TOLERANCE = 0.3
+STARTUP_TARGET_MS = 200
+HEAVY_MODULES = ("numpy", "pandas", "pandas_ta", "pandas_market_calendars", "requests", "yfinance")
+MINUTES = 16 * 60  # 04:00–19:59
+
+# ==== 合成数据 ====
+def synthetic_bars(days, seed=0, start="2015-01-02"):
+    rng = np.random.default_rng(seed)
+    day_starts = pd.bdate_range(start, periods=days).as_unit("ns").asi8 + 4 * 3600 * 10**9
+    offsets = np.arange(MINUTES, dtype=np.int64) * 60 * 10**9
+    wall = (day_starts[:, None] + offsets[None, :]).ravel()
+    index = pd.DatetimeIndex(wall.view("datetime64[ns]"), name="Datetime").tz_localize(EST)
+    n = len(index)
+    close = 600 + np.cumsum(rng.normal(0, 0.15, n))
+    return pd.DataFrame({
+        "Open": close + rng.normal(0, 0.05, n),
+        "High": close + np.abs(rng.normal(0, 0.08, n)),
+        "Low": close - np.abs(rng.normal(0, 0.08, n)),
+        "Close": close,
+        "Volume": rng.integers(1000, 100000, n).astype(np.float64),
+    }, index=index)
+
+# ==== 测试项 ====
+# 每项：setup(df) 准备输入（不计时），run(ctx) 被计时，返回处理的 bar 数；max_size 限制慢项的最大档位
+def _setup_indicators(df):
+    from strategy import add_indicators
+    return add_indicators(df).dropna(subset=['RSI', 'RSI_SLOPE', 'MACD', 'MACDh', 'EMA20', 'K', 'D'])
+
+def _setup_signals(df):
+    from strategy import Strategy
+    from market_calendar import get_calendar
+    full = _setup_indicators(df)
+    return full, Strategy(), get_calendar(full.index[0].date(), full.index[-1].date())
+
+def _run_rsi(df):
+    from strategy import compute_rsi
+    compute_rsi(df['Close'])
+    return len(df)
+
+def _run_macd(df):
+    from strategy import compute_macd
+    compute_macd(df['Close'])
+    return len(df)
+
+def _run_kdj(df):
+    from strategy import compute_kdj
+    compute_kdj(df['High'], df['Low'], df['Close'])
+    return len(df)
+
+def _run_sideways(df):
+    from fast_backtest import sideways_mask
+    sideways_mask(df)
+    return len(df)
+
+def _run_signals(ctx):
+    from fast_backtest import session_masks
+    df, strategy, calendar = ctx
+    active, near_close = session_masks(df.index, calendar)
+    strategy.run(df, active, near_close)
+    return len(df)
+
+def _run_backtest_loop(ctx):
+    from strategy import reference_signals
+    df, strategy, calendar = ctx
+    reference_signals(df, strategy, calendar)
+    return len(df)
+
+def _setup_live_tick(df):
+    # 最后一个交易日整天：本地仓库 + 只返回“当时”数据的数据源，逐分钟跑实盘 get_data + generate_signal
+    from bar_store import BarStore, FrameProvider
+    day = df[df.index.date == df.index[-1].date()]
+    root = tempfile.mkdtemp(prefix="bench_bars_")
+    atexit.register(shutil.rmtree, root, ignore_errors=True)
+    return day, BarStore(root, FrameProvider(day))
+
+def _run_live_tick(ctx):
+    import spy_signal_bot_v4 as bot
+    from stream_indicators import IndicatorEngine
+    day, store = ctx
+    engine = IndicatorEngine()
+    state = {"position": "none"}
+    closes = pd.date_range(day.index[0] + timedelta(minutes=40), day.index[-1], freq="1min")
+    for close in closes:
+        df = bot.get_data(now=close + timedelta(seconds=5), engine=engine, bars=store, closed_only=True)
+        bot.generate_signal(df, state)
+    return len(closes)
+
+def _setup_tick_stream(df):
+    from tick_stream import bars_to_ticks
+    return bars_to_ticks(df)
+
+def _run_tick_stream(ticks):
+    # 逐笔聚合成 1 分钟 bar（bars_to_ticks 每根 3–4 笔），按收盘的 bar 数计吞吐
+    from tick_stream import BarAggregator
+    agg = BarAggregator()
+    on_tick = agg.on_tick
+    bars = sum(1 for ts, price, size in ticks if on_tick("SPY", ts, price, size) is not None)
+    return bars + len(agg.close_due(float("inf")))
+
+def _identity(df):
+    return df
+
+CASES = {
+    "compute_rsi": (_identity, _run_rsi, None),
+    "compute_macd": (_identity, _run_macd, None),
+    "compute_kdj": (_identity, _run_kdj, None),
+    "is_sideways": (_setup_indicators, _run_sideways, None),
+    "signals": (_setup_signals, _run_signals, None),
+    "backtest_loop": (_setup_signals, _run_backtest_loop, "1m"),
+    "live_tick": (_setup_live_tick, _run_live_tick, "1d"),
+    "tick_stream": (_setup_tick_stream, _run_tick_stream, "1y"),
+}
+
+# ==== 冷启动 ====
+# 一次性机器人盘后退出的整个进程：-X importtime 统计各模块导入耗时，另计进程总墙钟时间，
+# 同时检查盘后路径没有拉起任何重型库。时段表先在本进程里建好，子进程只读缓存。
+STARTUP_SCRIPT = """
+import sys
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from live_clock import FakeClock
+import spy_signal_bot_v4 as bot
+bot.main(clock=FakeClock(datetime({stamp}, tzinfo=ZoneInfo("America/New_York"))))
+print("HEAVY=" + ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+def startup_benchmark(now=(2025, 10, 18, 21, 0), repeat=5):
+    from market_calendar import get_calendar
+    day = datetime(*now[:3]).date()
+    get_calendar(day, day)
+    code = STARTUP_SCRIPT.format(stamp=", ".join(map(str, now)), heavy=HEAVY_MODULES)
+    env = dict(os.environ, METRICS_FILE="")
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                              env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+        wall = time.perf_counter() - t0
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr[-2000:])
+        if best is None or wall < best["wall_ms"] / 1000:
+            best = {"wall_ms": wall * 1000, "stderr": proc.stderr, "stdout": proc.stdout}
+    # importtime 行格式：import time: self [us] | cumulative | 模块（缩进表示层级），顶层模块的累计值相加即总导入耗时
+    imports = []
+    for line in best["stderr"].splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if m:
+            imports.append((m.group(4), int(m.group(2)), len(m.group(3))))
+    top = [(name, us) for name, us, depth in imports if depth == 1]
+    heavy = next((l[6:] for l in best["stdout"].splitlines() if l.startswith("HEAVY=")), "")
+    return {"wall_ms": best["wall_ms"], "import_ms": sum(us for _, us in top) / 1000,
+            "slowest": sorted(top, key=lambda x: -x[1])[:5], "heavy": [m for m in heavy.split(",") if m]}
+
+def format_startup(r, target_ms=STARTUP_TARGET_MS):
+    lines = [f"盘后冷启动：进程总耗时 {r['wall_ms']:.0f} ms（目标 < {target_ms} ms），模块导入 {r['import_ms']:.0f} ms"]
+    lines += [f"  {name:<32}{us / 1000:>8.1f} ms" for name, us in r["slowest"]]
+    if r["heavy"]:
+        lines.append("  盘后路径加载了重型库：" + ", ".join(r["heavy"]))
+    return "\n".join(lines)
+
+# ==== 内存占用 ====
+# 同一段结构数组（bar_store 的本地仓库格式）分别走 DataFrame 路径（to_frame + add_indicators + dropna，
+# 即 fetch_data）和紧凑列式路径（BarColumns + fill_indicators + 原地 dropna + 条件标记），
+# 记 tracemalloc 峰值与结果本身占的内存
+REQUIRED = ['High', 'Low', 'Close', 'RSI', 'RSI_SLOPE', 'MACD', 'MACDh', 'EMA20', 'K', 'D']
+
+def _frame_path(rec):
+    from bar_store import to_frame
+    from strategy import add_indicators
+    df = add_indicators(to_frame(rec))
+    df.dropna(subset=REQUIRED, inplace=True)
+    return df, int(df.memory_usage(index=True, deep=True).sum())
+
+def _compact_path(rec, dtype):
+    from bar_columns import BarColumns
+    from strategy import Strategy, fill_indicators
+    bars = fill_indicators(BarColumns.from_records(rec, indicator_dtype=dtype)).dropna(REQUIRED)
+    bars.set_flags(Strategy().masks(bars))
+    return bars, bars.buffer.nbytes
+
+def memory_benchmark(size="1y", seed=0):
+    from bar_store import BAR_DTYPE
+    df = synthetic_bars(SIZES[size], seed)
+    rec = np.empty(len(df), dtype=BAR_DTYPE)
+    rec["ts"] = df.index.as_unit("ns").asi8
+    for c in df.columns:
+        rec[c] = df[c].to_numpy()
+    del df
+    runs = [("DataFrame", lambda: _frame_path(rec)),
+            ("BarColumns float64", lambda: _compact_path(rec, np.float64)),
+            ("BarColumns float32", lambda: _compact_path(rec, np.float32))]
+    out = []
+    for name, run in runs:
+        run()  # 预热（模块导入、缓存）不计入
+        tracemalloc.start()
+        result, footprint = run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        out.append({"name": name, "bars": len(result), "peak": peak, "footprint": footprint})
+        del result
+    return out
+
+def format_memory(rows):
+    # 第一行是 DataFrame 基准，紧凑路径逐个标出结果是否比它小
+    base = rows[0]
+    lines = [f"{'路径':<22}{'bar 数':>10}{'峰值 MiB':>12}{'结果 MiB':>12}{'结果占比':>10}"]
+    for r in rows:
+        mark = "" if r is base else ("  ✅ 省内存" if r["footprint"] < base["footprint"] else "  ⚠️ 比 DataFrame 大")
+        lines.append(f"{r['name']:<22}{r['bars']:>10}{r['peak'] / 2**20:>12.1f}{r['footprint'] / 2**20:>12.1f}"
+                     f"{r['footprint'] / base['footprint']:>10.0%}{mark}")
+    return "\n".join(lines)
+
+# ==== 计时 ====
+def measure(run, ctx, repeat=3):
+    # 吞吐取 repeat 次中最快的一次；峰值内存单独跑一次（tracemalloc 会拖慢计时）
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        bars = run(ctx)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    run(ctx)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"bars": bars, "seconds": best, "bars_per_s": bars / best if best else float("inf"),
+            "peak_mb": peak / 2**20}
+
+def run_suite(sizes=DEFAULT_SIZES, cases=None, seed=0):
+    results = {}
+    order = list(SIZES)
+    for size in sizes:
+        df = synthetic_bars(SIZES[size], seed=seed)
+        for name, (setup, run, max_size) in CASES.items():
+            if cases and name not in cases:
+                continue
+            if max_size and order.index(size) > order.index(max_size):
+                continue
+            repeat = 3 if SIZES[size] <= 21 else 1
+            results[f"{name}/{size}"] = measure(run, setup(df), repeat)
+    return results
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    # 返回退化项列表：吞吐低于基线 (1 - 容差) 或峰值内存高于基线 (1 + 容差)
+    regressions = []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if r["bars_per_s"] < base["bars_per_s"] * (1 - tolerance):
+            regressions.append(f"{key} 吞吐 {r['bars_per_s']:,.0f} < 基线 {base['bars_per_s']:,.0f} bar/s")
+        if r["peak_mb"] > base["peak_mb"] * (1 + tolerance) and r["peak_mb"] - base["peak_mb"] > 1:
+            regressions.append(f"{key} 峰值内存 {r['peak_mb']:.1f} > 基线 {base['peak_mb']:.1f} MB")
+    return regressions
+
+def format_results(results, baseline=None):
+    lines = [f"{'项目':<24}{'bar 数':>12}{'耗时 s':>10}{'bar/s':>14}{'峰值 MB':>10}{'基线 bar/s':>14}"]
+    for key, r in results.items():
+        base = (baseline or {}).get(key)
+        lines.append(f"{key:<24}{r['bars']:>12,}{r['seconds']:>10.3f}{r['bars_per_s']:>14,.0f}{r['peak_mb']:>10.1f}"
+                     + (f"{base['bars_per_s']:>14,.0f}" if base else f"{'-':>14}"))
+    return "\n".join(lines)
+
+def load_baseline(path=BASELINE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_baseline(results, path=BASELINE):
+    baseline = load_baseline(path)
+    baseline.update({k: {"bars_per_s": r["bars_per_s"], "peak_mb": r["peak_mb"]} for k, r in results.items()})
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+# ==== 命令行 ====
+OPTIONS = ("sizes", "cases", "update", "tolerance", "baseline", "allow-missing-baseline",
+           "startup", "target", "memory", "size")
+
+def parse_args(argv):
+    # --键=值 / --开关；不带 -- 的 1d / 1m / 1y / 10y 等同 --sizes。未知参数直接报错，不悄悄跑默认档位
+    args, sizes = {}, []
+    for a in argv:
+        if not a.startswith("-") and a in SIZES:
+            sizes.append(a)
+            continue
+        key, _, value = a.lstrip("-").partition("=")
+        if not a.startswith("-") or key not in OPTIONS:
+            sys.exit(f"[错误] 未知参数：{a}（可用：{' / '.join(SIZES)}，--" + "，--".join(OPTIONS) + "）")
+        args[key] = value
+    if sizes:
+        args["sizes"] = ",".join(filter(None, [args.get("sizes")] + sizes))
+    unknown = [x for x in (args.get("sizes") or "").split(",") + [args.get("size") or ""] if x and x not in SIZES]
+    if unknown:
+        sys.exit(f"[错误] 未知档位：{'、'.join(unknown)}（可用：{' / '.join(SIZES)}）")
+    return args
+
+if __name__ == "__main__":
+    # python benchmark.py [1d 1m 1y 10y | --sizes=1d,1m] [--cases=compute_rsi,...] [--update] [--tolerance=0.3]
+    #                     [--baseline=路径] [--allow-missing-baseline]
+    # python benchmark.py --startup [--target=200]
+    # python benchmark.py --memory [--size=1y]
+    args = parse_args(sys.argv[1:])
+    if "startup" in args:
+        target = float(args.get("target") or STARTUP_TARGET_MS)
+        r = startup_benchmark()
+        print(format_startup(r, target))
+        if r["heavy"] or r["wall_ms"] > target:
+            print("❌ 冷启动超出目标")
+            sys.exit(1)
+        print("✅ 冷启动达标")
+        sys.exit(0)
+    if "memory" in args:
+        print(format_memory(memory_benchmark(args.get("size") or "1y")))
+        sys.exit(0)
+    sizes = args["sizes"].split(",") if args.get("sizes") else DEFAULT_SIZES
+    cases = args["cases"].split(",") if args.get("cases") else None
+    tolerance = float(args.get("tolerance") or TOLERANCE)
+    path = args.get("baseline") or BASELINE
+
+    results = run_suite(sizes, cases)
+    baseline = load_baseline(path)
+    print(format_results(results, baseline))
+    if "update" in args:
+        save_baseline(results, path)
+        print(f"基线已更新：{path}")
+        sys.exit(0)
+    if not baseline:
+        # 没有基线就没法判断退化，CI 里当失败处理；确实只想看数字时加 --allow-missing-baseline
+        print(f"{'⚠️' if 'allow-missing-baseline' in args else '❌'} 没有基线文件 {path}，用 --update 生成")
+        sys.exit(0 if "allow-missing-baseline" in args else 1)
+    regressions = compare(results, baseline, tolerance)
+    if regressions:
+        print("❌ 性能退化：")
+        for r in regressions:
+            print("  " + r)
+        sys.exit(1)
+    print("✅ 未超出基线容差")
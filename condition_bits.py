@@ -0,0 +1,146 @@
+import numpy as np
+from fast_backtest import (sideways_terms, call_entry_terms, put_entry_terms, trend_continuation_terms,
+                           decay_exit_terms, threshold_exit_terms)
+from timeframes import agreement_masks
+
+# ==== 条件位图 ====
+# 入场 / 出场 / 趋势中继 / 震荡的每个子条件占一位，整段一次向量化算出、打包成 uint32，
+# 跟 bar 存在一起（DataFrame 的 COND 列，BarColumns 的 COND 列）。每条规则就是若干位全为 1，
+# Strategy.masks 与从位图还原的结果逐位一致。事后回答“除了 K>D 都满足的有几次”“最常挡住入场的是哪条”
+# 只做整数位运算，不用重算指标，也不用逐行跑。
+COND_COLUMN = "COND"
+RULES = ("call_entry", "put_entry", "call_exit", "put_exit", "call_cont", "put_cont", "sideways")
+EXIT_TERMS = {"threshold": threshold_exit_terms, "decay": decay_exit_terms}
+
+def rule_terms(df, strategy):
+    # {规则: [(键, 说明, 布尔数组)]}，与 Strategy.masks 同一套子条件
+    call_cont, put_cont = trend_continuation_terms(df)
+    call_exit, put_exit = EXIT_TERMS[strategy.version](df)
+    call_entry = call_entry_terms(df, strategy.rsi_call, strategy.slope)
+    put_entry = put_entry_terms(df, strategy.rsi_put, -strategy.slope)
+    if strategy.confirm:
+        up, down = agreement_masks(df, strategy.confirm)
+        frames = "/".join(f"{m}m" for m in strategy.confirm)
+        call_entry.append(("htf", f"{frames} 趋势向上", up))
+        put_entry.append(("htf", f"{frames} 趋势向下", down))
+    return dict(call_entry=call_entry, put_entry=put_entry, call_exit=call_exit, put_exit=put_exit,
+                call_cont=call_cont, put_cont=put_cont,
+                sideways=sideways_terms(df, strategy.sideways_window, strategy.sideways_price, strategy.sideways_ema))
+
+class ConditionBits:
+    # bits：每根 bar 一个 uint32；keys / labels：第 i 位的键（规则.子条件）与说明；rules：{规则: 该规则用到的位号}
+    def __init__(self, bits, keys, labels, rules):
+        self.bits = np.asarray(bits, dtype=np.uint32)
+        self.keys = list(keys)
+        self.labels = list(labels)
+        self.rules = {rule: list(ids) for rule, ids in rules.items()}
+
+    @classmethod
+    def compute(cls, df, strategy):
+        bits = np.zeros(len(df), dtype=np.uint32)
+        keys, labels, rules = [], [], {}
+        for rule, terms in rule_terms(df, strategy).items():
+            rules[rule] = []
+            for key, label, arr in terms:
+                i = len(keys)
+                if i >= 32:
+                    raise ValueError("子条件超过 32 个，uint32 放不下")
+                bits |= arr.astype(np.uint32) << np.uint32(i)
+                keys.append(f"{rule}.{key}")
+                labels.append(label)
+                rules[rule].append(i)
+        return cls(bits, keys, labels, rules)
+
+    # ---- 存取 ----
+    def layout(self):
+        # 可 JSON 的位布局，跟位图一起存（df.attrs / BarColumns 元数据）
+        return {"keys": self.keys, "labels": self.labels, "rules": self.rules}
+
+    @classmethod
+    def from_bars(cls, bars, layout):
+        return cls(bars[COND_COLUMN], layout["keys"], layout["labels"], layout["rules"])
+
+    def attach(self, df):
+        # 位图写进 df 的 COND 列；DataFrame 的布局放在 attrs 里
+        df[COND_COLUMN] = self.bits
+        if hasattr(df, "attrs"):
+            df.attrs["conditions"] = self.layout()
+        return df
+
+    def __len__(self):
+        return len(self.bits)
+
+    # ---- 规则 ----
+    def bit(self, key):
+        return self.keys.index(key)
+
+    def need(self, rule):
+        return np.uint32(sum(1 << i for i in self.rules[rule]))
+
+    def failed(self, rule):
+        # 每根 bar 上该规则没满足的那几位
+        return self.need(rule) & ~self.bits
+
+    def mask(self, rule):
+        return self.failed(rule) == 0
+
+    def masks(self):
+        # 与 Strategy.masks(df) 相同的条件数组，可直接交给 run_position_machine
+        return {rule: self.mask(rule) for rule in self.rules}
+
+    def has(self, key):
+        return (self.bits >> np.uint32(self.bit(key))) & np.uint32(1) == 1
+
+    def select(self, require=(), exclude=()):
+        # 过滤：require 的子条件都满足、exclude 的都不满足的 bar
+        out = np.ones(len(self.bits), dtype=bool)
+        for key in require:
+            out &= self.has(key)
+        for key in exclude:
+            out &= ~self.has(key)
+        return out
+
+    # ---- 解释 ----
+    def missing(self, rule):
+        # 每根 bar 上该规则差几个子条件（0 即触发）
+        fail = self.failed(rule)
+        return sum(((fail >> np.uint32(i)) & np.uint32(1)).astype(np.int8) for i in self.rules[rule])
+
+    def near_miss(self, rule, missing=1):
+        return self.missing(rule) == missing
+
+    def all_but(self, key):
+        # 规则里只有 key 这一条没满足的 bar，如 all_but("call_entry.kd")
+        rule = key.split(".", 1)[0]
+        return self.failed(rule) == np.uint32(1 << self.bit(key))
+
+    def blockers(self, rule, where=None):
+        # [(说明, 唯一挡住的次数, 不满足的次数)]，按唯一挡住次数降序；where 限定统计范围（如常规时段）
+        fail = self.failed(rule)
+        if where is not None:
+            fail = fail[where]
+        rows = [(self.labels[i], int(np.count_nonzero(fail == np.uint32(1 << i))),
+                 int(np.count_nonzero(fail & np.uint32(1 << i)))) for i in self.rules[rule]]
+        return sorted(rows, key=lambda r: (-r[1], -r[2]))
+
+    def explain(self, i, rule):
+        # 第 i 根 bar 上该规则 (满足的说明, 不满足的说明)
+        b = int(self.bits[i])
+        ids = self.rules[rule]
+        return ([self.labels[j] for j in ids if b >> j & 1], [self.labels[j] for j in ids if not b >> j & 1])
+
+    def describe(self, i, rule):
+        passed, failed = self.explain(i, rule)
+        text = f"{rule} {len(passed)}/{len(passed) + len(failed)}"
+        return text + (f"，未满足：{'、'.join(failed)}" if failed else f"：{' '.join(passed)}")
+
+    def report(self, rules=("call_entry", "put_entry"), where=None, top=3):
+        # 多行文本：各规则触发次数、差一条的次数、最常唯一挡住的子条件
+        lines = []
+        for rule in rules:
+            missing = self.missing(rule) if where is None else self.missing(rule)[where]
+            fired, near = int(np.count_nonzero(missing == 0)), int(np.count_nonzero(missing == 1))
+            lines.append(f"{rule}：触发 {fired} 根，差一条 {near} 根")
+            for label, sole, fail in self.blockers(rule, where)[:top]:
+                lines.append(f"  {label:<28}唯一挡住 {sole:>7} 根，不满足 {fail:>8} 根")
+        return "\n".join(lines)
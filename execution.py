@@ -0,0 +1,138 @@
+import math
+import numpy as np
+import pandas as pd
+from zoneinfo import ZoneInfo
+from market_calendar import get_calendar, DAY_NS
+
+# ==== 成交模拟 ====
+# 台账的 entry_price / exit_price 是信号 bar 的收盘价；实际成交按下一根 bar 的开盘价（entry_fill / exit_fill，
+# 见 trade_ledger.LedgerBuilder），这里在成交价上加滑点、扣手续费。option=True 时再把每笔交易换算成
+# 当天到期（0DTE）的平值期权：call 信号买 call、put 信号买 put，按 Black-Scholes 给进出场定价，
+# 到期取交易日历上当天的收盘（半日市 13:00）。
+# 全是台账长度的数组运算，不回到逐 bar 数据上，多年回测也只多几毫秒。
+EST = ZoneInfo("America/New_York")
+SLIPPAGE = 0.01            # 标的每股滑点（美元）：买入加、卖出减
+COMMISSION = 0.0           # 标的每股单边手续费
+IV = 0.15                  # 期权定价用的年化隐含波动率
+RATE = 0.04                # 无风险利率
+STRIKE_STEP = 1.0          # SPY 0DTE 行权价间距，入场成交价取最近的一档
+OPTION_SLIPPAGE = 0.02     # 权利金每股滑点
+OPTION_COMMISSION = 0.65   # 每张单边手续费
+MULTIPLIER = 100
+MINUTE_NS = 60_000_000_000
+YEAR_NS = 365 * 24 * 60 * MINUTE_NS
+EXPIRY_HOUR = 16           # 日历里查不到的日子按 16:00 到期
+
+# ==== 定价 ====
+def norm_cdf(x):
+    # 标准正态分布函数（Abramowitz-Stegun 26.2.17，误差 < 7.5e-8），数组进数组出，不依赖 scipy
+    x = np.asarray(x, dtype=np.float64)
+    z = np.abs(x)
+    t = 1.0 / (1.0 + 0.2316419 * z)
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (1.781477937 + t * (-1.821255978 + t * 1.330274429))))
+    upper = np.exp(-0.5 * z * z) / math.sqrt(2 * math.pi) * poly
+    return np.where(x >= 0, 1.0 - upper, upper)
+
+def black_scholes(spot, strike, t, iv=IV, rate=RATE, call=True):
+    # 欧式期权价格；t 为年化剩余时间，t <= 0 时取内在价值。call 可以是布尔数组（逐笔 call / put）
+    spot, strike, t = (np.asarray(a, dtype=np.float64) for a in (spot, strike, t))
+    call = np.asarray(call, dtype=bool)
+    live = t > 0
+    tt = np.where(live, t, 1.0)
+    vol = iv * np.sqrt(tt)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1 = (np.log(spot / strike) + (rate + 0.5 * iv * iv) * tt) / vol
+    d2 = d1 - vol
+    disc = strike * np.exp(-rate * tt)
+    price = np.where(call, spot * norm_cdf(d1) - disc * norm_cdf(d2), disc * norm_cdf(-d2) - spot * norm_cdf(-d1))
+    intrinsic = np.where(call, np.maximum(spot - strike, 0.0), np.maximum(strike - spot, 0.0))
+    return np.where(live, price, intrinsic)
+
+def expiry_ns(ts_ns, calendar=None):
+    # 每个时间戳所在交易日收盘的纳秒时间戳（market_calendar 的 close_ns）；calendar 不给时按时间戳的日期范围取
+    ts = np.asarray(ts_ns, dtype=np.int64)
+    day = pd.DatetimeIndex(ts.view("datetime64[ns]")).tz_localize("UTC").tz_convert(EST).normalize()
+    fallback = (day + pd.Timedelta(hours=EXPIRY_HOUR)).as_unit("ns").asi8
+    if not len(ts):
+        return fallback
+    if calendar is None:
+        calendar = get_calendar(day.min().date(), day.max().date())
+    number = day.tz_localize(None).as_unit("ns").asi8 // DAY_NS
+    i = np.minimum(np.searchsorted(calendar.days, number), len(calendar.days) - 1)
+    return np.where(calendar.days[i] == number, calendar.close_ns[i], fallback)
+
+# ==== 模拟 ====
+class Fills:
+    # 逐笔成交结果（与台账同长的数组）；pnl 交给 compute_metrics(ledger, session_minutes, pnl=fills.pnl)
+    def __init__(self, entry_price, exit_price, cost, pnl, unit, extra=None):
+        self.entry_price = entry_price
+        self.exit_price = exit_price
+        self.cost = cost
+        self.pnl = pnl
+        self.unit = unit  # pnl 的单位说明
+        self.extra = extra or {}
+
+    def __len__(self):
+        return len(self.pnl)
+
+    def columns(self):
+        # 导出台账时的附加列
+        return {"fill_entry_price": self.entry_price, "fill_exit_price": self.exit_price,
+                "fill_cost": self.cost, "fill_pnl": self.pnl, **self.extra}
+
+class ExecutionModel:
+    def __init__(self, slippage=SLIPPAGE, commission=COMMISSION, option=False, iv=IV, rate=RATE,
+                 strike_step=STRIKE_STEP, option_slippage=OPTION_SLIPPAGE, option_commission=OPTION_COMMISSION,
+                 multiplier=MULTIPLIER):
+        self.slippage = slippage
+        self.commission = commission
+        self.option = option
+        self.iv = iv
+        self.rate = rate
+        self.strike_step = strike_step
+        self.option_slippage = option_slippage
+        self.option_commission = option_commission
+        self.multiplier = multiplier
+
+    def describe(self):
+        text = f"下一根开盘成交，滑点 {self.slippage:g}，手续费 {self.commission:g}/股"
+        if self.option:
+            text += (f"；0DTE 平值期权 IV {self.iv:.0%}，权利金滑点 {self.option_slippage:g}，"
+                     f"手续费 {self.option_commission:g}/张")
+        return text
+
+    def simulate(self, ledger, calendar=None):
+        return self._option(ledger, calendar) if self.option else self._underlying(ledger)
+
+    def _underlying(self, ledger):
+        # 做多 call 信号、做空 put 信号，每股盈亏
+        side = ledger.side.astype(np.float64)
+        entry = ledger.entry_fill + side * self.slippage
+        exit_ = ledger.exit_fill - side * self.slippage
+        cost = np.full(len(ledger), 2 * self.commission)
+        return Fills(entry, exit_, cost, side * (exit_ - entry) - cost, "美元/股")
+
+    def _option(self, ledger, calendar=None):
+        # 入场成交时买一张平值期权，出场成交时卖出；成交时刻是信号 bar 收盘，即信号时间 + 1 分钟
+        call = ledger.side > 0
+        strike = np.round(ledger.entry_fill / self.strike_step) * self.strike_step
+        expiry = expiry_ns(ledger.entry_ts, calendar)
+        t_in = (expiry - (ledger.entry_ts + MINUTE_NS)) / YEAR_NS
+        t_out = (expiry - (ledger.exit_ts + MINUTE_NS)) / YEAR_NS
+        theo_in = black_scholes(ledger.entry_fill, strike, t_in, self.iv, self.rate, call)
+        theo_out = black_scholes(ledger.exit_fill, strike, t_out, self.iv, self.rate, call)
+        entry = theo_in + self.option_slippage
+        exit_ = np.maximum(theo_out - self.option_slippage, 0.0)
+        cost = np.full(len(ledger), 2 * self.option_commission)
+        pnl = (exit_ - entry) * self.multiplier - cost
+        return Fills(entry, exit_, cost, pnl, "美元/张",
+                     {"strike": strike, "premium_in": theo_in, "premium_out": theo_out})
+
+def parse_execution(args):
+    # 命令行：fills 打开成交模拟，slippage= / commission= 标的参数，option 或 iv= 换算成 0DTE 期权；都没有返回 None
+    value = lambda key: next((a.split("=", 1)[1] for a in args if a.startswith(key + "=")), None)
+    option = "option" in args or value("iv") is not None
+    if not (option or "fills" in args or value("slippage") is not None or value("commission") is not None):
+        return None
+    return ExecutionModel(slippage=float(value("slippage") or SLIPPAGE), commission=float(value("commission") or COMMISSION),
+                          option=option, iv=float(value("iv") or IV))
@@ -0,0 +1,167 @@
+import numpy as np
+from datetime import time
+
+# ==== 向量化回测 ====
+# 所有入场/出场/震荡/趋势中继条件一次性按整列算成布尔数组，
+# 只有 call/put/none 仓位状态机按 bar 逐个走（纯 list，不再 df.iloc）。
+REGULAR_START = time(9, 30)
+REGULAR_END = time(16, 0)
+CLEAR_TIME = time(15, 59)
+
+def _col(df, name):
+    # df 可以是 DataFrame，也可以是 bar_columns.BarColumns（列直接是 ndarray）
+    return np.asarray(df[name], dtype=np.float64)
+
+def _prev(arr):
+    out = np.empty_like(arr)
+    out[0] = np.nan
+    out[1:] = arr[:-1]
+    return out
+
+def _time_us(t):
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000 + t.microsecond
+
+def time_of_day_us(index):
+    # 用墙上时间分量计算，避免夏令时切换日 index - normalize() 偏一小时
+    return (((index.hour.to_numpy(np.int64) * 60 + index.minute.to_numpy(np.int64)) * 60
+             + index.second.to_numpy(np.int64)) * 1_000_000 + index.microsecond.to_numpy(np.int64))
+
+# ==== 条件数组 ====
+# 每个条件拆成子条件 [(键, 说明, 布尔数组)]，与起来就是条件本身；condition_bits 把子条件逐个打成位
+def all_terms(terms):
+    out = terms[0][2].copy()
+    for _, _, arr in terms[1:]:
+        out &= arr
+    return out
+
+def sideways_terms(df, window=3, price_threshold=0.002, ema_threshold=0.02):
+    close, ema = _col(df, 'Close'), _col(df, 'EMA20')
+    near = np.zeros(len(df), dtype=bool)
+    flat = np.zeros(len(df), dtype=bool)
+    if len(df) > window:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            near[window:] = (np.abs(close - ema) / ema < price_threshold)[window:]
+            flat[window:] = np.abs(ema[window:] - ema[:-window]) < ema_threshold
+    return [("price_near", f"|Close-EMA20|/EMA20<{price_threshold}", near),
+            ("ema_flat", f"EMA20 {window} 根变化<{ema_threshold}", flat)]
+
+def sideways_mask(df, window=3, price_threshold=0.002, ema_threshold=0.02):
+    return all_terms(sideways_terms(df, window, price_threshold, ema_threshold))
+
+def call_entry_terms(df, rsi_level=53, slope_level=0.15):
+    c, e, rsi, macd, h, slope, k, d = (_col(df, n) for n in
+        ('Close', 'EMA20', 'RSI', 'MACD', 'MACDh', 'RSI_SLOPE', 'K', 'D'))
+    with np.errstate(invalid='ignore'):
+        return [("close_ema", "Close>EMA20", c > e), ("rsi", f"RSI>{rsi_level}", rsi > rsi_level),
+                ("macd", "MACD>0", macd > 0), ("macdh", "MACDh>0", h > 0),
+                ("slope", f"RSI_SLOPE>{slope_level}", slope > slope_level), ("kd", "K>D", k > d)]
+
+def call_entry_mask(df, rsi_level=53, slope_level=0.15):
+    return all_terms(call_entry_terms(df, rsi_level, slope_level))
+
+def put_entry_terms(df, rsi_level=47, slope_level=-0.15):
+    c, e, rsi, macd, h, slope, k, d = (_col(df, n) for n in
+        ('Close', 'EMA20', 'RSI', 'MACD', 'MACDh', 'RSI_SLOPE', 'K', 'D'))
+    with np.errstate(invalid='ignore'):
+        return [("close_ema", "Close<EMA20", c < e), ("rsi", f"RSI<{rsi_level}", rsi < rsi_level),
+                ("macd", "MACD<0", macd < 0), ("macdh", "MACDh<0", h < 0),
+                ("slope", f"RSI_SLOPE<{slope_level}", slope < slope_level), ("kd", "K<D", k < d)]
+
+def put_entry_mask(df, rsi_level=47, slope_level=-0.15):
+    return all_terms(put_entry_terms(df, rsi_level, slope_level))
+
+def trend_continuation_terms(df):
+    h, rsi = _col(df, 'MACDh'), _col(df, 'RSI')
+    with np.errstate(invalid='ignore'):
+        return ([("macdh", "MACDh>0", h > 0), ("rsi", "RSI>45", rsi > 45)],
+                [("macdh", "MACDh<0", h < 0), ("rsi", "RSI<55", rsi < 55)])
+
+def trend_continuation_masks(df):
+    call, put = trend_continuation_terms(df)
+    return all_terms(call), all_terms(put)
+
+# 出场规则两种：MACDh 衰减（spy_backtest_original.py）与阈值（spy_signal_bot_v4.py / spy_backtest_date.py）
+def decay_exit_terms(df):
+    h, rsi, slope, k, d = (_col(df, n) for n in ('MACDh', 'RSI', 'RSI_SLOPE', 'K', 'D'))
+    prev_h = _prev(h)
+    prev_h = np.where(prev_h != 0, prev_h, 1e-6)  # 防止除以零
+    with np.errstate(invalid='ignore'):
+        return ([("fade", "RSI_SLOPE<-0.3 或 MACDh 衰减过半", (slope < -0.3) | (h < prev_h * 0.5)),
+                 ("rsi", "RSI<55", rsi < 55), ("kd", "K≤D+2", ~(k > d + 2))],
+                [("fade", "RSI_SLOPE>0.3 或 MACDh 衰减过半", (slope > 0.3) | (h > prev_h * 0.5)),
+                 ("rsi", "RSI>45", rsi > 45), ("kd", "K≥D-2", ~(k < d - 2))])
+
+def decay_exit_masks(df):
+    call, put = decay_exit_terms(df)
+    return all_terms(call), all_terms(put)
+
+def threshold_exit_terms(df):
+    macd, h, rsi, slope, k, d = (_col(df, n) for n in ('MACD', 'MACDh', 'RSI', 'RSI_SLOPE', 'K', 'D'))
+    with np.errstate(invalid='ignore'):
+        return ([("rsi", "RSI<50", rsi < 50), ("slope", "RSI_SLOPE<0", slope < 0),
+                 ("macd", "MACD<0.05 或 MACDh<0.05", (macd < 0.05) | (h < 0.05)), ("kd", "K≤D", ~(k > d))],
+                [("rsi", "RSI>50", rsi > 50), ("slope", "RSI_SLOPE>0", slope > 0),
+                 ("macd", "MACD>-0.05 或 MACDh>-0.05", (macd > -0.05) | (h > -0.05)), ("kd", "K≥D", ~(k < d))])
+
+def threshold_exit_masks(df):
+    call, put = threshold_exit_terms(df)
+    return all_terms(call), all_terms(put)
+
+# ==== 仓位状态机 ====
+EVT_CALL_EXIT, EVT_PUT_EXIT, EVT_REV_PUT, EVT_REV_CALL, EVT_CALL, EVT_PUT, EVT_CLEAR = range(7)
+EVENT_TEXT = {
+    EVT_CALL_EXIT: "⚠️ Call 出场",
+    EVT_PUT_EXIT: "⚠️ Put 出场",
+    EVT_REV_PUT: "🔁 空仓 -> Put",
+    EVT_REV_CALL: "🔁 空仓 -> Call",
+    EVT_CALL: "📈 主升浪 Call",
+    EVT_PUT: "📉 主跌浪 Put",
+    EVT_CLEAR: "⏰ 收盘前清仓",
+}
+
+def run_position_machine(active, near_close, call_entry, put_entry, call_exit, put_exit,
+                         call_cont, put_cont, sideways, position=0, start=1):
+    # 与原 backtest() 循环一一对应，返回 ([(bar 下标, 事件)], 最终仓位)；
+    # position/start 供实盘从当前仓位只走最后一根 bar
+    active, near_close = active.tolist(), near_close.tolist()
+    call_entry, put_entry = call_entry.tolist(), put_entry.tolist()
+    call_exit, put_exit = call_exit.tolist(), put_exit.tolist()
+    call_cont, put_cont = call_cont.tolist(), put_cont.tolist()
+    sideways = sideways.tolist()
+    # position：0 空仓 / 1 call / -1 put
+    events = []
+    for i in range(start, len(active)):
+        if not active[i]:
+            if near_close[i] and position != 0:
+                events.append((i, EVT_CLEAR)); position = 0
+            continue
+        if position == 1:
+            if call_exit[i]:
+                if call_cont[i]:
+                    continue
+                events.append((i, EVT_CALL_EXIT)); position = 0
+                if put_entry[i] and not sideways[i]:
+                    events.append((i, EVT_REV_PUT)); position = -1
+                continue
+        elif position == -1:
+            if put_exit[i]:
+                if put_cont[i]:
+                    continue
+                events.append((i, EVT_PUT_EXIT)); position = 0
+                if call_entry[i] and not sideways[i]:
+                    events.append((i, EVT_REV_CALL)); position = 1
+                continue
+        if position == 0 and not sideways[i]:
+            if call_entry[i]:
+                events.append((i, EVT_CALL)); position = 1
+            elif put_entry[i]:
+                events.append((i, EVT_PUT)); position = -1
+    return events, position
+
+def session_masks(index, calendar):
+    # active：交易日常规时段（与原循环 9:30 <= t < 16:00 一致）；near_close：>= 15:59
+    tod = time_of_day_us(index)
+    regular = (tod >= _time_us(REGULAR_START)) & (tod < _time_us(REGULAR_END))
+    active = calendar.session_day_mask(index) & regular
+    near_close = tod >= _time_us(CLEAR_TIME)
+    return active, near_close
@@ -0,0 +1,219 @@
+import json
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ==== HTTP 客户端 ====
+# 所有对外请求（Gist、Discord）共用一个 keep-alive 连接池；每次请求都有显式超时，
+# 连接失败 / 超时 / 429 / 5xx 有限次重试并指数退避，最坏耗时有上限，不会拖过下一根 bar。
+# 429 / 503 带 Retry-After 时按它等；要等的比 MAX_RETRY_AFTER 还久就不在这里等，带着 retry_after 抛给调用方。
+# POST（webhook 推送）不幂等：读响应超时、没有 Retry-After 的 5xx 时请求可能已经送达，重发会推两遍，
+# 这类失败不重试，异常带 maybe_sent=True；只重试连接没建起来的和服务端明确要求稍后再来的 429 / 503
+CONNECT_TIMEOUT = 3
+READ_TIMEOUT = 5
+RETRIES = 2
+BACKOFF = 0.5
+MAX_RETRY_AFTER = 5
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class HttpError(Exception):
+    def __init__(self, message, status=None, retry_after=None, maybe_sent=False):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after  # 服务端要求的等待秒数（Retry-After）
+        self.maybe_sent = maybe_sent    # 服务端可能已经处理了这次请求，非幂等的不能再发
+
+def retry_after(r):
+    # Retry-After 头（秒）；Discord 另在 JSON 里给 retry_after（秒，可带小数）
+    value = r.headers.get("Retry-After")
+    try:
+        if value is not None:
+            return float(value)
+        return float(r.json()["retry_after"])
+    except (ValueError, TypeError, KeyError):
+        return None
+
+class HttpClient:
+    def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=RETRIES, backoff=BACKOFF,
+                 pool_size=8, sleep=time.sleep):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, url, retry_unsafe=True, **kwargs):
+        # retry_unsafe=False：请求可能已到服务端的失败（读超时、没有 Retry-After 的 5xx）不重发
+        kwargs.setdefault("timeout", self.timeout)
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.sleep(max(self.backoff * 2 ** (attempt - 1), error.retry_after or 0))
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except requests.ConnectionError as e:  # 含 ConnectTimeout：连接没建起来，请求没发出去
+                error = HttpError(f"{method} {url} 失败：{e}")
+                continue
+            except requests.Timeout as e:
+                error = HttpError(f"{method} {url} 失败：{e}", maybe_sent=not retry_unsafe)
+                if not retry_unsafe:
+                    raise error
+                continue
+            if r.status_code in RETRY_STATUS:
+                wait = retry_after(r) if r.status_code in (429, 503) else None
+                error = HttpError(f"{method} {url} 返回 {r.status_code}", r.status_code, wait,
+                                  maybe_sent=not retry_unsafe and wait is None)
+                if error.maybe_sent or (wait is not None and wait > MAX_RETRY_AFTER):
+                    raise error
+                continue
+            if r.status_code >= 400:
+                raise HttpError(f"{method} {url} 返回 {r.status_code}", r.status_code)
+            return r
+        raise error
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, retry_unsafe=False, **kwargs):
+        return self.request("POST", url, retry_unsafe=retry_unsafe, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+_client = None
+_client_lock = threading.Lock()
+
+def default_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+def dispatch(*calls):
+    # 几个无参调用并发执行，返回结果列表；某个失败时该位置放异常对象，不影响其他调用
+    if not calls:
+        return []
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        futures = [pool.submit(call) for call in calls]
+    results = []
+    for f in futures:
+        try:
+            results.append(f.result())
+        except Exception as e:
+            results.append(e)
+    return results
+
+# ==== 本地 HTTP 替身 ====
+# 模拟 Gist（GET / PATCH /gists/<id>）和 Discord webhook（POST 其他路径），
+# 可设置固定延迟和按顺序消耗的故障（状态码，(状态码, Retry-After 秒)，或 "drop" 直接断开连接），
+# 离线复现慢响应、限流和失败。
+class LocalHttpServer:
+    def __init__(self, latency=0.0, failures=None):
+        self.latency = latency
+        self.failures = list(failures or [])
+        self.gists = {}       # gist_id -> {filename: content}
+        self.requests = []    # (method, path, body)
+        self.lock = threading.Lock()
+        self.server = None
+        self.url = None
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_failure(self):
+        with self.lock:
+            return self.failures.pop(0) if self.failures else None
+
+    def _handle(self, method, path, body):
+        if path.startswith("/gists/"):
+            gist_id = path.split("/")[2]
+            if method == "GET":
+                if gist_id not in self.gists:
+                    return 404, {"message": "Not Found"}
+                files = {name: {"content": c} for name, c in self.gists[gist_id].items()}
+                return 200, {"id": gist_id, "files": files}
+            if method == "PATCH":
+                files = (body or {}).get("files", {})
+                with self.lock:
+                    gist = self.gists.setdefault(gist_id, {})
+                    for name, f in files.items():
+                        gist[name] = f["content"]
+                return 200, {"id": gist_id}
+            return 405, {"message": "Method Not Allowed"}
+        if method == "POST":
+            return 204, None
+        return 405, {"message": "Method Not Allowed"}
+
+def _make_handler(standin):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _serve(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            body = json.loads(raw) if raw else None
+            with standin.lock:
+                standin.requests.append((method, self.path, body))
+            if standin.latency:
+                time.sleep(standin.latency)
+            failure = standin._next_failure()
+            if failure == "drop":
+                self.close_connection = True
+                self.connection.close()
+                return
+            wait = None
+            if isinstance(failure, tuple):
+                failure, wait = failure
+            if failure is not None:
+                status, payload = failure, {"message": "injected failure"}
+                if wait is not None:
+                    payload["retry_after"] = wait
+            else:
+                status, payload = standin._handle(method, self.path, body)
+            data = json.dumps(payload).encode() if payload is not None else b""
+            try:
+                self.send_response(status)
+                if wait is not None:
+                    self.send_header("Retry-After", str(wait))
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 客户端已超时断开
+
+        def do_GET(self):
+            self._serve("GET")
+
+        def do_POST(self):
+            self._serve("POST")
+
+        def do_PATCH(self):
+            self._serve("PATCH")
+
+    return Handler
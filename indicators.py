@@ -0,0 +1,273 @@
+import numpy as np
+import pandas as pd
+
+# ==== NumPy 指标内核 ====
+# 输入为连续的 float64 数组，输出写进预分配数组（传 out 即原地写入，不传则新建一块），
+# 不产生中间 DataFrame。语义与 pandas_ta 0.4.71b0 / pandas rolling 一致（预热期为 NaN，由调用方填充），
+# 与 stream_indicators.IndicatorEngine 逐位一致：
+#   ema / rma   -> 前 length 根 SMA 作种子 + ewm(adjust=False)，逐点递推
+#   rsi         -> compute_rsi 的 rolling mean 版，或 Wilder（rma）版
+#   macd        -> ta.macd：信号线从 MACD 首个有效值起算 ema
+#   stoch       -> ta.stoch：rolling min/max，区间出现过 0 就整体加 epsilon，K/D 为 convolve SMA
+EPSILON = float(np.finfo(float).eps)
+
+def as_array(x):
+    return np.ascontiguousarray(x, dtype=np.float64)
+
+def _out(out, n):
+    if out is None:
+        return np.empty(n, dtype=np.float64)
+    return out
+
+# ==== 滑动窗口 ====
+# 全部按窗口内下标顺序原地累加，窗口内有 NaN 结果即为 NaN（等同 min_periods=length）
+def rolling_sum(x, length, out=None):
+    x = as_array(x)
+    n = len(x)
+    out = _out(out, n)
+    out[:min(length - 1, n)] = np.nan
+    if n < length:
+        return out
+    acc = out[length - 1:]
+    m = n - length + 1
+    acc[:] = x[:m]
+    for j in range(1, length):
+        acc += x[j:j + m]
+    return out
+
+def rolling_mean(x, length, out=None):
+    out = rolling_sum(x, length, out)
+    out /= length
+    return out
+
+def sma(x, length, out=None):
+    # pandas_ta sma（convolve(ones/n)）：每项先乘权重再按下标顺序相加
+    x = as_array(x)
+    n = len(x)
+    out = _out(out, n)
+    out[:min(length - 1, n)] = np.nan
+    if n < length:
+        return out
+    w = float(np.ones(length)[0] / length)
+    acc = out[length - 1:]
+    m = n - length + 1
+    np.multiply(x[:m], w, out=acc)
+    for j in range(1, length):
+        acc += x[j:j + m] * w
+    return out
+
+def _rolling_extreme(x, length, out, fn):
+    x = as_array(x)
+    n = len(x)
+    out = _out(out, n)
+    out[:min(length - 1, n)] = np.nan
+    if n < length:
+        return out
+    acc = out[length - 1:]
+    m = n - length + 1
+    acc[:] = x[:m]
+    for j in range(1, length):
+        fn(acc, x[j:j + m], out=acc)
+    return out
+
+def rolling_min(x, length, out=None):
+    return _rolling_extreme(x, length, out, np.minimum)
+
+def rolling_max(x, length, out=None):
+    return _rolling_extreme(x, length, out, np.maximum)
+
+# ==== 指数平滑 ====
+# 递推直接交给 pandas ewm(adjust=False) 的编译内核，与 stream_indicators.Ema 的逐点公式逐位一致。
+# state 为 dict 时可分块续算：未满 length 的种子、当前值、末尾连续 NaN 的根数都记在里面，
+# 续算时把当前值和同样多的 NaN 接在这一段前面，旧值权重按同样次数衰减，所以分多次喂入与一次喂完逐位一致
+def _ewm_state(state, seeded):
+    st = {} if state is None else state
+    if not st:
+        st.update(pending=[] if seeded else None, weighted=np.nan, gap=0)
+    return st
+
+def _ewm_continue(x, com, out, st):
+    # pandas ewm(com, adjust=False, ignore_na=False)：NaN 处沿用旧值、旧值权重随间隔衰减
+    n = len(x)
+    if not n:
+        return out
+    w = st["weighted"]
+    head = 0 if w != w else 1 + st["gap"]
+    buf = np.full(head + n, np.nan)
+    if head:
+        buf[0] = w
+    buf[head:] = x
+    out[:] = pd.Series(buf, copy=False).ewm(com=com, adjust=False).mean().to_numpy()[head:]
+    obs = np.flatnonzero(~np.isnan(x))
+    w = float(out[-1])
+    if len(obs):
+        st.update(weighted=w, gap=n - 1 - int(obs[-1]))
+    elif w == w:
+        st["gap"] += n
+    return out
+
+def ewm(x, alpha, out=None, state=None):
+    # ewm(alpha, adjust=False)，从第一个观测值起算
+    x = as_array(x)
+    out = _out(out, len(x))
+    return _ewm_continue(x, 1.0 / alpha - 1.0, out, _ewm_state(state, seeded=False))
+
+def _seeded(x, length, com, out, state):
+    # 第 length 根为前 length 根均值（NaN 不计），之前为 NaN，之后 ewm
+    x = as_array(x)
+    n = len(x)
+    out = _out(out, n)
+    st = _ewm_state(state, seeded=True)
+    i = 0
+    pending = st["pending"]
+    if pending is not None:
+        i = min(n, length - len(pending))
+        pending.extend(x[:i].tolist())
+        out[:i] = np.nan
+        if len(pending) < length:
+            return out
+        head = np.asarray(pending, dtype=np.float64)
+        valid = ~np.isnan(head)
+        st["pending"] = None
+        if valid.any():
+            seed = float(np.where(valid, head, 0.0).sum() / np.count_nonzero(valid))
+            out[i - 1] = seed
+            st["weighted"] = seed
+    _ewm_continue(x[i:], com, out[i:], st)
+    return out
+
+def ema(x, length, out=None, state=None):
+    # span=length，pandas 换算成 com，alpha = 1 / (1 + com) 与 stream_indicators.Ema 同一个浮点数
+    return _seeded(x, length, (length - 1) / 2.0, out, state)
+
+def rma(x, length, out=None, state=None):
+    # Wilder 平滑：alpha = 1 / length
+    return _seeded(x, length, length - 1.0, out, state)
+
+# ==== 指标 ====
+def rsi(close, length=14, wilder=False, out=None):
+    # 默认与 compute_rsi 相同（涨跌幅 rolling mean）；wilder=True 为 rma 版。预热期 NaN
+    close = as_array(close)
+    n = len(close)
+    out = _out(out, n)
+    if n == 0:
+        return out
+    delta = np.empty(n)
+    delta[0] = np.nan
+    np.subtract(close[1:], close[:-1], out=delta[1:])
+    up = np.maximum(delta, 0.0)
+    np.negative(delta, out=delta)
+    np.maximum(delta, 0.0, out=delta)
+    # 均值写进 out / delta，不另开数组
+    if wilder:
+        out[0] = np.nan
+        rma(up[1:], length, out[1:])
+        rma(delta[1:], length, up[1:])
+        up[0] = np.nan
+        down = up
+    else:
+        rolling_mean(up, length, out)
+        down = rolling_mean(delta, length, up)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out /= down
+        out += 1.0
+        np.divide(100.0, out, out=out)
+        np.subtract(100.0, out, out=out)
+    return out
+
+def macd(close, fast=5, slow=10, signal=20, out=None, state=None):
+    # 返回 (MACD, 信号线, 柱)；out 可传三个预分配数组，state 为 dict 时分块续算
+    close = as_array(close)
+    n = len(close)
+    line, sig, hist = out if out is not None else (np.empty(n), np.empty(n), np.empty(n))
+    st = {} if state is None else state
+    ema(close, fast, line, st.setdefault("fast", {}))
+    ema(close, slow, hist, st.setdefault("slow", {}))  # 借 hist 暂存慢线
+    line -= hist
+    sig[:] = np.nan
+    sig_state = st.setdefault("signal", {})
+    if sig_state:
+        ema(line, signal, sig, sig_state)
+    else:
+        # 信号线从 MACD 首个有效值起算
+        valid = np.flatnonzero(~np.isnan(line))
+        if len(valid):
+            first = valid[0]
+            ema(line[first:], signal, sig[first:], sig_state)
+    np.subtract(line, sig, out=hist)
+    return line, sig, hist
+
+def has_zero_range(high, low, k=9):
+    high, low = as_array(high), as_array(low)
+    rng = rolling_max(high, k)
+    rng -= rolling_min(low, k)
+    return bool((rng == 0).any())
+
+def stoch(high, low, close, k=9, d=3, smooth_k=3, out=None, zero_range=None):
+    # 返回 (K, D)；out 可传两个预分配数组。
+    # zero_range：整段是否出现过零区间（出现过则区间整体加 epsilon），None 时按传入数据判断；
+    # 分块计算时由调用方对整段预先判断后传入
+    high, low, close = as_array(high), as_array(low), as_array(close)
+    n = len(close)
+    k_out, d_out = out if out is not None else (np.empty(n), np.empty(n))
+    ll = rolling_min(low, k, d_out)  # 借 d_out 暂存最低价
+    hh = rolling_max(high, k)
+    hh -= ll
+    if zero_range is None:
+        zero_range = bool((hh == 0).any())
+    if zero_range:
+        hh += EPSILON
+    raw = np.subtract(close, ll)
+    raw *= 100
+    raw /= hh
+    k_out[:] = np.nan
+    d_out[:] = np.nan
+    valid = np.flatnonzero(~np.isnan(raw))
+    if len(valid):
+        first = valid[0]
+        sma(raw[first:], smooth_k, k_out[first:])
+        valid = np.flatnonzero(~np.isnan(k_out))
+        if len(valid):
+            first = valid[0]
+            sma(k_out[first:], d, d_out[first:])
+    return k_out, d_out
+
+if __name__ == "__main__":
+    # python indicators.py [天数]：与 pandas_ta 在合成 1 分钟线上对拍数值并比较耗时（需本地装有 pandas_ta）
+    import sys
+    import time
+    from benchmark import synthetic_bars
+    try:
+        import pandas_ta as ta
+    except ImportError:
+        print("⚠️ 未安装 pandas_ta，无法对拍")
+        sys.exit(0)
+    df = synthetic_bars(int(sys.argv[1]) if len(sys.argv) > 1 else 252)
+    c, h, l = df["Close"], df["High"], df["Low"]
+    close, high, low = c.to_numpy(), h.to_numpy(), l.to_numpy()
+    # 名称: (本项目内核, pandas_ta, 取出 pandas_ta 的各列)
+    checks = {
+        "ema": (lambda: [ema(close, 20)], lambda: ta.ema(c, length=20), lambda r: [r]),
+        "macd": (lambda: macd(close, 5, 10, 20), lambda: ta.macd(c, fast=5, slow=10, signal=20),
+                 lambda r: [r["MACD_5_10_20"], r["MACDs_5_10_20"], r["MACDh_5_10_20"]]),
+        "stoch": (lambda: stoch(high, low, close, 9, 3, 3), lambda: ta.stoch(h, l, c, k=9, d=3, smooth_k=3),
+                  lambda r: [r["STOCHk_9_3_3"], r["STOCHd_9_3_3"]]),
+    }
+    failed = False
+    for name, (new, old, columns) in checks.items():
+        timings = []
+        for fn in (new, old):
+            best = None
+            for _ in range(5):
+                t0 = time.perf_counter()
+                fn()
+                elapsed = time.perf_counter() - t0
+                best = elapsed if best is None else min(best, elapsed)
+            timings.append(best)
+        pairs = [(a, b.reindex(c.index).to_numpy(dtype=np.float64)) for a, b in zip(new(), columns(old()))]
+        err = max(float(np.nanmax(np.abs(a - b))) for a, b in pairs)
+        ok = err < 1e-9 and all((np.isnan(a) == np.isnan(b)).all() for a, b in pairs)
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {name:<6} 最大误差 {err:.1e}  {timings[0] * 1000:7.2f} ms vs pandas_ta "
+              f"{timings[1] * 1000:7.2f} ms（{timings[1] / timings[0]:.1f}x）")
+    sys.exit(1 if failed else 0)
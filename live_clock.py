@@ -0,0 +1,45 @@
+import time as _time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+# ==== 时钟 ====
+# 守护进程 / 回放通过注入时钟控制“现在”，离线模拟时 sleep 直接跳到目标时间。
+EST = ZoneInfo("America/New_York")
+
+def next_bar_close(now):
+    # 下一个整分钟，即当前这根 1 分钟 bar 的收盘时刻
+    return now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+class SystemClock:
+    def now(self):
+        return datetime.now(tz=EST)
+
+    def sleep_until(self, t):
+        delay = (t - self.now()).total_seconds()
+        if delay > 0:
+            _time.sleep(delay)
+
+    def perf(self):
+        return _time.perf_counter()
+
+class FakeClock:
+    # real_perf=False 时 perf() 也是虚拟的，只随 advance / sleep_until 前进，计时结果可复现
+    def __init__(self, start, real_perf=True):
+        self.start = start
+        self.current = start
+        self.real_perf = real_perf
+
+    def now(self):
+        return self.current
+
+    def sleep_until(self, t):
+        if t > self.current:
+            self.current = t
+
+    def advance(self, seconds):
+        self.current += timedelta(seconds=seconds)
+
+    def perf(self):
+        if self.real_perf:
+            return _time.perf_counter()
+        return (self.current - self.start).total_seconds()
@@ -0,0 +1,163 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+from session_lookup import SESSION_CACHE
+
+# ==== 交易日历缓存 ====
+# 整个区间只调用一次 mcal schedule，保存为按开盘时间排序的 open/close 纳秒数组，
+# 之后判断交易日 / 常规时段 / 收盘前一分钟都是 O(1) 或整列向量化查表。
+EST = ZoneInfo("America/New_York")
+CALENDAR_NAME = "NASDAQ"
+DAY_NS = 86_400_000_000_000
+MINUTE_NS = 60_000_000_000
+EPOCH = date(1970, 1, 1)
+
+def _day_number(d):
+    return (d - EPOCH).days
+
+def _to_ns(ts):
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize(EST)
+    return ts.as_unit("ns").value
+
+def _local_day(ts):
+    if isinstance(ts, datetime):
+        if ts.tzinfo is not None:
+            ts = ts.astimezone(EST)
+        return _day_number(ts.date())
+    return _day_number(ts)
+
+class SessionCalendar:
+    def __init__(self, start, end, days, open_ns, close_ns, name=CALENDAR_NAME):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.days = np.asarray(days, dtype=np.int64)
+        self.open_ns = np.asarray(open_ns, dtype=np.int64)
+        self.close_ns = np.asarray(close_ns, dtype=np.int64)
+        self._day_set = set(self.days.tolist())
+
+    # ---- 构建 / 持久化 ----
+    @classmethod
+    def build(cls, start, end, name=CALENDAR_NAME):
+        import pandas_market_calendars as mcal
+        sched = mcal.get_calendar(name).schedule(start_date=start, end_date=end)
+        days = sched.index.as_unit("ns").asi8 // DAY_NS
+        open_ns = sched["market_open"].dt.as_unit("ns").astype("int64").to_numpy()
+        close_ns = sched["market_close"].dt.as_unit("ns").astype("int64").to_numpy()
+        return cls(start, end, days, open_ns, close_ns, name)
+
+    def save(self, path=SESSION_CACHE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        payload = {
+            "calendar": self.name,
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "days": self.days.tolist(),
+            "open_ns": self.open_ns.tolist(),
+            "close_ns": self.close_ns.tolist(),
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=SESSION_CACHE):
+        with open(path) as f:
+            payload = json.load(f)
+        return cls(date.fromisoformat(payload["start"]), date.fromisoformat(payload["end"]),
+                   payload["days"], payload["open_ns"], payload["close_ns"], payload["calendar"])
+
+    def covers(self, start, end):
+        return self.start <= start and end <= self.end
+
+    # ---- 单点查询 ----
+    def _session_of(self, t_ns):
+        i = int(np.searchsorted(self.open_ns, t_ns, side="right")) - 1
+        return i if i >= 0 else None
+
+    def is_session_day(self, ts):
+        return _local_day(ts) in self._day_set
+
+    def is_open(self, ts):
+        # 与原 is_market_open_now 一致：open <= now <= close
+        t = _to_ns(ts)
+        i = self._session_of(t)
+        return i is not None and t <= self.close_ns[i]
+
+    def is_regular(self, ts):
+        t = _to_ns(ts)
+        i = self._session_of(t)
+        return i is not None and t < self.close_ns[i]
+
+    def is_last_minute(self, ts):
+        t = _to_ns(ts)
+        i = self._session_of(t)
+        return i is not None and self.close_ns[i] - MINUTE_NS <= t < self.close_ns[i]
+
+    def session_bounds(self, ts):
+        i = int(np.searchsorted(self.days, _local_day(ts)))
+        if i < len(self.days) and self.days[i] == _local_day(ts):
+            return (pd.Timestamp(int(self.open_ns[i]), tz="UTC").tz_convert(EST),
+                    pd.Timestamp(int(self.close_ns[i]), tz="UTC").tz_convert(EST))
+        return None
+
+    # ---- 整列向量化查询 ----
+    def session_day_mask(self, index):
+        wall = index.tz_convert(EST).tz_localize(None) if index.tz is not None else index
+        local_days = wall.as_unit("ns").asi8 // DAY_NS
+        return np.isin(local_days, self.days)
+
+    def _close_of(self, index):
+        if index.tz is None:
+            index = index.tz_localize(EST)
+        t = index.as_unit("ns").asi8
+        pos = np.searchsorted(self.open_ns, t, side="right") - 1
+        valid = pos >= 0
+        close = np.zeros_like(t)
+        close[valid] = self.close_ns[pos[valid]]
+        return t, valid, close
+
+    def regular_mask(self, index):
+        t, valid, close = self._close_of(index)
+        return valid & (t < close)
+
+    def last_minute_mask(self, index):
+        t, valid, close = self._close_of(index)
+        return valid & (t < close) & (t >= close - MINUTE_NS)
+
+# ==== 进程内共享实例 ====
+_calendar = None
+
+def get_calendar(start, end, path=SESSION_CACHE, pad_days=366):
+    # 优先用内存实例，其次磁盘缓存，都不覆盖时才重新构建（多建前后一年，减少重建次数）
+    global _calendar
+    if isinstance(start, datetime):
+        start = start.date()
+    if isinstance(end, datetime):
+        end = end.date()
+    if _calendar is not None and _calendar.covers(start, end):
+        return _calendar
+    if path and os.path.exists(path):
+        try:
+            cached = SessionCalendar.load(path)
+            if cached.covers(start, end):
+                _calendar = cached
+                return _calendar
+        except (OSError, ValueError, KeyError):
+            pass
+    lo, hi = start - timedelta(days=pad_days), end + timedelta(days=pad_days)
+    if _calendar is not None:
+        lo, hi = min(lo, _calendar.start), max(hi, _calendar.end)
+    _calendar = SessionCalendar.build(lo, hi)
+    if path:
+        try:
+            _calendar.save(path)
+        except OSError:
+            pass
+    return _calendar
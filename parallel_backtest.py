@@ -0,0 +1,124 @@
+import os
+import copy
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from strategy import INDICATOR_PARAMS, advance_state, warmup_bars
+from stream_backtest import StreamBacktest
+from trade_ledger import TradeLedger
+from timeframes import advance_timeframes
+from indicators import has_zero_range
+from market_calendar import get_calendar
+from bar_store import REQUEST_DAYS, to_frame
+
+# ==== 并行多日回测 ====
+# 每天 15:59 之后强制清仓、开盘前仓位归零，交易日之间只靠指标状态相连。
+# 主进程先把整段顺序过一遍（直接读结构数组，不转 DataFrame），只推进 EMA / MACD 递推、记下最后几根 bar，
+# 在每个交易日开头记一份续算状态；然后把交易日切成连续的几段分给进程池，
+# 每段从前一两天的状态预热后逐日跑 StreamBacktest，结果按段顺序合并，与串行流式回测逐位一致。
+# 个别情况下仓位会跨日（当天数据在 15:59 前就断了、没有触发清仓），
+# 那一段之后的一段按带过来的仓位在主进程重跑，结果仍然确定。
+SEGMENTS_PER_WORKER = 4  # 每个进程分几段，平衡各段耗时不均
+
+def scan_states(days, strategy, p=None):
+    # days：(日期, 当天结构数组) 迭代器（BarStore.iter_records）；
+    # 返回 [(日期, 当天开头的续算状态, 当天有效 bar 数)] 与整段零区间标记。
+    # 状态里的 tail 先存结构数组，到 worker 里再转回 DataFrame
+    p = dict(INDICATOR_PARAMS, **(p or {}))
+    n, k = warmup_bars(p), p["stoch_k"]
+    state, frames, tail = {}, {}, None
+    out, zero_range = [], False
+    high = low = np.empty(0)
+    for day, rec in days:
+        h, l, c = (np.asarray(rec[col], dtype=np.float64) for col in ('High', 'Low', 'Close'))
+        valid = int(np.count_nonzero(np.isfinite(h) & np.isfinite(l) & np.isfinite(c)))
+        out.append((day, {"state": dict(copy.deepcopy(state), tail=tail), "frames": copy.deepcopy(frames)}, valid))
+        advance_state(c, p, state)
+        if strategy.confirm:
+            advance_timeframes(np.asarray(rec["ts"]), c, strategy.confirm, state=frames)
+        tail = np.array(rec[-n:] if tail is None or len(rec) >= n else np.concatenate([tail, rec])[-n:])
+        if not zero_range:
+            high, low = np.concatenate([high, h]), np.concatenate([low, l])
+            zero_range = has_zero_range(high, low, k)
+            keep = max(0, len(high) - (k - 1))
+            high, low = high[keep:], low[keep:]
+    return out, zero_range
+
+def _segments(n, parts):
+    size = max(1, -(-n // parts))
+    return [(i, min(n, i + size)) for i in range(0, n, size)]
+
+def _warm_start(counts, start, need):
+    # 往前取几天预热，直到有效 bar 够回看（开头的 EMA 种子期 + 震荡窗口）
+    w = start
+    while w > 0 and sum(counts[w:start]) < need:
+        w -= 1
+    return w
+
+def _run_segment(store, symbol, strategy, p, calendar, zero_range, snapshot, warm_days, days,
+                 position=0, open_trade=None, chunk_days=REQUEST_DAYS):
+    # 进程池 worker：从 snapshot 续算，warm_days 只预热，days 正式回测；返回 (信号文本, StreamBacktest)
+    snapshot = copy.deepcopy(snapshot)  # 同一份快照可能被主进程重跑再用一次
+    bt = StreamBacktest(strategy, calendar, p, zero_range)
+    bt.state = dict(snapshot["state"], zero_range=zero_range)
+    if bt.state["tail"] is not None:
+        bt.state["tail"] = to_frame(bt.state["tail"])[['High', 'Low', 'Close']]
+    bt.frames = snapshot["frames"]
+    bt.position = position
+    bt.ledger.open = open_trade
+    warm, run = set(warm_days), set(days)
+    first = warm_days[0] if warm_days else days[0]
+    signals = []
+    for day, df in store.iter_days(symbol, first, days[-1], chunk_days):
+        if day in warm:
+            bt.warm(df)
+        elif day in run:
+            signals += bt.feed(df)
+    bt.state = bt.frames = bt.carry = None  # 只带回结果，续算状态不用回传
+    return signals, bt
+
+def parallel_backtest(store, symbol, start_date, end_date, strategy, p=None, on_signal=print,
+                      workers=None, chunk_days=REQUEST_DAYS):
+    # 与 stream_backtest 同样返回 (台账, 常规时段分钟数, 信号数, bar 数)；信号在合并后按时间顺序交给 on_signal
+    workers = workers or os.cpu_count() or 1
+    calendar = get_calendar(start_date, end_date)
+    states, zero_range = scan_states(store.iter_records(symbol, start_date, end_date, chunk_days), strategy, p)
+    if not states:
+        raise ValueError("无数据")
+    days = [d for d, _, _ in states]
+    counts = [c for _, _, c in states]
+    need = strategy.sideways_window + 1 + dict(INDICATOR_PARAMS, **(p or {}))["ema_length"]
+
+    def job(lo, hi, position=0, open_trade=None):
+        w = _warm_start(counts, lo, need)
+        return (store, symbol, strategy, p, calendar, zero_range, states[w][1], days[w:lo], days[lo:hi],
+                position, open_trade, chunk_days)
+
+    segments = _segments(len(days), 1 if workers == 1 else workers * SEGMENTS_PER_WORKER)
+    if workers == 1:
+        results = [_run_segment(*job(lo, hi)) for lo, hi in segments]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run_segment, *job(lo, hi)) for lo, hi in segments]
+            results = [f.result() for f in futures]
+
+    # 按段顺序合并：上一段收尾仍持仓时，这一段带着仓位和未平的那笔重跑
+    ledgers, count, session_minutes, bars = [], 0, 0, 0
+    position, open_trade = 0, None
+    for (lo, hi), (signals, bt) in zip(segments, results):
+        if position != 0:
+            signals, bt = _run_segment(*job(lo, hi, position, open_trade))
+        if bt.last_ts is None and ledgers:
+            # 整段没有有效 bar：收尾沿用上一段的最后一根
+            bt.last_ts, bt.ledger.last = ledgers[-1].last_ts, ledgers[-1].ledger.last
+        for signal in signals:
+            on_signal(signal)
+        count += len(signals)
+        session_minutes += bt.session_minutes
+        bars += bt.bars
+        position, open_trade = bt.position, bt.ledger.open
+        ledgers.append(bt)
+    tail, final = ledgers[-1].finish()
+    for signal in tail:
+        on_signal(signal)
+    closed = [TradeLedger(*(bt.ledger.rows[f] for f in TradeLedger.FIELDS)) for bt in ledgers[:-1]]
+    return TradeLedger.concat(closed + [final]), session_minutes, count + len(tail), bars
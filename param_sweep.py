@@ -0,0 +1,149 @@
+import os
+import sys
+import itertools
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from market_calendar import get_calendar
+from bar_store import BarStore
+from bar_columns import BarColumns
+from fast_backtest import session_masks
+from strategy import Strategy, INDICATOR_PARAMS, INDICATOR_COLUMNS, compute_indicators
+from trade_ledger import TradeLedger, compute_metrics
+
+# ==== 参数扫描 ====
+# K 线只加载一次放进共享内存（BarColumns）；每组指标参数只算一次指标（也放进共享内存），
+# 阈值组合按块分发到进程池，最后汇总成按 PnL 排名的结果表。
+SYMBOL = "SPY"
+THRESHOLD_PARAMS = {
+    "version": "threshold",
+    "rsi_call": 53, "rsi_put": 47, "slope": 0.15,
+    "sideways_window": 3, "sideways_price": 0.002, "sideways_ema": 0.02,
+}
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close']
+# 与 spy_backtest.fetch_data 相同的预热掩码：这些列有 NaN 的 bar 不参与评估
+REQUIRED = ['High', 'Low', 'Close', 'RSI', 'RSI_SLOPE', 'MACD', 'MACDh', 'EMA20', 'K', 'D']
+
+DEFAULT_GRID = {
+    "rsi_call": [51, 53, 55],
+    "rsi_put": [45, 47, 49],
+    "slope": [0.1, 0.15, 0.2],
+    "macd_signal": [9, 20],
+    "version": ["threshold", "decay"],
+}
+
+# ==== 共享内存 ====
+# K 线、时段掩码放进一块 bar_columns.BarColumns（shared=True），每组指标参数各一块只有指标列的 BarColumns，
+# worker 按 spec 挂载，不复制
+SESSION_FLAGS = ["active", "near_close"]
+
+@contextmanager
+def _attach(*specs):
+    # 任务内挂载、任务结束就关掉，worker 不留共享内存句柄；关之前调用方要先放掉列视图
+    blocks = [BarColumns.attach(spec) for spec in specs]
+    try:
+        yield blocks
+    finally:
+        for block in blocks:
+            block.close()
+
+def _bars_frame(bars):
+    return pd.DataFrame({c: pd.Series(bars[c], copy=False) for c in BAR_COLUMNS})
+
+# ==== worker ====
+def _indicator_task(bar_spec, ind_spec, params):
+    with _attach(bar_spec, ind_spec) as (bars, out):
+        ind = compute_indicators(_bars_frame(bars), params)
+        for c in INDICATOR_COLUMNS:
+            out[c] = ind[c].to_numpy(dtype=np.float64)
+        del ind
+    return True
+
+def _evaluate_task(bar_spec, ind_spec, ind_params, combos):
+    with _attach(bar_spec, ind_spec) as (cols, ind):
+        df = _bars_frame(cols)
+        for c in INDICATOR_COLUMNS:
+            df[c] = ind[c]
+        keep = df[REQUIRED].notna().all(axis=1).to_numpy()
+        # 布尔索引出来的都是副本，之后不再引用共享内存
+        df = df[keep]
+        active, near_close = (cols[name].view(bool)[keep] for name in SESSION_FLAGS)
+        close, ts = df['Close'].to_numpy(), cols.ts[keep]
+    rows = []
+    for combo in combos:
+        p = dict(THRESHOLD_PARAMS, **combo)
+        events, position = Strategy(**p).run(df, active, near_close)
+        m = compute_metrics(TradeLedger.from_events(events, position, ts, close))
+        rows.append(dict(ind_params, **p, trades=m["trades"], hit_rate=m["win_rate"],
+                         pnl=m["total_pnl"], avg_pnl=m["expectancy"], max_drawdown=m["max_drawdown"]))
+    return rows
+
+# ==== 主流程 ====
+def expand_grid(grid):
+    keys = list(grid)
+    for values in itertools.product(*(grid[k] for k in keys)):
+        yield dict(zip(keys, values))
+
+def _split_indicator_params(combo):
+    ind = {k: combo.get(k, v) for k, v in INDICATOR_PARAMS.items()}
+    thr = {k: v for k, v in combo.items() if k not in INDICATOR_PARAMS}
+    return tuple(sorted(ind.items())), thr
+
+def _chunks(items, n):
+    size = max(1, -(-len(items) // n))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def sweep(df, grid, calendar=None, workers=None):
+    # df：只需 OHLC，美东时区索引；返回按 pnl 降序的结果表
+    workers = workers or os.cpu_count() or 1
+    calendar = calendar or get_calendar(df.index[0].date(), df.index[-1].date())
+    active, near_close = session_masks(df.index, calendar)
+    n = len(df)
+
+    groups = {}
+    for combo in expand_grid(grid):
+        key, thr = _split_indicator_params(combo)
+        groups.setdefault(key, []).append(thr)
+
+    blocks = []
+    try:
+        bars = BarColumns.allocate(n, prices=BAR_COLUMNS, indicators=[], flags=SESSION_FLAGS, shared=True)
+        blocks.append(bars)
+        bars.ts[:] = df.index.as_unit("ns").asi8
+        for c in BAR_COLUMNS:
+            bars[c] = df[c].to_numpy(dtype=np.float64)
+        bars["active"], bars["near_close"] = active, near_close
+        ind_specs = {}
+        for key in groups:
+            ind = BarColumns.allocate(n, prices=[], indicators=INDICATOR_COLUMNS, flags=[], shared=True)
+            blocks.append(ind)
+            ind_specs[key] = ind.spec()
+        bar_spec = bars.spec()
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # 第一阶段：每组指标参数只算一次
+            list(pool.map(_indicator_task, [bar_spec] * len(groups),
+                          [ind_specs[k] for k in groups], [dict(k) for k in groups]))
+            # 第二阶段：阈值组合分块评估
+            per_group = max(1, workers // max(1, len(groups)))
+            futures = [pool.submit(_evaluate_task, bar_spec, ind_specs[key], dict(key), chunk)
+                       for key, combos in groups.items() for chunk in _chunks(combos, per_group)]
+            rows = [r for f in futures for r in f.result()]
+    finally:
+        for block in blocks:
+            block.close(unlink=True)
+
+    result = pd.DataFrame(rows)
+    return result.sort_values(["pnl", "hit_rate"], ascending=False).reset_index(drop=True)
+
+if __name__ == "__main__":
+    start = datetime.strptime(sys.argv[1], "%Y-%m-%d").date() if len(sys.argv) > 1 else datetime(2025, 10, 1).date()
+    end = datetime.strptime(sys.argv[2], "%Y-%m-%d").date() if len(sys.argv) > 2 else datetime(2025, 10, 16).date()
+    bars = BarStore().fetch(SYMBOL, start, end)
+    if bars.empty:
+        raise ValueError("无数据")
+    print(f"[🔧 参数扫描] {start} ~ {end}，{len(bars)} 根 K 线")
+    table = sweep(bars, DEFAULT_GRID)
+    print(table.head(20).to_string())
@@ -0,0 +1,113 @@
+import io
+import sys
+import tempfile
+import contextlib
+import numpy as np
+import pandas as pd
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from market_calendar import get_calendar
+from bar_store import BarStore, FrameProvider
+from state_store import StateStore, MemoryBackend
+from live_clock import FakeClock
+from fast_backtest import session_masks, EVT_CALL_EXIT, EVT_PUT_EXIT, EVT_CLEAR, EVT_REV_PUT, EVT_REV_CALL, EVT_CALL, EVT_PUT
+from strategy import Strategy, add_indicators
+from timeframes import add_timeframes, parse_frames
+from tick_stream import ReplayServer, SocketFeed, bars_to_ticks
+import spy_signal_bot_v4 as bot
+
+# ==== 逐 bar 回放 ====
+# 用存下来的 1 分钟线驱动实盘守护进程的原始代码路径（run_daemon → get_data → generate_signal → 状态），
+# 时钟、数据源、状态存储全部注入：数据源只返回“当时”已经存在的 bar，所以指标预热和成交时点的前视都会暴露出来。
+# 同一天再跑一遍整段回测，逐 bar 对比两边的仓位。
+# stream=True 时改走逐笔行情路径：1 分钟线拆成逐笔由本地 ReplayServer 推送，run_stream 聚合后在 bar 收盘时评估。
+EST = ZoneInfo("America/New_York")
+POSITION_CODE = {"none": 0, "call": 1, "put": -1}
+EVENT_POSITION = {EVT_CALL_EXIT: 0, EVT_PUT_EXIT: 0, EVT_CLEAR: 0,
+                  EVT_REV_PUT: -1, EVT_REV_CALL: 1, EVT_CALL: 1, EVT_PUT: -1}
+
+class ReplayProvider(FrameProvider):
+    # 只返回请求时刻之前的数据，即使请求区间越过了当前时钟
+    def __init__(self, df, clock):
+        super().__init__(df)
+        self.clock = clock
+
+    def __call__(self, symbol, start, end):
+        return super().__call__(symbol, start, min(end, self.clock.now()))
+
+def backtest_positions(df, strategy, calendar):
+    # 整段回测每根 bar 结束后的仓位（0 / 1 / -1）
+    active, near_close = session_masks(df.index, calendar)
+    events, _ = strategy.run(df, active, near_close)
+    pos = np.full(len(df), np.nan)
+    pos[0] = 0
+    for i, e in events:
+        pos[i] = EVENT_POSITION[e]
+    return pd.Series(pos, index=df.index).ffill().astype(int)
+
+def _stream_day(day_bars, clock, store, state_store, notify, symbol, strategy):
+    # 时钟起点之前的 bar 由 run_stream 从仓库补齐，之后的拆成逐笔推送；时钟跟着行情时间走。
+    # 回放没有迟到的成交，分钟末的心跳就收盘，不等 grace
+    feed = bars_to_ticks(day_bars[day_bars.index >= clock.now()])
+    with ReplayServer({symbol: feed}) as server:
+        return bot.run_stream(SocketFeed(server.url, [symbol]), clock, state_store, store, notify,
+                              symbols=[symbol], strategy=strategy, grace=0.0, event_time=True)
+
+def replay_day(bars, day, symbol=bot.SYMBOL, version=bot.STRATEGY_VERSION, verbose=False, confirm=(),
+               stream=False):
+    # bars：至少覆盖 day 的 1 分钟线（美东时区）；返回回放结果字典
+    day_bars = bars[bars.index.date == day]
+    if day_bars.empty:
+        raise ValueError(f"{day} 无数据")
+    strategy = Strategy(version, confirm=confirm)
+    clock = FakeClock(datetime.combine(day, time(8, 0), tzinfo=EST))
+    alerts = []
+    with tempfile.TemporaryDirectory() as root:
+        store = BarStore(root, ReplayProvider(day_bars, clock))
+        state_store = StateStore(MemoryBackend())
+        out = io.StringIO()
+        with contextlib.redirect_stdout(sys.stdout if verbose else out):
+            if stream:
+                ticks = _stream_day(day_bars, clock, store, state_store, alerts.append, symbol, strategy)
+            else:
+                ticks = bot.run_daemon(clock, state_store, store, alerts.append, symbols=[symbol],
+                                       strategy=strategy)
+
+    # 实盘：bar_close=T 的 tick 评估的是 T-1 分钟那根 bar
+    live = pd.Series({t["bar_close"] - timedelta(minutes=1): POSITION_CODE[t["positions"].get(symbol, "none")]
+                      for t in ticks}, dtype=int)
+    calendar = get_calendar(day, day)
+    full = add_indicators(store.validate_frame(symbol, day_bars))
+    if confirm:
+        full = add_timeframes(full, confirm)
+    full = full.dropna(subset=['RSI', 'RSI_SLOPE', 'MACD', 'MACDh', 'EMA20', 'K', 'D'])
+    back = backtest_positions(full, strategy, calendar).reindex(live.index)
+    compared = back.notna()
+    diff = compared & (live != back)
+    return {
+        "ticks": ticks,
+        "alerts": alerts,
+        "live": live,
+        "backtest": back,
+        "bars": int(compared.sum()),
+        "divergent": int(diff.sum()),
+        "divergence_rate": float(diff.sum() / compared.sum()) if compared.any() else 0.0,
+        "first_divergence": diff.idxmax() if diff.any() else None,
+    }
+
+def format_report(day, result):
+    lines = [f"[🔂 回放] {day}：{len(result['ticks'])} 个 tick，{len(result['alerts'])} 条告警",
+             f"实盘 vs 回测仓位不一致：{result['divergent']} / {result['bars']} 根 bar（{result['divergence_rate']:.1%}）"]
+    if result["first_divergence"] is not None:
+        lines.append(f"首次不一致：{result['first_divergence']}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    day = datetime.strptime(sys.argv[1], "%Y-%m-%d").date() if len(sys.argv) > 1 else datetime(2025, 10, 16).date()
+    symbol = sys.argv[2].upper() if len(sys.argv) > 2 else bot.SYMBOL
+    confirm = parse_frames(next((a.split("=", 1)[1] for a in sys.argv[3:] if a.startswith("htf=")), ""))
+    bars = BarStore().fetch(symbol, day, day)
+    result = replay_day(bars, day, symbol, confirm=confirm, stream="stream" in sys.argv[3:])
+    for msg in result["alerts"]:
+        print(msg)
+    print(format_report(day, result))
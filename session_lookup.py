@@ -0,0 +1,48 @@
+import os
+import json
+from bisect import bisect_left
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
+
+# ==== 交易时段快速查询（仅标准库） ====
+# 每分钟冷启动的机器人在收盘后 / 非交易日只需要回答“现在开没开盘”，
+# 直接读 market_calendar 落盘的 JSON 时段表，不加载 numpy / pandas / pandas_market_calendars。
+# 缓存缺失或不覆盖今天时才退回 market_calendar.get_calendar（会重建并写回缓存）。
+EST = ZoneInfo("America/New_York")
+SESSION_CACHE = os.environ.get("SESSION_CACHE", os.path.join(".cache", "nasdaq_sessions.json"))
+EPOCH = date(1970, 1, 1)
+
+_table = None
+
+def _load(path):
+    global _table
+    if _table is None or _table[0] != path:
+        with open(path) as f:
+            payload = json.load(f)
+        _table = (path, date.fromisoformat(payload["start"]), date.fromisoformat(payload["end"]),
+                  payload["days"], payload["open_ns"], payload["close_ns"])
+    return _table
+
+def session_bounds(now, path=SESSION_CACHE):
+    # 返回当天 (开盘, 收盘)（美东 datetime），非交易日返回 None
+    now = now.astimezone(EST)
+    day = now.date()
+    try:
+        _, start, end, days, open_ns, close_ns = _load(path)
+    except (OSError, ValueError, KeyError):
+        start = end = None
+    if start is None or not (start <= day <= end):
+        from market_calendar import get_calendar
+        bounds = get_calendar(day, day).session_bounds(now)
+        return None if bounds is None else tuple(b.to_pydatetime() for b in bounds)
+    n = (day - EPOCH).days
+    i = bisect_left(days, n)
+    if i == len(days) or days[i] != n:
+        return None
+    return tuple(datetime.fromtimestamp(ns / 1e9, tz=timezone.utc).astimezone(EST)
+                 for ns in (open_ns[i], close_ns[i]))
+
+def is_open(now, path=SESSION_CACHE):
+    # 与 SessionCalendar.is_open 一致：open <= now <= close
+    bounds = session_bounds(now, path)
+    return bounds is not None and bounds[0] <= now <= bounds[1]
@@ -0,0 +1,158 @@
+import sys
+import numpy as np
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from market_calendar import get_calendar
+from bar_store import BarStore
+from bar_columns import BarColumns
+from strategy import Strategy, DEFAULT_VERSION, INDICATOR_COLUMNS, add_indicators, fill_indicators, reference_signals
+from trade_ledger import backtest_ledger, compute_metrics, format_metrics
+from fast_backtest import session_masks
+from stream_backtest import stream_backtest
+from parallel_backtest import parallel_backtest
+from timeframes import add_timeframes, compute_timeframes, parse_frames, trend_column
+from execution import parse_execution
+
+# ==== 回测入口 ====
+# spy_backtest_original.py（MACDh 衰减出场）与 spy_backtest_date.py（阈值出场，与实盘机器人一致）
+# 只差默认策略版本，拉数据、回测、统计都在这里，两个脚本各自调 main(版本)。
+
+# ==== 配置 ====
+SYMBOL = "SPY"
+EST = ZoneInfo("America/New_York")
+bar_store = BarStore()
+# 命令行只写 compact 时的指标精度：float32 才比 DataFrame 省内存（见 bar_columns）；
+# 要与 vector / stream 逐位一致用 compact=float64
+COMPACT_DTYPE = "float32"
+
+# ==== 数据拉取 ====
+def fetch_data(start_date, end_date, confirm=()):
+    # 已收盘的交易日走本地仓库，只向数据源请求缺失的日子
+    df = bar_store.fetch(SYMBOL, start_date, end_date)
+    if df.empty:
+        raise ValueError("无数据")
+
+    # 指标计算（与实盘同一份 strategy.compute_indicators）
+    df = add_indicators(df)
+    if confirm:
+        # 大周期趋势用完整的分钟线聚合，再随指标一起去掉预热期
+        df = add_timeframes(df, confirm)
+    df.dropna(subset=['High','Low','Close','RSI','RSI_SLOPE','MACD','MACDh','EMA20','K','D'], inplace=True)
+    return df
+
+def fetch_bars(start_date, end_date, confirm=(), indicator_dtype=np.dtype(COMPACT_DTYPE)):
+    # 紧凑版 fetch_data：结构数组直接进预分配的 BarColumns，指标写进列里、原地去掉预热期，不经过 DataFrame。
+    # 大周期趋势作为额外的指标列（-1 / 0 / 1）
+    rec = bar_store.fetch_records(SYMBOL, start_date, end_date)
+    if rec is None:
+        raise ValueError("无数据")
+    bars = BarColumns.from_records(rec, INDICATOR_COLUMNS + [trend_column(m) for m in confirm], indicator_dtype)
+    fill_indicators(bars)
+    if confirm:
+        for name, trend in compute_timeframes(bars, confirm).items():
+            bars[name] = trend.to_numpy()
+    bars.dropna(['High','Low','Close','RSI','RSI_SLOPE','MACD','MACDh','EMA20','K','D'])
+    return bars
+
+# ==== 统计输出 ====
+def report(ledger, session_minutes, ledger_path=None, execution=None):
+    # 信号价统计；给了 execution（execution.ExecutionModel）时再按下一根开盘成交 + 滑点 / 手续费统计一遍
+    print(format_metrics(compute_metrics(ledger, session_minutes)))
+    fills = execution.simulate(ledger) if execution else None
+    if fills is not None:
+        print(f"[💵 成交模拟] {execution.describe()}（盈亏单位：{fills.unit}）")
+        print(format_metrics(compute_metrics(ledger, session_minutes, fills.pnl)))
+    if ledger_path:
+        ledger.export(ledger_path, fills.columns() if fills is not None else None)
+        print(f"台账已导出：{ledger_path}")
+
+# ==== 回测主逻辑 ====
+def backtest_loop(df, strategy):
+    calendar = get_calendar(df.index[0].date(), df.index[-1].date())
+    return reference_signals(df, strategy, calendar)
+
+def backtest_vector(df, strategy, masks=None):
+    calendar = get_calendar(df.index[0].date(), df.index[-1].date())
+    return strategy.signals(df, calendar, masks)
+
+def backtest(start_date_str, end_date_str, mode="vector", ledger_path=None, version=DEFAULT_VERSION, confirm=(),
+             workers=None, compact=None, explain=False, execution=None):
+    # compact="float64" / "float32"：vector 模式改用紧凑列式数据（指标列的精度），条件数组存进 uint8 标记列；
+    # explain=True 时最后按子条件位图统计常规时段的入场触发 / 差一条 / 最常挡住入场的条件
+    # execution：execution.ExecutionModel，另按下一根开盘成交、滑点、手续费（可选 0DTE 期权）统计
+    strategy = Strategy(version, confirm=confirm)
+    start_date = datetime.strptime(start_date_str,"%Y-%m-%d").date()
+    end_date = datetime.strptime(end_date_str,"%Y-%m-%d").date()
+    print(f"[🔁 回测时间区间] {start_date} ~ {end_date}（策略 {strategy.version}）")
+    if strategy.confirm:
+        print(f"[⏱ 多周期确认] {' / '.join(f'{m} 分钟' for m in strategy.confirm)}")
+
+    if mode in ("stream", "parallel"):
+        # 长区间：按块拉取、逐日计算，内存与区间长度无关；stream 信号边算边打印，
+        # parallel 交易日分段跑在进程池上，合并后按时间顺序打印，结果与 stream 一致
+        if mode == "parallel":
+            ledger, session_minutes, n_signals, bars = parallel_backtest(bar_store, SYMBOL, start_date, end_date,
+                                                                         strategy, workers=workers)
+        else:
+            ledger, session_minutes, n_signals, bars = stream_backtest(bar_store, SYMBOL, start_date, end_date, strategy)
+        print(f"数据条数：{bars}")
+        print(f"[🧹 数据校验] {bar_store.validator.summary()}")
+        print(f"总信号数：{n_signals}")
+        report(ledger, session_minutes, ledger_path, execution)
+        return ledger
+
+    if compact and mode != "vector":
+        raise ValueError("compact 只支持 vector 模式")
+    df = fetch_bars(start_date, end_date, strategy.confirm, np.dtype(compact)) if compact else \
+        fetch_data(start_date, end_date, strategy.confirm)
+    # 子条件位图算一次存进 COND 列，入场 / 出场等条件数组都由它还原
+    cond = strategy.conditions(df)
+    cond.attach(df)
+    masks = cond.masks()
+    if compact:
+        df.set_flags(masks)
+        masks = df.flag_masks()
+        print(f"[🗜 紧凑数据] 指标 {compact}，{df.nbytes / 2**20:.1f} MiB")
+    print(f"数据条数：{len(df)}")
+    print(f"[🧹 数据校验] {bar_store.validator.summary()}")
+
+    if mode == "verify":
+        # 等价性校验：向量化结果必须与逐行循环完全一致
+        loop_signals = backtest_loop(df, strategy)
+        vec_signals = backtest_vector(df, strategy, masks)
+        assert vec_signals == loop_signals, "向量化信号与逐行循环不一致"
+        print(f"✅ 向量化与逐行循环一致（{len(vec_signals)} 条信号）")
+        signals = vec_signals
+    elif mode == "loop":
+        signals = backtest_loop(df, strategy)
+    else:
+        signals = backtest_vector(df, strategy, masks)
+
+    print(f"总信号数：{len(signals)}")
+    for s in signals:
+        print(s)
+
+    # 交易台账与统计
+    calendar = get_calendar(df.index[0].date(), df.index[-1].date())
+    ledger, session_minutes = backtest_ledger(df, strategy, calendar, masks)
+    report(ledger, session_minutes, ledger_path, execution)
+    if explain:
+        print("[🔍 条件统计（常规时段）]")
+        print(cond.report(where=session_masks(df.index, calendar)[0]))
+    return ledger
+
+# ==== 命令行 ====
+def main(strategy_version=DEFAULT_VERSION, argv=None):
+    # 模式 vector / loop / verify / stream / parallel，start= end= strategy= htf= workers= compact[=float64] ledger= explain，
+    # 成交模拟参数见 execution.parse_execution；strategy= 覆盖脚本给的默认策略版本
+    args = [a.lstrip("-") for a in (sys.argv[1:] if argv is None else argv)]
+    mode = next((a for a in args if a in ("vector", "loop", "verify", "stream", "parallel")), "vector")
+    ledger_path = next((a.split("=", 1)[1] for a in args if a.startswith("ledger=")), None)
+    version = next((a.split("=", 1)[1] for a in args if a.startswith("strategy=")), strategy_version)
+    start = next((a.split("=", 1)[1] for a in args if a.startswith("start=")), "2025-10-16")
+    end = next((a.split("=", 1)[1] for a in args if a.startswith("end=")), start)
+    confirm = parse_frames(next((a.split("=", 1)[1] for a in args if a.startswith("htf=")), ""))
+    workers = next((int(a.split("=", 1)[1]) for a in args if a.startswith("workers=")), None)
+    compact = next((a.partition("=")[2] or COMPACT_DTYPE for a in args if a.split("=")[0] == "compact"), None)
+    backtest(start, end, mode=mode, ledger_path=ledger_path, version=version, confirm=confirm, workers=workers,
+             compact=compact, explain="explain" in args, execution=parse_execution(args))
@@ -1,12 +1,15 @@
 import os
-import json
-import requests
-import pandas as pd
+import sys
 from datetime import datetime, timedelta, time
 from zoneinfo import ZoneInfo
-import yfinance as yf
-import pandas_ta as ta
-import pandas_market_calendars as mcal
+import session_lookup
+from live_clock import SystemClock, next_bar_close
+from tick_metrics import TickTimer, NULL_TIMER, emit, emit_delivery
+from alert_queue import batch_alerts
+
+# 顶层只引入标准库和轻量模块：一次性运行大多落在盘后 / 非交易日，
+# 只查缓存的交易时段表就退出。numpy / pandas / 指标 / requests 等在真正要算信号或读写状态时
+# 才在函数内 import（之后的调用命中 sys.modules，几乎无开销）。
 
 # ========== 全局配置 ==========
 GIST_ID = "7490de39ccc4e20445ef576832bea34b"
@@ -14,203 +17,220 @@ GIST_FILENAME = "last_signal.json"
 GIST_TOKEN = os.environ.get("GIST_TOKEN")
 DISCORD_WEBHOOK_URL = os.environ.get("DISCORD_WEBHOOK_URL")
 SYMBOL = "SPY"
+# 同一策略跑多个标的，逗号分隔；一次运行并发扫描全部
+SYMBOLS = [s.strip().upper() for s in os.environ.get("SYMBOLS", SYMBOL).split(",") if s.strip()]
+SCAN_WORKERS = 16
+STRATEGY_VERSION = os.environ.get("STRATEGY_VERSION", "threshold")
+# 入场要求同向的大周期（分钟），如 "5,15"；留空不做多周期确认
+HTF_CONFIRM = tuple(int(m) for m in os.environ.get("HTF_CONFIRM", "").split(",") if m.strip())
 EST = ZoneInfo("America/New_York")
-nasdaq = mcal.get_calendar("NASDAQ")
-
-# ========== Gist 状态管理 ==========
-def load_last_signal_from_gist():
-    if not GIST_TOKEN:
-        return {"position": "none"}
-    try:
-        r = requests.get(
-            f"https://api.github.com/gists/{GIST_ID}",
-            headers={"Authorization": f"token {GIST_TOKEN}"}
-        )
-        content = r.json()["files"][GIST_FILENAME]["content"]
-        return json.loads(content)
-    except:
-        return {"position": "none"}
-
-def save_last_signal(state):
-    if not GIST_TOKEN:
-        return
-    headers = {
-        "Authorization": f"token {GIST_TOKEN}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    data = {"files": {GIST_FILENAME: {"content": json.dumps(state)}}}
-    requests.patch(f"https://api.github.com/gists/{GIST_ID}", headers=headers, json=data)
-
-load_last_signal = load_last_signal_from_gist
+bar_store = None  # 首次拉数据时创建
+INDICATOR_STATE = os.environ.get("INDICATOR_STATE", os.path.join(".cache", "indicators", "{symbol}.json"))
+TIMEFRAME_STATE = os.environ.get("TIMEFRAME_STATE", os.path.join(".cache", "indicators", "{symbol}.htf.json"))
+# 告警后附上触发规则的子条件（condition_bits），如“call_entry 6/6：Close>EMA20 RSI>53 …”
+EXPLAIN_ALERTS = os.environ.get("EXPLAIN_ALERTS", "") not in ("", "0")
+# 逐笔行情推送地址（tcp://host:port，见 tick_stream.SocketFeed），--stream 模式使用
+STREAM_URL = os.environ.get("STREAM_URL")
+# 按时钟收盘前多等几秒迟到的成交（tick_stream.BarAggregator 的 grace），命令行 --grace=秒 覆盖
+STREAM_GRACE = float(os.environ.get("STREAM_GRACE", "1.5"))
+# 告警队列（alert_queue）：未送达告警的落盘位置、合并窗口秒数、一次性运行退出前最多等几秒送达
+ALERT_SPOOL = os.environ.get("ALERT_SPOOL", os.path.join(".cache", "alerts.json"))
+ALERT_WINDOW = float(os.environ.get("ALERT_WINDOW", "1"))
+ALERT_TIMEOUT = float(os.environ.get("ALERT_TIMEOUT", "20"))
+
+# ========== 状态管理 ==========
+STATE_FILE = os.environ.get("STATE_FILE", os.path.join(".cache", "last_signal.json"))
+
+def make_state_store():
+    # 有 GIST_TOKEN 用 Gist，否则落本地文件
+    from state_store import StateStore, GistBackend, FileBackend
+    if GIST_TOKEN:
+        return StateStore(GistBackend(GIST_ID, GIST_FILENAME, GIST_TOKEN))
+    return StateStore(FileBackend(STATE_FILE))
+
+def symbol_state(state, symbol):
+    # 各标的仓位放在同一个状态文档的 symbols 下；旧格式顶层的 position 归 SPY
+    books = state.setdefault("symbols", {})
+    if symbol not in books:
+        legacy = state.pop("position", "none") if symbol == SYMBOL else "none"
+        books[symbol] = {"position": legacy}
+    return books[symbol]
 
 # ========== 时间工具 ==========
 def get_est_now():
     return datetime.now(tz=EST)
 
-def is_market_open_now():
-    now = get_est_now()
-    sch = nasdaq.schedule(start_date=now.date(), end_date=now.date())
-    if sch.empty:
-        return False
-    market_open = sch.iloc[0]['market_open'].tz_convert(EST)
-    market_close = sch.iloc[0]['market_close'].tz_convert(EST)
-    return market_open <= now <= market_close
+def is_market_open_now(now=None):
+    return session_lookup.is_open(now or get_est_now())
 
 # ========== 强制清仓机制 ==========
-def force_clear_at_open():
-    now = get_est_now()
-    # 开盘前 9:30 清仓
+def force_clear_at_open(state, now=None):
+    now = now or get_est_now()
+    # 开盘前 9:30 清仓（所有标的）
     if now.time() < time(9, 30):
-        state = load_last_signal()
-        if state.get("position", "none") != "none":
-            state["position"] = "none"
-            save_last_signal(state)
+        books = list(state.get("symbols", {}).values()) + ([state] if "position" in state else [])
+        held = [b for b in books if b.get("position", "none") != "none"]
+        for book in held:
+            book["position"] = "none"
+        if held:
             print(f"[{now.strftime('%Y-%m-%d %H:%M:%S %Z')}] ⏰ 盘前清仓（状态归零）")
 
-# ========== 技术指标 ==========
-def compute_rsi(s, length=14):
-    delta = s.diff()
-    up = delta.clip(lower=0)
-    down = -delta.clip(upper=0)
-    rs = up.rolling(length).mean() / down.rolling(length).mean()
-    return (100 - 100 / (1 + rs)).fillna(50)
-
-def compute_macd(df):
-    macd = ta.macd(df['Close'], fast=5, slow=10, signal=20)
-    df['MACD'] = macd['MACD_5_10_20'].fillna(0)
-    df['MACDs'] = macd['MACDs_5_10_20'].fillna(0)
-    df['MACDh'] = macd['MACDh_5_10_20'].fillna(0)
-    return df
+# ========== 增量指标 ==========
+def indicator_state_path(symbol):
+    return INDICATOR_STATE.format(symbol=symbol)
 
-def compute_kdj(df, length=9, signal=3):
-    kdj = ta.stoch(df['High'], df['Low'], df['Close'], k=length, d=signal, smooth_k=signal)
-    df['K'] = kdj['STOCHk_9_3_3'].fillna(50)
-    df['D'] = kdj['STOCHd_9_3_3'].fillna(50)
-    return df
+def load_indicator_engine(df, symbol=SYMBOL):
+    # 上一分钟保存的状态仍落在今天的数据里才沿用，否则从 04:00 第一根重新喂
+    from stream_indicators import IndicatorEngine
+    try:
+        with open(indicator_state_path(symbol)) as f:
+            engine = IndicatorEngine.loads(f.read())
+    except (OSError, ValueError, KeyError, TypeError):
+        return IndicatorEngine()
+    if engine.last_ts is None or engine.last_ts not in df.index:
+        return IndicatorEngine()
+    return engine
+
+def _write_state(path, text):
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except OSError as e:
+        print("[指标状态保存失败]", e)
+
+def save_indicator_engine(engine, symbol=SYMBOL):
+    _write_state(indicator_state_path(symbol), engine.dumps())
+
+def apply_indicators(df, engine=None, symbol=SYMBOL, rebuild=False):
+    # 只喂上次之后的新 bar（最后一根未走完的分钟线会被回滚重算），
+    # 返回最近几行带指标的数据，数值与 strategy.compute_indicators 整段计算一致。
+    # rebuild=True（已喂过的 bar 被修订）时丢掉旧状态从头重喂
+    from stream_indicators import IndicatorEngine
+    persist = engine is None
+    if engine is None:
+        engine = IndicatorEngine() if rebuild else load_indicator_engine(df, symbol)
+    elif rebuild:
+        engine.reset()
+    engine.update_frame(df)
+    if not engine.ready:
+        raise ValueError("数据不足，指标未就绪")
+    if persist:
+        save_indicator_engine(engine, symbol)
+    rows = [row for _, row in engine.rows]
+    tail = df.iloc[-len(rows):].copy()
+    for col in IndicatorEngine.COLUMNS:
+        tail[col] = [row[col] for row in rows]
+    return tail
+
+# ========== 多周期确认 ==========
+def load_timeframe_engine(df, symbol=SYMBOL, confirm=HTF_CONFIRM):
+    # 与指标引擎一样：上次的状态仍落在今天的数据里、周期也没变才沿用
+    from timeframes import TimeframeEngine
+    try:
+        with open(TIMEFRAME_STATE.format(symbol=symbol)) as f:
+            engine = TimeframeEngine.loads(f.read())
+    except (OSError, ValueError, KeyError, TypeError):
+        return TimeframeEngine(confirm)
+    ts = df.index.as_unit("ns").asi8
+    if engine.frames != tuple(confirm) or engine.last_ns is None or engine.last_ns not in ts:
+        return TimeframeEngine(confirm)
+    return engine
+
+def apply_timeframes(df, tail, now, engine=None, symbol=SYMBOL, confirm=HTF_CONFIRM, rebuild=False):
+    # 只把上次之后已收盘的 1 分钟 bar 累加进 5 / 15 分钟线，大周期 bar 走完才更新一次趋势；
+    # 返回加上 TREND_* 列的 tail
+    from timeframes import TimeframeEngine
+    persist = engine is None
+    if engine is None:
+        engine = TimeframeEngine(confirm) if rebuild else load_timeframe_engine(df, symbol, confirm)
+    elif rebuild:
+        engine.reset()
+    engine.update_frame(df, now)
+    if persist:
+        _write_state(TIMEFRAME_STATE.format(symbol=symbol), engine.dumps())
+    return engine.attach(tail)
 
 # ========== 数据拉取 ==========
-def get_data():
-    now = get_est_now()
-    start_time = now.replace(hour=4, minute=0, second=0, microsecond=0)
-    start_utc = start_time.astimezone(ZoneInfo("UTC")).replace(tzinfo=None)
-    end_utc = now.astimezone(ZoneInfo("UTC")).replace(tzinfo=None)
-
-    df = yf.download(
-        SYMBOL, interval="1m", start=start_utc, end=end_utc,
-        progress=False, prepost=True, auto_adjust=True
-    )
+def get_data(now=None, engine=None, bars=None, closed_only=False, symbol=SYMBOL, timer=NULL_TIMER,
+             htf=None, confirm=()):
+    global bar_store
+    now = now or get_est_now()
+    if bars is None:
+        if bar_store is None:
+            from bar_store import BarStore
+            bar_store = BarStore()
+        bars = bar_store
+    # 当天盘中数据本地缓存，只补拉最后几分钟之后的增量；取出时已按 bar_validation 校验。
+    # 数据源修订了已经喂给指标引擎的 bar 时，引擎从头重喂
+    with timer.stage("fetch"):
+        df = bars.fetch(symbol, now.date(), now.date(), now=now)
+    validator = getattr(bars, "validator", None)
+    revised = validator.take_revised(symbol) if validator is not None else None
+    rebuild = revised is not None and len(revised) > 0
+    if closed_only:
+        # 守护模式只评估已收盘的 bar，丢掉正在走的这一分钟
+        df = df[df.index < now.replace(second=0, microsecond=0)]
     if df.empty:
         raise ValueError("数据为空")
 
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
-
-    df = df.dropna(subset=["High", "Low", "Close"])
-
-    if df.index.tz is None:
-        df.index = df.index.tz_localize("UTC").tz_convert(EST)
-    else:
-        df.index = df.index.tz_convert(EST)
-
-    df['RSI'] = compute_rsi(df['Close'])
-    df['RSI_SLOPE'] = df['RSI'].diff(3)
-    df['EMA20'] = ta.ema(df['Close'], length=20)
-    df = compute_macd(df)
-    df = compute_kdj(df)
+    with timer.stage("indicators"):
+        df = df.dropna(subset=["High", "Low", "Close"])
+        tail = apply_indicators(df, engine, symbol, rebuild)
+    if confirm:
+        with timer.stage("timeframes"):
+            tail = apply_timeframes(df, tail, now, htf, symbol, confirm, rebuild)
+    df = tail
 
-    df.ffill(inplace=True)
+    # 缺失分钟由 bar_validation 按 BAR_GAPS 策略处理，这里不再整表 ffill（与回测一致，只去掉指标未就绪的行）
     df.dropna(subset=["High", "Low", "Close", "RSI", "MACD", "MACDh", "EMA20", "K", "D"], inplace=True)
     return df
 
-# ========== 震荡带判断 ==========
-def is_sideways(row, df, idx, window=3, price_threshold=0.002, ema_threshold=0.02):
-    if idx < window:
-        return False
-    price_near = abs(row['Close'] - row['EMA20']) / row['EMA20'] < price_threshold
-    ema_now = row['EMA20']
-    ema_past = df.iloc[idx - window]['EMA20']
-    ema_flat = abs(ema_now - ema_past) < ema_threshold
-    return price_near and ema_flat
-
-# ========== 信号判断 ==========
-def check_call_entry(row):
-    return (row['Close'] > row['EMA20'] and row['RSI'] > 53 and row['MACD'] > 0 and row['MACDh'] > 0 and row['RSI_SLOPE'] > 0.15
-            and row['K'] > row['D'])
-
-def check_put_entry(row):
-    return (row['Close'] < row['EMA20'] and row['RSI'] < 47 and row['MACD'] < 0 and row['MACDh'] < 0 and row['RSI_SLOPE'] < -0.15
-            and row['K'] < row['D'])
-
-def check_call_exit(row):
-    exit_cond = row['RSI'] < 50 and row['RSI_SLOPE'] < 0 and (row['MACD'] < 0.05 or row['MACDh'] < 0.05)
-    strong_kdj = row['K'] > row['D']
-    return exit_cond and not strong_kdj
-
-def check_put_exit(row):
-    exit_cond = row['RSI'] > 50 and row['RSI_SLOPE'] > 0 and (row['MACD'] > -0.05 or row['MACDh'] > -0.05)
-    strong_kdj = row['K'] < row['D']
-    return exit_cond and not strong_kdj
-
-def is_trend_continuation(row, prev, position):
-    if position == "call":
-        return row['MACDh'] > 0 and row['RSI'] > 45
-    elif position == "put":
-        return row['MACDh'] < 0 and row['RSI'] < 55
-    return False
-
 # ========== 信号判断主逻辑 ==========
-def generate_signal(df):
+POSITION_CODE = {"none": 0, "call": 1, "put": -1}
+POSITION_NAME = {0: "none", 1: "call", -1: "put"}
+
+def generate_signal(df, state, strategy=None):
+    # 与回测同一个 Strategy：条件数组 + 仓位状态机，只走最后一根 bar；
+    # state 只在内存里修改，由调用方统一 flush
     if df.empty or 'MACD' not in df.columns or df['MACD'].isnull().all() or len(df) < 6:
         return None, None
+    from strategy import Strategy
+    from fast_backtest import EVT_CALL_EXIT, EVT_PUT_EXIT, EVT_REV_PUT, EVT_REV_CALL, EVT_CALL, EVT_PUT
 
-    state = load_last_signal()
+    strategy = strategy or Strategy(STRATEGY_VERSION, confirm=HTF_CONFIRM)
     pos = state.get("position", "none")
-    idx = len(df) - 1
-    row = df.iloc[idx]
-    prev = df.iloc[idx - 1]
-    sideways = is_sideways(row, df, idx)
-
-    # 当前持有 Call
-    if pos == "call":
-        if check_call_exit(row):
-            if not is_trend_continuation(row, prev, "call"):
-                state["position"] = "none"
-                save_last_signal(state)
-                signal = f"[{row.name.strftime('%Y-%m-%d %H:%M:%S %Z')}] ⏹ Call 出场"
-                if check_put_entry(row) and not sideways:
-                    state["position"] = "put"
-                    save_last_signal(state)
-                    signal += f" | 🔁 反手 Put 入场"
-                return None, signal
-
-    # 当前持有 Put
-    elif pos == "put":
-        if check_put_exit(row):
-            if not is_trend_continuation(row, prev, "put"):
-                state["position"] = "none"
-                save_last_signal(state)
-                signal = f"[{row.name.strftime('%Y-%m-%d %H:%M:%S %Z')}] ⏹ Put 出场"
-                if check_call_entry(row) and not sideways:
-                    state["position"] = "call"
-                    save_last_signal(state)
-                    signal += f" | 🔁 反手 Call 入场"
-                return None, signal
-
-    # 空仓状态
-    elif pos == "none":
-        if sideways:
-            pass  # 横盘不入场
-        else:
-            if check_call_entry(row):
-                state["position"] = "call"
-                save_last_signal(state)
-                return row.name, "📈 主升浪 Call 入场"
-
-            elif check_put_entry(row):
-                state["position"] = "put"
-                save_last_signal(state)
-                return row.name, "📉 主跌浪 Put 入场"
-
+    events, new_pos = strategy.step(df, POSITION_CODE.get(pos, 0))
+    state["position"] = POSITION_NAME[new_pos]
+    ts = df.index[-1]
+
+    def explain(*rules):
+        if not EXPLAIN_ALERTS:
+            return ""
+        cond = strategy.conditions(df)
+        return "（" + "；".join(cond.describe(len(df) - 1, rule) for rule in rules) + "）"
+
+    # 出场（可能同一根 bar 反手）
+    if EVT_CALL_EXIT in events or EVT_PUT_EXIT in events:
+        side = "Call" if EVT_CALL_EXIT in events else "Put"
+        signal = f"[{ts.strftime('%Y-%m-%d %H:%M:%S %Z')}] ⏹ {side} 出场"
+        if EVT_REV_PUT in events:
+            signal += f" | 🔁 反手 Put 入场"
+        elif EVT_REV_CALL in events:
+            signal += f" | 🔁 反手 Call 入场"
+        # 出场 = 出场条件满足且趋势中继不满足；反手另看入场与震荡
+        rules = [f"{side.lower()}_exit", f"{side.lower()}_cont"] \
+            + (["put_entry", "sideways"] if EVT_REV_PUT in events else []) \
+            + (["call_entry", "sideways"] if EVT_REV_CALL in events else [])
+        return None, signal + explain(*rules)
+
+    # 空仓入场
+    if EVT_CALL in events:
+        return ts, "📈 主升浪 Call 入场" + explain("call_entry", "sideways")
+    if EVT_PUT in events:
+        return ts, "📉 主跌浪 Put 入场" + explain("put_entry", "sideways")
     return None, None
 
 # ========== 通知 ==========
@@ -218,40 +238,329 @@ def send_to_discord(message):
     if not DISCORD_WEBHOOK_URL:
         print("[通知] DISCORD_WEBHOOK_URL 未设置")
         return
-    requests.post(DISCORD_WEBHOOK_URL, json={"content": message})
+    from http_io import default_client
+    default_client().post(DISCORD_WEBHOOK_URL, json={"content": message})
+
+def format_message(time_signal, signal):
+    if time_signal:
+        return f"[{time_signal.strftime('%Y-%m-%d %H:%M:%S %Z')}] {signal}"
+    return signal
+
+_alerts = None
+
+def alert_queue():
+    # 进程内唯一的告警队列，第一次用到时建（顺带补发上次没送达的）
+    global _alerts
+    if _alerts is None:
+        from alert_queue import AlertQueue
+        _alerts = AlertQueue(send_to_discord, ALERT_SPOOL, ALERT_WINDOW, report=emit_delivery)
+    return _alerts
+
+def close_alerts(timeout=ALERT_TIMEOUT):
+    # 退出前尽量送达；超时的留在 ALERT_SPOOL，下次启动补发
+    global _alerts
+    if _alerts is not None:
+        _alerts.close(timeout)
+        _alerts = None
+
+# ========== 多标的扫描 ==========
+def scan_symbols(state, symbols=None, now=None, engines=None, bars=None, closed_only=False, strategy=None,
+                 timer=NULL_TIMER, htf_engines=None):
+    # 每个标的一个线程：拉数据（I/O）→ 指标 → 信号；单个标的出错不影响其他标的。
+    # 返回按标的顺序排列的 [(标的, 消息)]
+    symbols = symbols or SYMBOLS
+    now = now or get_est_now()
+    confirm = strategy.confirm if strategy is not None else HTF_CONFIRM
+    # 仓位和指标引擎先在主线程建好，线程里只动各自那份
+    books = {sym: symbol_state(state, sym) for sym in symbols}
+    if engines is not None:
+        from stream_indicators import IndicatorEngine
+        for sym in symbols:
+            engines.setdefault(sym, IndicatorEngine())
+    if htf_engines is not None and confirm:
+        from timeframes import TimeframeEngine
+        for sym in symbols:
+            htf_engines.setdefault(sym, TimeframeEngine(confirm))
+
+    def scan(sym):
+        try:
+            engine = engines[sym] if engines is not None else None
+            htf = htf_engines.get(sym) if htf_engines is not None else None
+            df = get_data(now=now, engine=engine, bars=bars, closed_only=closed_only, symbol=sym, timer=timer,
+                          htf=htf, confirm=confirm)
+            with timer.stage("signal"):
+                time_signal, signal = generate_signal(df, books[sym], strategy)
+            return format_message(time_signal, signal) if signal else None
+        except Exception as e:
+            print(f"[错误] {sym}:", e)
+            return None
+
+    if len(symbols) == 1:
+        results = [scan(symbols[0])]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(len(symbols), SCAN_WORKERS)) as pool:
+            results = list(pool.map(scan, symbols))
+    return [(sym, msg) for sym, msg in zip(symbols, results) if msg]
+
+# ========== 守护模式 ==========
+DAEMON_OFFSET = 5  # bar 收盘后等几秒再拉数据，给数据源落地
+STATE_RETRY = 5.0  # 常驻进程启动时读状态失败后首次重试的间隔（秒），之后翻倍
+STATE_RETRY_MAX = 60.0
+
+def load_state(state_store, clock, until):
+    # 守护 / 行情流启动时读仓位状态：Gist 一时读不到就退避重试，不让一次故障废掉整个时段；
+    # 到 until（收盘）还读不到返回 None
+    wait = STATE_RETRY
+    while True:
+        try:
+            return state_store.state
+        except Exception as e:
+            retry_at = clock.now() + timedelta(seconds=wait)
+            if retry_at > until:
+                print("[错误] 读取仓位状态失败，放弃本时段：", e)
+                return None
+            print(f"[错误] 读取仓位状态失败，{wait:g} 秒后重试：", e)
+            clock.sleep_until(retry_at)
+            wait = min(wait * 2, STATE_RETRY_MAX)
+
+def publish(alerts, state_store=None, notify=None, timer=NULL_TIMER):
+    # 状态写回和告警推送并发发出；任何一个失败只打印，不影响其他。
+    # 默认告警只进 alert_queue（去重 / 合并 / 限流 / 落盘由后台线程处理），这里不等 webhook；
+    # 给了 notify（回放 / 测试）则按原样同步推送合并后的几条。
+    # 入队时带上 bar 收盘时刻，送达延迟由队列送达后另报（tick_metrics.emit_delivery）
+    from http_io import dispatch
+    calls = [timer.timed("state_save", state_store.flush)] if state_store is not None else []
+    if notify is None:
+        put = timer.timed("notify", alert_queue().put)
+        bar_close = getattr(timer, "bar_close", None)
+        since = bar_close.timestamp() if bar_close is not None else None
+        for sym, msg in alerts:
+            put(sym, msg, since=since)
+    else:
+        notify = timer.timed("notify", notify)
+        calls += [lambda b=b: notify(b) for b in batch_alerts(alerts)]
+    for result in dispatch(*calls):
+        if isinstance(result, Exception):
+            print("[发送/保存失败]", result)
+
+def run_tick(clock, state, engines, bars=None, notify=None, symbols=None, state_store=None, strategy=None,
+             htf_engines=None, closed_only=True):
+    # 评估刚收盘的那根 bar，返回 (合并后的消息, 延迟秒)；延迟 = 唤醒时刻距收盘 + 本次处理耗时。
+    # 每个 tick 输出一行分段计时 JSON
+    timer = TickTimer(clock)
+    now = timer.started_at
+    with timer.stage("scan"):
+        alerts = scan_symbols(state, symbols, now=now, engines=engines, bars=bars, closed_only=closed_only,
+                              strategy=strategy, timer=timer, htf_engines=htf_engines)
+    batches = batch_alerts(alerts)
+    with timer.stage("publish"):
+        publish(alerts, state_store, notify, timer)
+    msg = "\n".join(batches) or None
+    emit(timer.record(symbols=len(symbols or SYMBOLS), alerts=len(alerts), signal=msg))
+    return msg, timer.lag()
+
+def run_daemon(clock=None, state_store=None, bars=None, notify=None, offset=DAEMON_OFFSET, symbols=None,
+               strategy=None):
+    # 一个进程跑完整个交易时段：日历、指标、仓位状态常驻内存，每根 bar 收盘后几秒唤醒一次
+    clock = clock or SystemClock()
+    state_store = state_store or make_state_store()
+    engines, htf_engines = {}, {}
+    now = clock.now()
+    bounds = session_lookup.session_bounds(now)
+    if bounds is None:
+        print(f"[{now.strftime('%Y-%m-%d %H:%M:%S %Z')}] 🕗 非交易日，守护进程退出")
+        return []
+    market_open, market_close = bounds
+    state = load_state(state_store, clock, market_close)
+    if state is None:
+        return []
+
+    force_clear_at_open(state, clock.now())
+    state_store.flush()
+
+    ticks = []
+    while True:
+        wake = max(next_bar_close(clock.now()), market_open + timedelta(minutes=1)) + timedelta(seconds=offset)
+        if wake - timedelta(seconds=offset) > market_close:
+            break
+        clock.sleep_until(wake)
+        try:
+            msg, latency = run_tick(clock, state, engines, bars, notify, symbols, state_store, strategy, htf_engines)
+        except Exception as e:
+            print("[错误]", e)
+            continue
+        positions = {sym: book["position"] for sym, book in state.get("symbols", {}).items()}
+        ticks.append({"bar_close": wake - timedelta(seconds=offset), "latency": latency, "signal": msg,
+                      "positions": positions})
+
+    close_alerts()
+    _summarize(ticks)
+    return ticks
+
+# ========== 流式行情 ==========
+def _summarize(ticks):
+    if ticks:
+        lat = sorted(t["latency"] for t in ticks)
+        print(f"📊 共 {len(ticks)} 个 tick，延迟中位数 {lat[len(lat) // 2] * 1000:.0f} ms，最大 {lat[-1] * 1000:.0f} ms")
+
+def run_stream(source, clock=None, state_store=None, bars=None, notify=None, symbols=None, strategy=None,
+               intrabar=None, grace=STREAM_GRACE, event_time=False):
+    # 逐笔行情驱动（source 为 tick_stream.TickSource）：成交在内存里聚合成 1 分钟 bar，
+    # bar 一收盘立即走 run_tick（指标、信号、状态、推送与守护模式同一条路径），不再等定时拉取。
+    # 启动前的历史从 bars（默认本地仓库）补齐一次。intrabar 给秒数时，正在走的 bar 也按这个间隔评估：
+    # 信号更早，但同一根 bar 可能先后给出不同结论，与回测不再逐根一致。
+    # 下一分钟没有成交时，过了分钟末尾再等 grace 秒才按时钟收盘，迟到的成交仍算进这根 bar。
+    # event_time=True 时时钟跟着消息时间走（回放用 FakeClock）
+    global bar_store
+    from tick_stream import BarAggregator, LiveBars
+    clock = clock or SystemClock()
+    state_store = state_store or make_state_store()
+    symbols = symbols or SYMBOLS
+    now = clock.now()
+    bounds = session_lookup.session_bounds(now)
+    if bounds is None:
+        print(f"[{now.strftime('%Y-%m-%d %H:%M:%S %Z')}] 🕗 非交易日，行情流退出")
+        source.close()
+        return []
+    market_open, market_close = bounds
+    state = load_state(state_store, clock, market_close)
+    if state is None:
+        source.close()
+        return []
+    now = clock.now()
+    open_ns, close_ns = (int(t.timestamp()) * 10**9 for t in bounds)
+
+    force_clear_at_open(state, now)
+    state_store.flush()
+
+    if bars is None:
+        if bar_store is None:
+            from bar_store import BarStore
+            bar_store = BarStore()
+        bars = bar_store
+    # 补齐用的历史已经校验过，聚合出的 bar 另起一份同策略的校验状态
+    validator = getattr(bars, "validator", None)
+    if validator is not None:
+        from bar_validation import BarValidator
+        validator = BarValidator(validator.gaps, validator.zero_volume)
+    live = LiveBars(validator=validator)
+    for sym in symbols:
+        try:
+            df = bars.fetch(sym, now.date(), now.date(), now=now)
+            live.seed(sym, df[df.index < now.replace(second=0, microsecond=0)])
+        except Exception as e:
+            print(f"[错误] {sym} 历史补齐失败：", e)
+
+    aggregator = BarAggregator(grace)
+    engines, htf_engines = {}, {}
+    ticks, evaluated = [], {}
+    for tick in source:
+        if tick is not None and event_time:
+            clock.sleep_until(datetime.fromtimestamp(tick[1] // 1000 / 1e6, tz=EST))
+        now = clock.now()
+        now_ns = int(now.timestamp() * 1e6) * 1000
+        closed = []
+        if tick is not None and tick[0] in symbols:
+            bar = aggregator.on_tick(*tick)
+            if bar is not None:
+                closed.append(bar)
+        closed += aggregator.close_due(now_ns)
+        for bar in closed:
+            live.append(bar)
+        due = [s for s in symbols if any(b[0] == s and open_ns <= b[1] < close_ns for b in closed)]
+        if due:
+            try:
+                msg, latency = run_tick(clock, state, engines, live, notify, due, state_store, strategy, htf_engines)
+            except Exception as e:
+                print("[错误]", e)
+            else:
+                positions = {sym: book["position"] for sym, book in state.get("symbols", {}).items()}
+                ticks.append({"bar_close": now.replace(second=0, microsecond=0), "latency": latency,
+                              "signal": msg, "positions": positions})
+        elif intrabar and tick is not None and tick[0] in symbols and open_ns <= tick[1] < close_ns:
+            sym = tick[0]
+            if now_ns - evaluated.get(sym, 0) >= intrabar * 1e9:
+                evaluated[sym] = now_ns
+                live.forming[sym] = aggregator.forming(sym)
+                try:
+                    run_tick(clock, state, engines, live, notify, [sym], state_store, strategy, htf_engines,
+                             closed_only=False)
+                except Exception as e:
+                    print("[错误]", e)
+        if now >= market_close and all(b[0] >= close_ns for b in aggregator.current.values()):
+            break
+    source.close()
+    close_alerts()
+    if aggregator.late:
+        print(f"[行情] 丢弃迟到成交 {aggregator.late} 笔")
+    _summarize(ticks)
+    return ticks
 
 # ========== 主函数 ==========
-def main():
+def main(symbols=None, clock=None):
+    symbols = symbols or SYMBOLS
+    timer = TickTimer(clock or SystemClock())
+    now = timer.started_at
+    print("=" * 60)
+    print(f"🕒 当前时间：{now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+    # 先只用标准库查时段表：9:30 之后仍未开盘（盘后 / 非交易日）不用清仓也不用算信号，
+    # 状态都不读，直接退出
+    with timer.stage("calendar"):
+        market_open = is_market_open_now(now)
+    if not market_open and now.time() >= time(9, 30):
+        print(f"[{now.strftime('%Y-%m-%d %H:%M:%S %Z')}] 🕗 盘前/盘后，不进行信号判断")
+        if os.path.exists(ALERT_SPOOL):
+            alert_queue()  # 收盘前最后几条没送达的，这里补发
+            close_alerts()
+        emit(timer.record(symbols=len(symbols), alerts=0, signal=None))
+        return
+
+    state_store = make_state_store()
+    batches, alerts = [], []
     try:
-        now = get_est_now()
-        print("=" * 60)
-        print(f"🕒 当前时间：{now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-        force_clear_at_open()  # 盘前清仓
+        with timer.stage("state_load"):
+            state = state_store.state  # 整个运行只读一次
+        force_clear_at_open(state, now)  # 盘前清仓
 
-        state = load_last_signal()
-        print(f"📦 当前仓位状态：{state.get('position', 'none')}")
+        positions = "，".join(f"{sym} {symbol_state(state, sym)['position']}" for sym in symbols)
+        print(f"📦 当前仓位状态：{positions}")
         print("-" * 60)
 
-        if not is_market_open_now():
+        if not market_open:
             print(f"[{now.strftime('%Y-%m-%d %H:%M:%S %Z')}] 🕗 盘前/盘后，不进行信号判断")
             return
 
-        df = get_data()
-        time_signal, signal = generate_signal(df)
-        if signal:
-            if time_signal:
-                msg = f"[{time_signal.strftime('%Y-%m-%d %H:%M:%S %Z')}] {signal}"
-            else:
-                msg = signal
-            print(msg)
-            send_to_discord(msg)
-        else:
+        with timer.stage("scan"):
+            alerts = scan_symbols(state, symbols, now=now, timer=timer)
+        batches = batch_alerts(alerts)
+        for batch in batches:
+            print(batch)
+        if not batches:
             print(f"[{now.strftime('%Y-%m-%d %H:%M:%S %Z')}] ❎ 无交易信号")
 
     except Exception as e:
         print("[错误]", e)
+    finally:
+        # 状态最多写一次，与告警推送并发发出
+        with timer.stage("publish"):
+            publish(alerts, state_store, timer=timer)
+        close_alerts()
+        emit(timer.record(symbols=len(symbols), alerts=len(alerts), signal="\n".join(batches) or None))
 
 if __name__ == "__main__":
-    main()
+    arg_symbols = next((a.split("=", 1)[1] for a in sys.argv[1:] if a.startswith("--symbols=")), None)
+    symbols = [s.strip().upper() for s in arg_symbols.split(",") if s.strip()] if arg_symbols else None
+    stream_url = next((a.split("=", 1)[1] for a in sys.argv[1:] if a.startswith("--stream=")), STREAM_URL)
+    if "--daemon" in sys.argv:
+        run_daemon(symbols=symbols)
+    elif "--stream" in sys.argv or any(a.startswith("--stream=") for a in sys.argv):
+        if not stream_url:
+            sys.exit("[错误] 未设置 STREAM_URL（或 --stream=tcp://host:port）")
+        from tick_stream import SocketFeed
+        grace = next((float(a.split("=", 1)[1]) for a in sys.argv[1:] if a.startswith("--grace=")), STREAM_GRACE)
+        run_stream(SocketFeed(stream_url, symbols or SYMBOLS), symbols=symbols, grace=grace)
+    else:
+        main(symbols)
 
 
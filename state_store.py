@@ -0,0 +1,95 @@
+import os
+import copy
+import json
+from http_io import default_client
+
+# ==== 仓位状态存储 ====
+# 一次运行只读一次，所有状态变化在内存里完成，结束时最多写一次（有变化才写）。
+# 后端可插拔：GitHub Gist（线上）或本地 JSON 文件（本地调试 / 无 token）。
+DEFAULT_STATE = {"position": "none"}
+GITHUB_API = os.environ.get("GITHUB_API", "https://api.github.com")
+
+class GistBackend:
+    # 读失败（网络 / 鉴权 / 内容损坏）直接抛出，不再悄悄当成空仓；只有 Gist 里还没有这个文件才用默认状态
+    def __init__(self, gist_id, filename, token, api=GITHUB_API, client=None):
+        self.gist_id = gist_id
+        self.filename = filename
+        self.token = token
+        self.api = api
+        self.client = client or default_client()
+
+    def load(self):
+        r = self.client.get(
+            f"{self.api}/gists/{self.gist_id}",
+            headers={"Authorization": f"token {self.token}"}
+        )
+        files = r.json().get("files", {})
+        if self.filename not in files:
+            return dict(DEFAULT_STATE)
+        return json.loads(files[self.filename]["content"])
+
+    def save(self, state):
+        headers = {
+            "Authorization": f"token {self.token}",
+            "Accept": "application/vnd.github.v3+json"
+        }
+        data = {"files": {self.filename: {"content": json.dumps(state)}}}
+        self.client.patch(f"{self.api}/gists/{self.gist_id}", headers=headers, json=data)
+
+class FileBackend:
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict(DEFAULT_STATE)
+
+    def save(self, state):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+
+class MemoryBackend:
+    # 测试 / 回放用，记录每次写入
+    def __init__(self, state=None):
+        self.state = dict(state or DEFAULT_STATE)
+        self.loads = 0
+        self.saves = []
+
+    def load(self):
+        self.loads += 1
+        return copy.deepcopy(self.state)
+
+    def save(self, state):
+        self.state = copy.deepcopy(state)
+        self.saves.append(copy.deepcopy(state))
+
+class StateStore:
+    def __init__(self, backend):
+        self.backend = backend
+        self._state = None
+        self._loaded = None
+
+    @property
+    def state(self):
+        if self._state is None:
+            self._state = self.backend.load() or dict(DEFAULT_STATE)
+            self._loaded = copy.deepcopy(self._state)
+        return self._state
+
+    @property
+    def dirty(self):
+        return self._state is not None and self._state != self._loaded
+
+    def flush(self):
+        # 只有与加载时不同才写回，反手（none -> put）也只写一次
+        if not self.dirty:
+            return False
+        self.backend.save(self._state)
+        self._loaded = copy.deepcopy(self._state)
+        return True
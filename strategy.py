@@ -0,0 +1,270 @@
+import numpy as np
+import pandas as pd
+import indicators as ind
+from timeframes import agreement_masks, trend_column
+from condition_bits import ConditionBits
+from fast_backtest import (REGULAR_START, REGULAR_END, CLEAR_TIME, EVT_CLEAR, EVENT_TEXT,
+                           sideways_mask, call_entry_mask, put_entry_mask, trend_continuation_masks,
+                           decay_exit_masks, threshold_exit_masks, run_position_machine, session_masks)
+
+# ==== 策略 ====
+# 实盘机器人、两个回测脚本、参数扫描都走这里：同一套指标、同一组条件数组、同一个仓位状态机。
+# 出场规则的差异是策略版本，不是分叉的代码：
+#   threshold —— 阈值出场（spy_signal_bot_v4.py / spy_backtest_date.py）
+#   decay     —— MACDh 衰减出场（spy_backtest_original.py）
+# confirm 给出大周期（如 (5, 15)）时，入场还要求这些周期的趋势同向，趋势列由 timeframes.add_timeframes 提供
+INDICATOR_PARAMS = {
+    "rsi_length": 14, "ema_length": 20,
+    "macd_fast": 5, "macd_slow": 10, "macd_signal": 20,
+    "stoch_k": 9, "stoch_d": 3, "stoch_smooth": 3,
+}
+INDICATOR_COLUMNS = ['RSI', 'RSI_SLOPE', 'EMA20', 'MACD', 'MACDs', 'MACDh', 'K', 'D']
+EXIT_RULES = {"threshold": threshold_exit_masks, "decay": decay_exit_masks}
+DEFAULT_VERSION = "threshold"
+
+# ==== 指标 ====
+# 数值内核在 indicators.py（NumPy，原地写预分配数组），这里只包回 Series 并填预热期
+def compute_rsi(series, length=14):
+    return pd.Series(ind.rsi(series.to_numpy(), length), index=series.index).fillna(50)
+
+def compute_ema(series, length=20, state=None):
+    return pd.Series(ind.ema(series.to_numpy(), length, state=state), index=series.index)
+
+def compute_macd(series, fast=5, slow=10, signal=20, state=None):
+    # 返回 (MACD, MACDs, MACDh)，预热期填 0
+    line, sig, hist = ind.macd(series.to_numpy(), fast, slow, signal, state=state)
+    return tuple(pd.Series(a, index=series.index).fillna(0) for a in (line, sig, hist))
+
+def _kdj(high, low, close, k=9, d=3, smooth_k=3, zero_range=None, out=None):
+    # ta.stoch 只返回原始 %K 首个有效值之后的行，对齐回来之前的行是 NaN 而不是 50，这里保持一致
+    k_line, d_line = ind.stoch(high, low, close, k, d, smooth_k, out=out, zero_range=zero_range)
+    valid = np.flatnonzero(~np.isnan(k_line))
+    if not len(valid):
+        # 数据太短还没有 K：直接找原始 %K 的首个有效行
+        raw = ind.rolling_min(low, k) + ind.rolling_max(high, k) + close
+        valid = np.flatnonzero(~np.isnan(raw)) + (smooth_k - 1)
+    start = max(0, valid[0] - (smooth_k - 1)) if len(valid) else len(k_line)
+    for line in (k_line, d_line):
+        tail = line[start:]
+        tail[np.isnan(tail)] = 50.0
+    return k_line, d_line
+
+def compute_kdj(high, low, close, k=9, d=3, smooth_k=3, zero_range=None):
+    # 返回 (K, D)，预热期填 50
+    k_line, d_line = _kdj(high.to_numpy(), low.to_numpy(), close.to_numpy(), k, d, smooth_k, zero_range)
+    return pd.Series(k_line, index=close.index), pd.Series(d_line, index=close.index)
+
+def warmup_bars(p=None):
+    # 滑窗类指标（RSI + 斜率、KDJ）回看的最多 bar 数
+    p = dict(INDICATOR_PARAMS, **(p or {}))
+    return max(p["rsi_length"] + 4, p["stoch_k"] + p["stoch_smooth"] + p["stoch_d"])
+
+def compute_indicators(df, p=None, state=None):
+    # 返回只含指标列的 DataFrame；实盘的 IndicatorEngine 与这里一致。
+    # state 为 dict 时按块续算（多日流式回测）：EMA / MACD 带递推状态，RSI / KDJ 带上一块最后几根 bar 重算，
+    # 各块拼起来与整段一次算逐位一致。state["zero_range"] 须事先对整段判断（见 indicators.stoch），
+    # 不给时按每块自己的数据判断
+    p = dict(INDICATOR_PARAMS, **(p or {}))
+    bars = df[['High', 'Low', 'Close']]
+    tail = state.get("tail") if state is not None else None
+    if tail is not None:
+        bars = pd.concat([tail, bars])
+    skip = len(bars) - len(df)
+    out = {}  # 一次构造 DataFrame，逐列插入在多日流式回测里开销很大
+    rsi = compute_rsi(bars['Close'], length=p["rsi_length"])
+    out['RSI'] = rsi.to_numpy()[skip:]
+    out['RSI_SLOPE'] = rsi.diff(3).to_numpy()[skip:]
+    out['EMA20'] = compute_ema(df['Close'], length=p["ema_length"],  # 列名沿用 EMA20，长度按参数
+                               state=state.setdefault("ema", {}) if state is not None else None)
+    out['MACD'], out['MACDs'], out['MACDh'] = compute_macd(
+        df['Close'], p["macd_fast"], p["macd_slow"], p["macd_signal"],
+        state=state.setdefault("macd", {}) if state is not None else None)
+    k, d = compute_kdj(bars['High'], bars['Low'], bars['Close'], p["stoch_k"], p["stoch_d"], p["stoch_smooth"],
+                       zero_range=state.get("zero_range") if state is not None else None)
+    out['K'], out['D'] = k.to_numpy()[skip:], d.to_numpy()[skip:]
+    if state is not None:
+        state["tail"] = bars.iloc[-warmup_bars(p):]
+    return pd.DataFrame(out, index=df.index)
+
+def fill_indicators(bars, p=None):
+    # 直接写进 bar_columns.BarColumns 的预分配指标列，与 compute_indicators（不分块）逐位一致；
+    # 指标列是 float32 时每组指标先在 float64 临时数组上算完再写入，临时内存只有一组大小
+    p = dict(INDICATOR_PARAMS, **(p or {}))
+    high, low, close = (np.asarray(bars[c], dtype=np.float64) for c in ('High', 'Low', 'Close'))
+
+    def group(*names):
+        return tuple(bars[c] if bars[c].dtype == np.float64 else np.empty(len(close)) for c in names)
+
+    def store(names, values):
+        for name, v in zip(names, values):
+            if v is not bars[name]:
+                bars[name] = v
+
+    rsi, slope = group('RSI', 'RSI_SLOPE')
+    ind.rsi(close, p["rsi_length"], out=rsi)
+    rsi[np.isnan(rsi)] = 50.0
+    slope[:3] = np.nan
+    np.subtract(rsi[3:], rsi[:-3], out=slope[3:])
+    store(('RSI', 'RSI_SLOPE'), (rsi, slope))
+    ema = group('EMA20')
+    ind.ema(close, p["ema_length"], out=ema[0])
+    store(('EMA20',), ema)
+    macd = group('MACD', 'MACDs', 'MACDh')
+    ind.macd(close, p["macd_fast"], p["macd_slow"], p["macd_signal"], out=macd)
+    for line in macd:
+        line[np.isnan(line)] = 0.0
+    store(('MACD', 'MACDs', 'MACDh'), macd)
+    kd = group('K', 'D')
+    _kdj(high, low, close, p["stoch_k"], p["stoch_d"], p["stoch_smooth"], out=kd)
+    store(('K', 'D'), kd)
+    return bars
+
+def advance_state(close, p=None, state=None):
+    # 只推进 compute_indicators 里 EMA / MACD 的递推状态，不算指标输出；并行回测用它快速走到每段的开头。
+    # state["tail"]（最后 warmup_bars 根 High/Low/Close）由调用方自己维护
+    p = dict(INDICATOR_PARAMS, **(p or {}))
+    ind.ema(close, p["ema_length"], state=state.setdefault("ema", {}))
+    ind.macd(close, p["macd_fast"], p["macd_slow"], p["macd_signal"], state=state.setdefault("macd", {}))
+    return state
+
+def add_indicators(df, p=None, state=None):
+    return pd.concat([df.drop(columns=INDICATOR_COLUMNS, errors="ignore"), compute_indicators(df, p, state)], axis=1)
+
+# ==== 策略版本 ====
+class Strategy:
+    def __init__(self, version=DEFAULT_VERSION, rsi_call=53, rsi_put=47, slope=0.15,
+                 sideways_window=3, sideways_price=0.002, sideways_ema=0.02, confirm=()):
+        if version not in EXIT_RULES:
+            raise ValueError(f"未知策略版本：{version}（可选 {', '.join(EXIT_RULES)}）")
+        self.version = version
+        self.rsi_call = rsi_call
+        self.rsi_put = rsi_put
+        self.slope = slope
+        self.sideways_window = sideways_window
+        self.sideways_price = sideways_price
+        self.sideways_ema = sideways_ema
+        self.confirm = tuple(confirm)
+
+    def masks(self, df):
+        call_cont, put_cont = trend_continuation_masks(df)
+        call_exit, put_exit = EXIT_RULES[self.version](df)
+        call_entry = call_entry_mask(df, self.rsi_call, self.slope)
+        put_entry = put_entry_mask(df, self.rsi_put, -self.slope)
+        if self.confirm:
+            up, down = agreement_masks(df, self.confirm)
+            call_entry &= up
+            put_entry &= down
+        return dict(
+            call_entry=call_entry, put_entry=put_entry,
+            call_exit=call_exit, put_exit=put_exit, call_cont=call_cont, put_cont=put_cont,
+            sideways=sideways_mask(df, self.sideways_window, self.sideways_price, self.sideways_ema))
+
+    def conditions(self, df):
+        # 子条件位图（condition_bits.ConditionBits）；.masks() 与 masks(df) 逐位一致
+        return ConditionBits.compute(df, self)
+
+    def run(self, df, active, near_close, position=0, start=1, masks=None):
+        # masks 可传事先算好的条件数组（如 BarColumns.flag_masks()），省得重算
+        return run_position_machine(active, near_close, **(masks or self.masks(df)), position=position, start=start)
+
+    def step(self, df, position):
+        # 实盘：从当前仓位出发只评估最后一根 bar，返回 (该 bar 的事件, 新仓位)
+        n = len(df)
+        active = np.zeros(n, dtype=bool)
+        active[-1] = True
+        events, position = self.run(df, active, np.zeros(n, dtype=bool), position, start=n - 1)
+        return [e for _, e in events], position
+
+    def signals(self, df, calendar, masks=None):
+        # 回测信号文本，与原 backtest() 循环输出逐条一致
+        if len(df) == 0:
+            return []
+        active, near_close = session_masks(df.index, calendar)
+        events, position = self.run(df, active, near_close, masks=masks)
+        signals = [f"[{df.index[i]}] {EVENT_TEXT[e]}" for i, e in events]
+        last_ts = df.index[-1]
+        if last_ts.time() < REGULAR_END and position != 0:
+            signals.append(f"[{last_ts}] {EVENT_TEXT[EVT_CLEAR]}")
+        return signals
+
+# ==== 逐行参考实现（仅供 --verify 校验向量化结果） ====
+def _sideways_row(row, df, idx, window, price_threshold, ema_threshold):
+    if idx < window:
+        return False
+    price_near = abs(row['Close'] - row['EMA20']) / row['EMA20'] < price_threshold
+    ema_flat = abs(row['EMA20'] - df.iloc[idx - window]['EMA20']) < ema_threshold
+    return price_near and ema_flat
+
+def _call_entry_row(row, s):
+    return (row['Close'] > row['EMA20'] and row['RSI'] > s.rsi_call and row['MACD'] > 0
+            and row['MACDh'] > 0 and row['RSI_SLOPE'] > s.slope and row['K'] > row['D']
+            and all(row[trend_column(m)] > 0 for m in s.confirm))
+
+def _put_entry_row(row, s):
+    return (row['Close'] < row['EMA20'] and row['RSI'] < s.rsi_put and row['MACD'] < 0
+            and row['MACDh'] < 0 and row['RSI_SLOPE'] < -s.slope and row['K'] < row['D']
+            and all(row[trend_column(m)] < 0 for m in s.confirm))
+
+def _exit_row(row, prev, version, side):
+    if version == "decay":
+        prev_macdh = prev['MACDh'] if prev['MACDh'] != 0 else 1e-6  # 防止除以零
+        if side == "call":
+            return ((row['RSI_SLOPE'] < -0.3 or row['MACDh'] < prev_macdh * 0.5) and row['RSI'] < 55
+                    and not row['K'] > row['D'] + 2)
+        return ((row['RSI_SLOPE'] > 0.3 or row['MACDh'] > prev_macdh * 0.5) and row['RSI'] > 45
+                and not row['K'] < row['D'] - 2)
+    if side == "call":
+        return (row['RSI'] < 50 and row['RSI_SLOPE'] < 0 and (row['MACD'] < 0.05 or row['MACDh'] < 0.05)
+                and not row['K'] > row['D'])
+    return (row['RSI'] > 50 and row['RSI_SLOPE'] > 0 and (row['MACD'] > -0.05 or row['MACDh'] > -0.05)
+            and not row['K'] < row['D'])
+
+def _continuation_row(row, side):
+    if side == "call":
+        return row['MACDh'] > 0 and row['RSI'] > 45
+    return row['MACDh'] < 0 and row['RSI'] < 55
+
+def reference_signals(df, strategy, calendar):
+    s = strategy
+    position = "none"
+    signals = []
+
+    for i in range(1, len(df)):
+        row = df.iloc[i]
+        prev = df.iloc[i - 1]
+        ts = row.name
+        ttime = ts.time()
+
+        if not calendar.is_session_day(ts) or ttime < REGULAR_START or ttime >= REGULAR_END:
+            if ttime >= CLEAR_TIME and position != "none":
+                signals.append(f"[{ts}] ⏰ 收盘前清仓")
+                position = "none"
+            continue
+
+        sideways = _sideways_row(row, df, i, s.sideways_window, s.sideways_price, s.sideways_ema)
+        if position == "call" and _exit_row(row, prev, s.version, "call"):
+            if _continuation_row(row, "call"):
+                continue
+            signals.append(f"[{ts}] ⚠️ Call 出场"); position = "none"
+            if _put_entry_row(row, s) and not sideways:
+                signals.append(f"[{ts}] 🔁 空仓 -> Put"); position = "put"
+            continue
+
+        if position == "put" and _exit_row(row, prev, s.version, "put"):
+            if _continuation_row(row, "put"):
+                continue
+            signals.append(f"[{ts}] ⚠️ Put 出场"); position = "none"
+            if _call_entry_row(row, s) and not sideways:
+                signals.append(f"[{ts}] 🔁 空仓 -> Call"); position = "call"
+            continue
+
+        if position == "none" and not sideways:
+            if _call_entry_row(row, s):
+                signals.append(f"[{ts}] 📈 主升浪 Call"); position = "call"
+            elif _put_entry_row(row, s):
+                signals.append(f"[{ts}] 📉 主跌浪 Put"); position = "put"
+
+    last_ts = df.index[-1]
+    if last_ts.time() < REGULAR_END and position != "none":
+        signals.append(f"[{last_ts}] ⏰ 收盘前清仓")
+    return signals
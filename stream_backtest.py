@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+from fast_backtest import REGULAR_END, EVT_CLEAR, EVENT_TEXT, session_masks
+from strategy import INDICATOR_PARAMS, add_indicators
+from indicators import has_zero_range
+from trade_ledger import LedgerBuilder
+from timeframes import add_timeframes
+from market_calendar import get_calendar
+from bar_store import REQUEST_DAYS
+
+# ==== 流式多日回测 ====
+# 按块从 BarStore 拉数据，逐个交易日处理。跨天只带这几样：指标的递推状态和最后几根 bar、
+# 仓位、还没平的那笔交易，所以内存与区间长短无关。
+# 指标、信号、台账都与整段一次性回测逐位一致。
+# ta.stoch 的零区间 epsilon 取决于整段数据，要先把整段过一遍：只算滚动高低点，
+# 第一遍顺带把数据落盘，第二遍读本地缓存。
+REQUIRED = ['High', 'Low', 'Close', 'RSI', 'RSI_SLOPE', 'MACD', 'MACDh', 'EMA20', 'K', 'D']
+
+def scan_zero_range(days, k=INDICATOR_PARAMS["stoch_k"]):
+    # days：(日期, 分钟线) 迭代器；整段里是否出现过 k 根内最高价 == 最低价
+    high = low = np.empty(0)
+    for _, df in days:
+        high = np.concatenate([high, df['High'].to_numpy(dtype=np.float64)])
+        low = np.concatenate([low, df['Low'].to_numpy(dtype=np.float64)])
+        if has_zero_range(high, low, k):
+            return True
+        keep = max(0, len(high) - (k - 1))
+        high, low = high[keep:], low[keep:]
+    return False
+
+class StreamBacktest:
+    def __init__(self, strategy, calendar, p=None, zero_range=None):
+        self.strategy = strategy
+        self.calendar = calendar
+        self.p = p
+        self.state = {"zero_range": zero_range}  # 指标续算状态，见 strategy.compute_indicators
+        self.frames = {}  # 大周期续算状态，见 timeframes.compute_timeframes
+        self.carry = None  # 上一段最后几根带指标的 bar（震荡判断要往回看 sideways_window 根）
+        self.position = 0
+        self.ledger = LedgerBuilder()
+        self.session_minutes = 0
+        self.bars = 0
+        self.last_ts = None
+
+    def _indicators(self, df):
+        full = add_indicators(df, self.p, self.state)
+        if self.strategy.confirm:
+            full = add_timeframes(full, self.strategy.confirm, state=self.frames)
+        return full.dropna(subset=REQUIRED)
+
+    def warm(self, df):
+        # 只预热（并行回测里每段开头的前一两天）：推进指标状态、留下回看用的最后几根，不跑策略也不计数
+        full = self._indicators(df)
+        if len(full):
+            frame = full if self.carry is None else pd.concat([self.carry, full])
+            self.carry = frame.iloc[-(self.strategy.sideways_window + 1):]
+
+    def feed(self, df):
+        # 喂入一天（或任意一段紧接着的）分钟线，返回这段里的信号文本
+        full = self._indicators(df)
+        if full.empty:
+            return []
+        head = 0 if self.carry is None else len(self.carry)
+        frame = full if self.carry is None else pd.concat([self.carry, full])
+        active, near_close = session_masks(frame.index, self.calendar)
+        events, self.position = self.strategy.run(frame, active, near_close, self.position, start=max(head, 1))
+        self.ledger.feed(events, frame.index.as_unit("ns").asi8, frame['Close'].to_numpy(dtype=np.float64),
+                         frame['Open'].to_numpy(dtype=np.float64))
+        self.session_minutes += int(active[head:].sum())
+        self.bars += len(full)
+        self.carry = frame.iloc[-(self.strategy.sideways_window + 1):]
+        self.last_ts = frame.index[-1]
+        return [f"[{frame.index[i]}] {EVENT_TEXT[e]}" for i, e in events]
+
+    def finish(self):
+        # 返回 (结尾补的信号, 台账)；与 Strategy.signals 一样，最后一根 bar 在 16:00 前仍持仓就补一条清仓
+        signals = []
+        if self.last_ts is not None and self.last_ts.time() < REGULAR_END and self.position != 0:
+            signals.append(f"[{self.last_ts}] {EVENT_TEXT[EVT_CLEAR]}")
+        return signals, self.ledger.finish(self.position)
+
+def stream_backtest(store, symbol, start_date, end_date, strategy, p=None, on_signal=print,
+                    chunk_days=REQUEST_DAYS):
+    # 返回 (台账, 常规时段分钟数, 信号数, bar 数)；信号边算边交给 on_signal
+    calendar = get_calendar(start_date, end_date)
+    zero_range = scan_zero_range(store.iter_days(symbol, start_date, end_date, chunk_days),
+                                 dict(INDICATOR_PARAMS, **(p or {}))["stoch_k"])
+    bt = StreamBacktest(strategy, calendar, p, zero_range)
+    count = 0
+    for _, df in store.iter_days(symbol, start_date, end_date, chunk_days):
+        for signal in bt.feed(df):
+            on_signal(signal)
+            count += 1
+    if not bt.bars:
+        raise ValueError("无数据")
+    tail, ledger = bt.finish()
+    for signal in tail:
+        on_signal(signal)
+    return ledger, bt.session_minutes, count + len(tail), bt.bars
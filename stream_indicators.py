@@ -0,0 +1,368 @@
+import copy
+import json
+import math
+from collections import deque
+import numpy as np
+
+# ==== 流式指标引擎 ====
+# 每来一根 OHLC bar 只做 O(1) 的增量更新，数值与批量计算逐位一致：
+#   compute_rsi  -> pandas rolling(14).mean()（Kahan 补偿求和）
+#   ta.ema       -> 前 length 根 SMA 作种子 + pandas ewm(adjust=False)
+#   compute_macd -> ta.macd(5, 10, 20)，fillna(0)
+#   compute_kdj  -> ta.stoch(9, 3, 3)，rolling min/max + convolve SMA，fillna(50)
+# “一致”指与实盘每分钟对 [开盘前 04:00, 当前 bar] 重新批量计算后的最后一行一致。
+# 批量计算用 indicators.py 的 NumPy 内核，EMA / MACD 与这里的 Ema 走同一个递推公式，全部列逐位一致。
+
+class RollingMean:
+    # 复刻 pandas roll_mean 的 add/remove + Kahan 补偿，窗口内 NaN 不计数
+    def __init__(self, length):
+        self.length = length
+        self.window = deque()
+        self.nobs = 0
+        self.sum_x = 0.0
+        self.neg_ct = 0
+        self.comp_add = 0.0
+        self.comp_remove = 0.0
+        self.same_ct = 0
+        self.prev_value = math.nan
+        self.started = False
+
+    def _add(self, val):
+        if val != val:
+            return
+        self.nobs += 1
+        y = val - self.comp_add
+        t = self.sum_x + y
+        self.comp_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct += 1
+        if val == self.prev_value:
+            self.same_ct += 1
+        else:
+            self.same_ct = 1
+        self.prev_value = val
+
+    def _remove(self, val):
+        if val != val:
+            return
+        self.nobs -= 1
+        y = -val - self.comp_remove
+        t = self.sum_x + y
+        self.comp_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct -= 1
+
+    def update(self, val):
+        if not self.started:
+            # pandas 首个窗口以首值作为 prev_value 起点
+            self.prev_value = val
+            self.same_ct = 0
+            self.started = True
+        self.window.append(val)
+        if len(self.window) > self.length:
+            self._remove(self.window.popleft())
+        self._add(val)
+        if len(self.window) < self.length or self.nobs < self.length:
+            return math.nan
+        result = self.sum_x / self.nobs
+        if self.same_ct >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.0
+        return result
+
+class Ema:
+    # pandas_ta ema(presma=True)：第 length 根为前 length 根均值，之后 ewm(span, adjust=False)
+    def __init__(self, length):
+        self.length = length
+        self.seed = []
+        alpha = 1.0 / (1.0 + (length - 1) / 2.0)
+        self.old_wt = 1.0 - alpha
+        self.new_wt = alpha
+        self.value = math.nan
+
+    def update(self, val):
+        if self.seed is not None:
+            self.seed.append(val)
+            if len(self.seed) < self.length:
+                return math.nan
+            # 与 Series.mean() 相同：NaN 置 0 后整段求和，再除以有效个数
+            arr = np.asarray(self.seed, dtype=np.float64)
+            mask = np.isnan(arr)
+            self.value = float(np.where(mask, 0.0, arr).sum() / np.count_nonzero(~mask))
+            self.seed = None
+            return self.value
+        w = self.value
+        if w == w:
+            if val == val and w != val:
+                w = (self.old_wt * w + self.new_wt * val) / (self.old_wt + self.new_wt)
+        elif val == val:
+            w = val
+        self.value = w
+        return w
+
+class RollingExtreme:
+    # 单调队列求滚动 min / max，均摊 O(1)
+    def __init__(self, length, mode="min"):
+        self.length = length
+        self.mode = mode
+        self.queue = deque()  # (序号, 值)
+        self.count = 0
+
+    def update(self, val):
+        i = self.count
+        self.count += 1
+        q = self.queue
+        if self.mode == "min":
+            while q and q[-1][1] >= val:
+                q.pop()
+        else:
+            while q and q[-1][1] <= val:
+                q.pop()
+        q.append((i, val))
+        while q[0][0] <= i - self.length:
+            q.popleft()
+        return q[0][1] if self.count >= self.length else math.nan
+
+class ConvolveSma:
+    # pandas_ta sma: convolve(ones(n)/n, x)，按下标顺序累加 x*w
+    def __init__(self, length):
+        self.length = length
+        self.weight = float(np.ones(length)[0] / length)
+        self.window = deque(maxlen=length)
+
+    def update(self, val):
+        self.window.append(val)
+        if len(self.window) < self.length:
+            return math.nan
+        total = 0.0
+        for x in self.window:
+            total += x * self.weight
+        return total
+
+class IndicatorEngine:
+    COLUMNS = ['RSI', 'RSI_SLOPE', 'EMA20', 'MACD', 'MACDs', 'MACDh', 'K', 'D']
+    EPSILON = float(np.finfo(float).eps)
+
+    def __init__(self, rsi_length=14, slope_lag=3, ema_length=20,
+                 macd_fast=5, macd_slow=10, macd_signal=20,
+                 stoch_k=9, stoch_d=3, stoch_smooth=3, history=8):
+        self.params = dict(rsi_length=rsi_length, slope_lag=slope_lag, ema_length=ema_length,
+                           macd_fast=macd_fast, macd_slow=macd_slow, macd_signal=macd_signal,
+                           stoch_k=stoch_k, stoch_d=stoch_d, stoch_smooth=stoch_smooth, history=history)
+        self.count = 0
+        self.last_ts = None
+        self.prev_close = math.nan
+        # RSI
+        self.up_mean = RollingMean(rsi_length)
+        self.down_mean = RollingMean(rsi_length)
+        self.rsi_hist = deque(maxlen=slope_lag + 1)
+        # EMA20 / MACD
+        self.ema = Ema(ema_length)
+        self.fast = Ema(macd_fast)
+        self.slow = Ema(macd_slow)
+        self.signal = Ema(macd_signal)
+        self.macd_started = False
+        # Stoch
+        self.lowest = RollingExtreme(stoch_k, "min")
+        self.highest = RollingExtreme(stoch_k, "max")
+        self.raw = deque(maxlen=stoch_smooth + stoch_d - 1)  # (close-ll, hh-ll)，零区间翻转时重算 K/D 用
+        self.zero_range = False
+        self.k_sma = ConvolveSma(stoch_smooth)
+        self.d_sma = ConvolveSma(stoch_d)
+        # 最近几行输出，供 is_sideways 等回看使用
+        self.rows = deque(maxlen=history)
+        self._snapshot = None
+
+    def reset(self):
+        # 清空状态（已喂过的 bar 被数据源修订时，从头重喂）
+        self.__init__(**self.params)
+
+    @property
+    def ready(self):
+        # 与 ta.macd / ta.stoch / ta.ema 的最短长度要求一致，不足时批量计算会直接失败
+        p = self.params
+        need = max(p['macd_slow'] + p['macd_signal'] - 1,
+                   p['stoch_k'] + p['stoch_d'] + p['stoch_smooth'], p['ema_length'])
+        return self.count >= need
+
+    # ---- 分指标更新 ----
+    def _rsi(self, close):
+        delta = close - self.prev_close
+        up = max(delta, 0.0) if delta == delta else math.nan
+        down = -min(delta, 0.0) if delta == delta else math.nan
+        up_m = self.up_mean.update(up)
+        down_m = self.down_mean.update(down)
+        if down_m != 0:
+            rs = up_m / down_m
+        else:
+            rs = math.inf if up_m > 0 else math.nan  # 与 pandas 除零语义一致
+        rsi = 100 - 100 / (1 + rs)
+        rsi = 50.0 if rsi != rsi else rsi
+        self.rsi_hist.append(rsi)
+        lag = self.params['slope_lag']
+        slope = rsi - self.rsi_hist[0] if len(self.rsi_hist) > lag else math.nan
+        return rsi, slope
+
+    def _macd(self, close):
+        fast = self.fast.update(close)
+        slow = self.slow.update(close)
+        macd = fast - slow
+        signal = math.nan
+        if macd == macd or self.macd_started:
+            self.macd_started = True
+            signal = self.signal.update(macd)
+        hist = macd - signal
+        return (macd if macd == macd else 0.0,
+                signal if signal == signal else 0.0,
+                hist if hist == hist else 0.0)
+
+    def _stoch_value(self, num, rng):
+        if self.zero_range:
+            rng = rng + self.EPSILON
+        return 100 * num / rng
+
+    def _smooth(self, stoch):
+        # %K 为 stoch 的 convolve SMA，%D 从第一个有效 %K 起对 %K 再做一次（同 indicators.stoch）
+        k = self.k_sma.update(stoch)
+        d = math.nan
+        if k == k or self.d_sma.window:
+            d = self.d_sma.update(k)
+        return k, d
+
+    def _stoch(self, high, low, close):
+        ll = self.lowest.update(low)
+        hh = self.highest.update(high)
+        if ll != ll or hh != hh:
+            return 50.0, 50.0
+        rng = hh - ll
+        self.raw.append((close - ll, rng))
+        if rng == 0 and not self.zero_range:
+            # ta.stoch 的 non_zero_range：序列中出现过零区间就整体加 epsilon。
+            # 之前的 stoch 值都变了，K/D 的窗口按最近几根 (num, rng) 重算
+            self.zero_range = True
+            p = self.params
+            self.k_sma = ConvolveSma(p['stoch_smooth'])
+            self.d_sma = ConvolveSma(p['stoch_d'])
+            for num, r in self.raw:
+                k, d = self._smooth(self._stoch_value(num, r))
+        else:
+            k, d = self._smooth(self._stoch_value(*self.raw[-1]))
+        return (k if k == k else 50.0), (d if d == d else 50.0)
+
+    # ---- 对外接口 ----
+    def update(self, ts, high, low, close, revisable=True):
+        # 同一时间戳再次喂入视为该 bar 被修订（实盘未走完的分钟线），先回滚再重算；
+        # 确定已收盘的 bar 可传 revisable=False 省掉快照
+        if self.last_ts is not None and ts == self.last_ts and self._snapshot is not None:
+            self._restore(self._snapshot)
+        self._snapshot = self._capture() if revisable else None
+        high, low, close = float(high), float(low), float(close)
+        rsi, slope = self._rsi(close)
+        ema = self.ema.update(close)
+        macd, signal, hist = self._macd(close)
+        k, d = self._stoch(high, low, close)
+        self.prev_close = close
+        self.count += 1
+        self.last_ts = ts
+        row = {'RSI': rsi, 'RSI_SLOPE': slope, 'EMA20': ema,
+               'MACD': macd, 'MACDs': signal, 'MACDh': hist, 'K': k, 'D': d}
+        self.rows.append((ts, row))
+        return row
+
+    def update_frame(self, df):
+        # 逐根喂入 df 中尚未处理的 bar，返回这些 bar 的指标行
+        out = []
+        start = 0
+        if self.last_ts is not None:
+            start = int(df.index.searchsorted(self.last_ts))
+        last = len(df) - 1
+        for i, ts, h, l, c in zip(range(start, len(df)), df.index[start:], df['High'].to_numpy()[start:],
+                                  df['Low'].to_numpy()[start:], df['Close'].to_numpy()[start:]):
+            out.append((ts, self.update(ts, h, l, c, revisable=(i == last))))
+        return out
+
+    def _capture(self):
+        state = {k: v for k, v in self.__dict__.items() if k not in ('_snapshot', 'rows')}
+        return copy.deepcopy(state)
+
+    def _restore(self, state):
+        rows = self.rows
+        if rows and rows[-1][0] == self.last_ts:
+            rows.pop()
+        self.__dict__.update(copy.deepcopy(state))
+        self.rows = rows
+
+    def to_state(self):
+        return {
+            'params': self.params,
+            'engine': _encode(self._capture()),
+            'snapshot': _encode(self._snapshot),
+            'rows': [(str(ts), row) for ts, row in self.rows],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        import pandas as pd
+        engine = cls(**state['params'])
+        if 'k_sma' not in state['engine']:
+            raise KeyError('k_sma')  # 旧版状态没有 K/D 平滑窗口，调用方从头重喂
+        engine.__dict__.update(_decode(state['engine']))
+        engine._snapshot = _decode(state['snapshot'])
+        engine.rows = deque(((pd.Timestamp(ts), row) for ts, row in state['rows']),
+                            maxlen=state['params']['history'])
+        return engine
+
+    def dumps(self):
+        return json.dumps(self.to_state())
+
+    @classmethod
+    def loads(cls, text):
+        return cls.from_state(json.loads(text))
+
+# ==== 状态序列化（纯 JSON，NaN 保留） ====
+def _encode(obj):
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return {k: _encode(v) for k, v in obj.items()}
+    if isinstance(obj, deque):
+        return {'__deque__': [_encode(v) for v in obj], 'maxlen': obj.maxlen}
+    if isinstance(obj, (list, tuple)):
+        return [_encode(v) for v in obj]
+    if isinstance(obj, (RollingMean, Ema, RollingExtreme, ConvolveSma)):
+        return {'__type__': type(obj).__name__, 'attrs': _encode(obj.__dict__)}
+    if hasattr(obj, 'isoformat'):
+        return {'__ts__': str(obj)}
+    if isinstance(obj, (np.floating, np.integer)):
+        return obj.item()
+    return obj
+
+def _decode_ts(v):
+    if isinstance(v, dict) and '__ts__' in v:
+        import pandas as pd
+        return pd.Timestamp(v['__ts__'])
+    return v
+
+_TYPES = {c.__name__: c for c in (RollingMean, Ema, RollingExtreme, ConvolveSma)}
+
+def _decode(obj):
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        if '__deque__' in obj:
+            return deque((_decode(v) for v in obj['__deque__']), maxlen=obj['maxlen'])
+        if '__type__' in obj:
+            inst = _TYPES[obj['__type__']].__new__(_TYPES[obj['__type__']])
+            inst.__dict__.update(_decode(obj['attrs']))
+            return inst
+        if '__ts__' in obj:
+            return _decode_ts(obj)
+        return {k: _decode(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_decode(v) for v in obj]
+    return obj
@@ -0,0 +1,53 @@
+import os
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# 脚本都在仓库根目录平铺，测试直接按模块名导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import market_calendar
+import session_lookup
+from market_calendar import EST, SessionCalendar
+
+# ==== 交易日历 ====
+# 不依赖 pandas_market_calendars：按工作日手工排 2025 年秋冬的时段，含感恩节休市、次日和平安夜半日市
+HOLIDAYS = {date(2025, 11, 27), date(2025, 12, 25)}
+HALF_DAYS = {date(2025, 11, 28), date(2025, 12, 24)}
+CAL_START, CAL_END = date(2025, 9, 1), date(2026, 1, 30)
+
+def _ns(day, hour, minute):
+    return pd.Timestamp(day.year, day.month, day.day, hour, minute, tz=EST).as_unit("ns").value
+
+@pytest.fixture
+def calendar(monkeypatch):
+    days = [d.date() for d in pd.bdate_range(CAL_START, CAL_END) if d.date() not in HOLIDAYS]
+    opens = [_ns(d, 9, 30) for d in days]
+    closes = [_ns(d, 13, 0) if d in HALF_DAYS else _ns(d, 16, 0) for d in days]
+    numbers = [(d - date(1970, 1, 1)).days for d in days]
+    cal = SessionCalendar(CAL_START, CAL_END, numbers, opens, closes)
+    monkeypatch.setattr(market_calendar, "_calendar", cal)
+    # session_lookup 按路径缓存时段表，直接换成同一份
+    monkeypatch.setattr(session_lookup, "_table", (session_lookup.SESSION_CACHE, CAL_START, CAL_END,
+                                                   numbers, opens, closes))
+    return cal
+
+# ==== 合成分钟线 ====
+def minute_bars(days, seed=0):
+    # 每个交易日 04:00–19:59 的 1 分钟线，随机游走
+    rng = np.random.default_rng(seed)
+    index = pd.DatetimeIndex(np.concatenate([
+        pd.date_range(pd.Timestamp(d, tz=EST) + pd.Timedelta(hours=4), periods=16 * 60, freq="1min")
+        for d in days]), name="Datetime")
+    n = len(index)
+    close = 600 + np.cumsum(rng.normal(0, 0.15, n))
+    return pd.DataFrame({
+        "Open": close + rng.normal(0, 0.05, n),
+        "High": close + np.abs(rng.normal(0, 0.08, n)),
+        "Low": close - np.abs(rng.normal(0, 0.08, n)),
+        "Close": close,
+        "Volume": rng.integers(1000, 100000, n).astype(np.float64),
+    }, index=index)
@@ -0,0 +1,86 @@
+import json
+import threading
+
+from alert_queue import AlertQueue, batch_alerts
+from http_io import HttpError
+
+# ==== 告警队列 ====
+class Recorder:
+    # 假 webhook：按顺序抛出 errors 里的异常，之后全部成功
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.posts = []
+        self.lock = threading.Lock()
+
+    def __call__(self, text):
+        with self.lock:
+            if self.errors:
+                raise self.errors.pop(0)
+            self.posts.append(text)
+
+def test_batch_alerts_respects_limit():
+    alerts = [("SPY", "x" * 30)] * 5
+    batches = batch_alerts(alerts, limit=80)
+    assert all(len(b) <= 80 for b in batches)
+    assert sum(b.count("SPY") for b in batches) == 5
+
+def test_dedupe_and_coalesce():
+    send = Recorder()
+    q = AlertQueue(send, window=0.2)
+    assert q.put("SPY", "[t1] call")
+    assert q.put("QQQ", "[t1] put")
+    assert not q.put("SPY", "[t1] call")
+    assert q.close(5)
+    assert send.posts == ["SPY [t1] call\nQQQ [t1] put"]
+    assert q.dropped == 1 and q.sent == 2 and q.messages == 1
+
+def test_retry_after_then_delivers():
+    send = Recorder([HttpError("429", 429, retry_after=0.1), HttpError("down", None)])
+    q = AlertQueue(send, window=0.0, backoff=0.05)
+    q.put("SPY", "[t1] call")
+    assert q.close(5)
+    assert send.posts == ["SPY [t1] call"]
+    assert q.failures == 0 and not q.dead
+
+def test_permanent_error_goes_to_dead_letter(tmp_path):
+    path = str(tmp_path / "alerts.json")
+    send = Recorder([HttpError("gone", 404)])
+    q = AlertQueue(send, path, window=0.0)
+    q.put("SPY", "[t1] call")
+    assert q.flush(5)
+    q.put("SPY", "[t2] exit")
+    assert q.close(5)
+    assert send.posts == ["SPY [t2] exit"]
+    saved = json.load(open(path))
+    assert saved["pending"] == []
+    assert [d[1:3] for d in saved["dead"]] == [["SPY", "[t1] call"]]
+
+def test_maybe_delivered_alert_is_not_resent():
+    send = Recorder([HttpError("read timeout", maybe_sent=True)])
+    q = AlertQueue(send, window=0.0)
+    q.put("SPY", "[t1] call")
+    assert q.close(5)
+    assert send.posts == [] and q.sent == 0
+    assert [d[1:3] for d in q.dead] == [("SPY", "[t1] call")]
+
+def test_undelivered_alerts_survive_restart(tmp_path):
+    path = str(tmp_path / "alerts.json")
+    q = AlertQueue(Recorder([HttpError("down", 503, retry_after=60)]), path, window=0.0)
+    q.put("SPY", "[t1] call")
+    assert not q.close(0.5)
+    send = Recorder()
+    q = AlertQueue(send, path, window=0.0)
+    assert not q.put("SPY", "[t1] call")  # 已入队过的不重复
+    assert q.close(5)
+    assert send.posts == ["SPY [t1] call"]
+    assert json.load(open(path))["pending"] == []
+
+def test_reports_delivery_lag_per_alert():
+    reports = []
+    send = Recorder([HttpError("down", 502)])
+    q = AlertQueue(send, window=0.0, backoff=0.05, report=reports.append, wall=lambda: 1000.0)
+    q.put("SPY", "[t1] call", since=990.0)
+    q.put("QQQ", "[t1] put", since=995.5)
+    q.put("IWM", "[t1] call")  # 没有收盘时刻的不计
+    assert q.close(5)
+    assert reports == [[10.0, 4.5]]
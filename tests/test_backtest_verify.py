@@ -0,0 +1,50 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import spy_backtest as bt
+from bar_store import BarStore, FrameProvider
+from bar_validation import BarValidator
+from conftest import minute_bars
+from strategy import Strategy, reference_signals
+
+DAYS = [d.date() for d in pd.bdate_range("2025-10-13", "2025-10-17")]
+
+@pytest.fixture
+def synthetic_store(tmp_path, calendar, monkeypatch):
+    store = BarStore(str(tmp_path), FrameProvider(minute_bars(DAYS, seed=11)), BarValidator(verbose=False))
+    monkeypatch.setattr(bt, "bar_store", store)
+    return store
+
+# ==== backtest --verify：向量化与逐行循环逐条一致 ====
+@pytest.mark.parametrize("version", ["threshold", "decay"])
+@pytest.mark.parametrize("confirm", [(), (5, 15)])
+def test_verify_mode_matches_loop(synthetic_store, capsys, version, confirm):
+    ledger = bt.backtest("2025-10-13", "2025-10-17", mode="verify", version=version, confirm=confirm)
+    out = capsys.readouterr().out
+    assert "✅ 向量化与逐行循环一致" in out
+    assert len(ledger) > 0
+
+def test_vector_signals_equal_reference_loop(synthetic_store, calendar):
+    df = bt.fetch_data(DAYS[0], DAYS[-1])
+    for version in ("threshold", "decay"):
+        strategy = Strategy(version)
+        assert strategy.signals(df, calendar) == reference_signals(df, strategy, calendar)
+
+def test_compact_and_stream_modes_agree(synthetic_store, capsys):
+    vector = bt.backtest("2025-10-13", "2025-10-17", mode="vector")
+    compact = bt.backtest("2025-10-13", "2025-10-17", mode="vector", compact="float64")
+    stream = bt.backtest("2025-10-13", "2025-10-17", mode="stream")
+    capsys.readouterr()
+    for other in (compact, stream):
+        pd.testing.assert_frame_equal(other.to_frame(), vector.to_frame())
+
+def test_bare_compact_uses_float32(synthetic_store, capsys):
+    # 只写 compact 走省内存的 float32；逐位一致要显式 compact=float64
+    bt.main(argv=["compact", "start=2025-10-13", "end=2025-10-17"])
+    assert "[🗜 紧凑数据] 指标 float32" in capsys.readouterr().out
+    f32 = bt.fetch_bars(DAYS[0], DAYS[-1])
+    f64 = bt.fetch_bars(DAYS[0], DAYS[-1], indicator_dtype=np.dtype("float64"))
+    assert f32["RSI"].dtype == np.float32 and f32.nbytes < f64.nbytes
@@ -0,0 +1,126 @@
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_store import BarStore, FrameProvider, EST
+from bar_validation import BarValidator
+from conftest import minute_bars
+
+DAY = date(2025, 10, 16)
+
+def _store(tmp_path, provider):
+    return BarStore(str(tmp_path), provider, BarValidator(verbose=False))
+
+def _at(hour, minute):
+    return datetime(DAY.year, DAY.month, DAY.day, hour, minute, tzinfo=EST)
+
+class FlakyProvider(FrameProvider):
+    # empty=True 时模拟数据源短暂故障（返回空表）
+    def __init__(self, df):
+        super().__init__(df)
+        self.empty = False
+
+    def __call__(self, symbol, start, end):
+        out = super().__call__(symbol, start, end)
+        return out.iloc[:0] if self.empty else out
+
+# ==== 当天增量补拉 ====
+def test_open_day_refresh_keeps_cache_when_provider_returns_nothing(tmp_path, calendar):
+    provider = FlakyProvider(minute_bars([DAY]))
+    store = _store(tmp_path, provider)
+    first = store.fetch("SPY", DAY, DAY, now=_at(11, 0))
+    provider.empty = True
+    again = store.fetch("SPY", DAY, DAY, now=_at(11, 1))
+    pd.testing.assert_frame_equal(again, first)
+    provider.empty = False
+    later = store.fetch("SPY", DAY, DAY, now=_at(11, 2))
+    assert later.index[-1] == pd.Timestamp(_at(11, 1))
+    assert len(later) == len(first) + 2
+
+def test_open_day_refresh_replaces_only_returned_bars(tmp_path, calendar):
+    src = minute_bars([DAY])
+    provider = FrameProvider(src)
+    store = _store(tmp_path, provider)
+    store.fetch("SPY", DAY, DAY, now=_at(11, 0))
+    # 数据源修订 10:57，且这次少给了 10:58
+    revised = src.copy()
+    revised.loc[pd.Timestamp(_at(10, 57)), "Close"] += 1.0
+    provider.df = revised.drop(pd.Timestamp(_at(10, 58)))
+    got = store.fetch("SPY", DAY, DAY, now=_at(11, 1))
+    assert pd.Timestamp(_at(10, 58)) in got.index
+    assert got.loc[pd.Timestamp(_at(10, 57)), "Close"] == revised.loc[pd.Timestamp(_at(10, 57)), "Close"]
+    assert np.array_equal(store.validator.take_revised("SPY"), [pd.Timestamp(_at(10, 57)).value])
+
+# ==== 已收盘交易日：只下载一次，按日历跳过休市日 ====
+THANKSGIVING_WEEK = [d.date() for d in pd.bdate_range("2025-11-24", "2025-11-28")]
+
+def test_closed_days_download_once(tmp_path, calendar):
+    src = minute_bars(THANKSGIVING_WEEK, seed=2)
+    provider = FrameProvider(src)
+    store = _store(tmp_path, provider)
+    now = datetime(2025, 12, 1, 9, 0, tzinfo=EST)
+    first = store.fetch("SPY", date(2025, 11, 24), date(2025, 11, 28), now=now)
+    calls = len(provider.calls)
+    again = store.fetch("SPY", date(2025, 11, 24), date(2025, 11, 28), now=now)
+    assert len(provider.calls) == calls
+    pd.testing.assert_frame_equal(again, first)
+    rec = store.fetch_records("SPY", date(2025, 11, 24), date(2025, 11, 28), now=now)
+    assert np.array_equal(rec["ts"], first.index.as_unit("ns").asi8)
+
+def test_empty_closed_day_is_not_requested_again(tmp_path, calendar):
+    # 数据源对某个收盘日没有数据（如超出 1 分钟线的保留期）：记下“无数据”，下次不再请求
+    src = minute_bars(THANKSGIVING_WEEK, seed=2)
+    src = src[src.index.date != date(2025, 11, 25)]
+    provider = FrameProvider(src)
+    store = _store(tmp_path, provider)
+    now = datetime(2025, 12, 1, 9, 0, tzinfo=EST)
+    first = store.fetch("SPY", date(2025, 11, 25), date(2025, 11, 25), now=now)
+    assert first.empty and len(provider.calls) == 1
+    again = store.fetch("SPY", date(2025, 11, 24), date(2025, 11, 26), now=now)
+    # 只剩 24、26 两天缺失，合并成一次请求
+    assert len(provider.calls) == 2
+    assert date(2025, 11, 25) not in set(again.index.date)
+    store.fetch("SPY", date(2025, 11, 24), date(2025, 11, 26), now=now)
+    assert len(provider.calls) == 2
+
+def test_closed_day_keeps_intraday_cache_when_provider_returns_nothing(tmp_path, calendar):
+    provider = FlakyProvider(minute_bars([DAY]))
+    store = _store(tmp_path, provider)
+    intraday = store.fetch("SPY", DAY, DAY, now=_at(11, 0))
+    provider.empty = True
+    closed = store.fetch("SPY", DAY, DAY, now=datetime(2025, 10, 17, 9, 0, tzinfo=EST))
+    pd.testing.assert_frame_equal(closed, intraday)
+    assert not (tmp_path / "SPY" / f"{DAY.isoformat()}.partial.npy").exists()
+
+def test_holiday_is_skipped(tmp_path, calendar):
+    # 数据源在感恩节也给了数据（如盘前报价），日历上不是交易日就不取
+    src = minute_bars(THANKSGIVING_WEEK, seed=2)
+    store = _store(tmp_path, FrameProvider(src))
+    got = store.fetch("SPY", date(2025, 11, 24), date(2025, 11, 28), now=datetime(2025, 12, 1, 9, 0, tzinfo=EST))
+    assert date(2025, 11, 27) not in set(got.index.date)
+    assert sorted(set(got.index.date)) == [d for d in THANKSGIVING_WEEK if d != date(2025, 11, 27)]
+    assert not any(d.name.startswith("2025-11-27") for d in (tmp_path / "SPY").iterdir())
+
+def test_half_day_grid_ends_at_early_close(tmp_path, calendar):
+    # 半日市 13:00 收盘：之后没有 bar 不算缺失；常规时段内挖掉的分钟才算
+    day = date(2025, 11, 28)
+    src = minute_bars([day], seed=4)
+    src = src[src.index < pd.Timestamp(datetime(2025, 11, 28, 13, 0, tzinfo=EST))]
+    src = src.drop(pd.Timestamp(datetime(2025, 11, 28, 10, 15, tzinfo=EST)))
+    store = _store(tmp_path, FrameProvider(src))
+    got = store.fetch("SPY", day, day, now=datetime(2025, 12, 1, 9, 0, tzinfo=EST))
+    assert store.validator.stats["gaps"] == 1
+    assert got.index[-1] == pd.Timestamp(datetime(2025, 11, 28, 12, 59, tzinfo=EST))
+
+def test_half_day_gap_fill(tmp_path, calendar):
+    day = date(2025, 12, 24)
+    src = minute_bars([day], seed=5)
+    src = src[src.index < pd.Timestamp(datetime(2025, 12, 24, 13, 0, tzinfo=EST))]
+    hole = pd.Timestamp(datetime(2025, 12, 24, 11, 0, tzinfo=EST))
+    store = BarStore(str(tmp_path), FrameProvider(src.drop(hole)), BarValidator("fill", verbose=False))
+    got = store.fetch("SPY", day, day, now=datetime(2025, 12, 26, 9, 0, tzinfo=EST))
+    assert len(got) == len(src)
+    assert got.loc[hole, "Volume"] == 0
+    assert got.loc[hole, "Open"] == got.shift(1).loc[hole, "Close"]
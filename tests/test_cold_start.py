@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmark import HEAVY_MODULES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ==== 一次性运行的冷启动：盘后 / 非交易日不碰重型库 ====
+# 子进程里先把重型库设成不可导入（sys.modules[名字] = None），盘后路径只要 import 一次就会失败
+SCRIPT = """
+import sys
+for name in {heavy!r}:
+    sys.modules[name] = None
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from live_clock import FakeClock
+import spy_signal_bot_v4 as bot
+bot.main(clock=FakeClock(datetime({stamp}, tzinfo=ZoneInfo("America/New_York"))))
+"""
+
+@pytest.mark.parametrize("stamp", ["2025, 10, 17, 21, 0",   # 交易日盘后
+                                   "2025, 10, 18, 10, 0",   # 周六
+                                   "2025, 11, 27, 10, 0"])  # 感恩节休市
+def test_off_hours_run_needs_no_heavy_modules(tmp_path, calendar, stamp):
+    sessions = str(tmp_path / "sessions.json")
+    calendar.save(sessions)
+    env = dict(os.environ, SESSION_CACHE=sessions, ALERT_SPOOL=str(tmp_path / "alerts.json"), METRICS_FILE="",
+               PYTHONPATH=ROOT)
+    proc = subprocess.run([sys.executable, "-c", SCRIPT.format(heavy=HEAVY_MODULES, stamp=stamp)],
+                          capture_output=True, text=True, env=env, cwd=str(tmp_path))
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    assert "不进行信号判断" in proc.stdout
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from benchmark import synthetic_bars
+from condition_bits import ConditionBits
+from strategy import Strategy, add_indicators
+
+# ==== 手工位图：规则 a 用位 0-2，规则 b 用位 3-4 ====
+def _bits():
+    bits = [0b00111,  # a 全满足
+            0b00011,  # a 只差 a.z
+            0b00101,  # a 只差 a.y
+            0b00001,  # a 差 y、z 两条
+            0b00011,  # a 只差 a.z
+            0b11000]  # b 全满足，a 一条没有
+    return ConditionBits(bits, ["a.x", "a.y", "a.z", "b.u", "b.v"], ["X", "Y", "Z", "U", "V"],
+                         {"a": [0, 1, 2], "b": [3, 4]})
+
+def test_mask_missing_and_all_but():
+    cb = _bits()
+    assert cb.mask("a").tolist() == [True, False, False, False, False, False]
+    assert cb.mask("b").tolist() == [False] * 5 + [True]
+    assert cb.missing("a").tolist() == [0, 1, 1, 2, 1, 3]
+    assert cb.all_but("a.z").tolist() == [False, True, False, False, True, False]
+    assert cb.all_but("a.y").tolist() == [False, False, True, False, False, False]
+    assert cb.select(require=["a.x"], exclude=["a.y"]).tolist() == [False, False, True, True, False, False]
+
+def test_blockers_rank_sole_blocker_first():
+    cb = _bits()
+    # Z 唯一挡住 2 次、不满足 4 次；Y 唯一挡住 1 次、不满足 3 次；X 只在差三条时不满足
+    assert cb.blockers("a") == [("Z", 2, 4), ("Y", 1, 3), ("X", 0, 1)]
+    where = np.array([True, True, True, True, False, False])
+    assert cb.blockers("a", where) == [("Y", 1, 2), ("Z", 1, 2), ("X", 0, 0)]  # 并列时按位号
+
+def test_report_and_describe():
+    cb = _bits()
+    text = cb.report(rules=("a",), top=2)
+    assert text.splitlines()[0] == "a：触发 1 根，差一条 3 根"
+    assert len(text.splitlines()) == 3 and "Z" in text.splitlines()[1]
+    assert cb.describe(1, "a") == "a 2/3，未满足：Z"
+    assert cb.describe(0, "a") == "a 3/3：X Y Z"
+
+# ==== 与 Strategy.masks 逐位一致 ====
+@pytest.mark.parametrize("version", ["threshold", "decay"])
+def test_bitmask_rules_equal_strategy_masks(version):
+    df = add_indicators(synthetic_bars(2, seed=4)).dropna()
+    strategy = Strategy(version)
+    cb = strategy.conditions(df)
+    direct = strategy.masks(df)
+    for rule, mask in cb.masks().items():
+        assert np.array_equal(mask, np.asarray(direct[rule])), rule
+    # 恰好差一条的 bar 就是各 all_but 的并集
+    near = np.zeros(len(df), dtype=bool)
+    for i in cb.rules["call_entry"]:
+        near |= cb.all_but(cb.keys[i])
+    assert np.array_equal(near, cb.near_miss("call_entry"))
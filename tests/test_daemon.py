@@ -0,0 +1,89 @@
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import replay
+import spy_signal_bot_v4 as bot
+from bar_store import BarStore, FrameProvider
+from bar_validation import BarValidator
+from conftest import minute_bars
+from http_io import HttpError
+from live_clock import FakeClock
+from state_store import StateStore, MemoryBackend
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    # 指标状态等本地缓存都落在临时目录
+    monkeypatch.chdir(tmp_path)
+
+def _daemon(tmp_path, day, state=None):
+    store = BarStore(str(tmp_path / "bars"), FrameProvider(minute_bars([day], seed=7)), BarValidator(verbose=False))
+    backend = MemoryBackend(state)
+    clock = FakeClock(datetime(day.year, day.month, day.day, 8, 0, tzinfo=bot.EST), real_perf=False)
+    sent = []
+    ticks = bot.run_daemon(clock, StateStore(backend), store, sent.append)
+    return ticks, sent, backend
+
+# ==== 守护模式：FakeClock 跳着走完一个交易时段 ====
+def test_half_day_ticks_after_each_bar_close(tmp_path, calendar, capsys):
+    day = date(2025, 11, 28)
+    ticks, sent, backend = _daemon(tmp_path, day, {"position": "call"})
+    closes = [t["bar_close"] for t in ticks]
+    first = datetime(2025, 11, 28, 9, 31, tzinfo=bot.EST)
+    assert closes == [first + timedelta(minutes=i) for i in range(210)]
+    assert "盘前清仓" in capsys.readouterr().out
+    assert backend.loads == 1
+    assert backend.state["symbols"]["SPY"]["position"] in ("none", "call", "put")
+    assert all("SPY" in batch for batch in sent)
+
+class FlakyBackend(MemoryBackend):
+    # 前几次读失败（Gist 故障）
+    def __init__(self, failures, state=None):
+        super().__init__(state)
+        self.failures = failures
+
+    def load(self):
+        if self.failures:
+            self.failures -= 1
+            raise HttpError("gist down", 502)
+        return super().load()
+
+def test_startup_state_load_retries_with_backoff(tmp_path, calendar, capsys):
+    day = date(2025, 11, 28)
+    store = BarStore(str(tmp_path / "bars"), FrameProvider(minute_bars([day], seed=7)), BarValidator(verbose=False))
+    backend = FlakyBackend(2)
+    clock = FakeClock(datetime(2025, 11, 28, 8, 0, tzinfo=bot.EST), real_perf=False)
+    ticks = bot.run_daemon(clock, StateStore(backend), store, lambda text: None)
+    assert len(ticks) == 210 and backend.loads == 1
+    out = capsys.readouterr().out
+    assert out.count("读取仓位状态失败") == 2 and "5 秒后重试" in out and "10 秒后重试" in out
+
+def test_startup_state_load_gives_up_at_close(tmp_path, calendar):
+    day = date(2025, 11, 28)
+    store = BarStore(str(tmp_path / "bars"), FrameProvider(minute_bars([day], seed=7)), BarValidator(verbose=False))
+    clock = FakeClock(datetime(2025, 11, 28, 12, 59, tzinfo=bot.EST), real_perf=False)
+    assert bot.run_daemon(clock, StateStore(FlakyBackend(10**6)), store, lambda text: None) == []
+    assert clock.now() <= datetime(2025, 11, 28, 13, 0, tzinfo=bot.EST)
+
+def test_holiday_exits_immediately(tmp_path, calendar):
+    ticks, sent, backend = _daemon(tmp_path, date(2025, 11, 27))
+    assert ticks == [] and sent == [] and not backend.saves
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_replay_matches_backtest(calendar, stream):
+    day = date(2025, 11, 28)
+    result = replay.replay_day(minute_bars([day], seed=3), day, stream=stream)
+    assert result["bars"] > 0
+    assert result["divergent"] == 0, replay.format_report(day, result)
+
+def test_stream_clock_close_waits_for_grace():
+    # 分钟走完后 grace 秒内到的成交仍算进这根 bar
+    from tick_stream import BarAggregator, MINUTE_NS
+    agg = BarAggregator(grace=bot.STREAM_GRACE)
+    assert bot.STREAM_GRACE > 0
+    agg.on_tick("SPY", 10, 100.0, 1.0)
+    assert agg.close_due(MINUTE_NS) == []
+    agg.on_tick("SPY", MINUTE_NS - 1, 101.0, 2.0)
+    (bar,) = agg.close_due(MINUTE_NS + int(bot.STREAM_GRACE * 1e9))
+    assert bar == ("SPY", 0, 100.0, 101.0, 100.0, 101.0, 3.0)
@@ -0,0 +1,22 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from execution import expiry_ns, black_scholes
+from market_calendar import EST
+
+def _ns(*args):
+    return pd.Timestamp(datetime(*args, tzinfo=EST)).as_unit("ns").value
+
+# ==== 0DTE 到期时刻 ====
+def test_expiry_uses_session_close(calendar):
+    ts = np.array([_ns(2025, 11, 26, 10, 0), _ns(2025, 11, 28, 11, 0), _ns(2025, 12, 24, 12, 30)])
+    assert expiry_ns(ts).tolist() == [_ns(2025, 11, 26, 16, 0), _ns(2025, 11, 28, 13, 0), _ns(2025, 12, 24, 13, 0)]
+
+def test_half_day_option_expires_worthless_out_of_the_money(calendar):
+    # 半日市 13:05 已过期：虚值期权只剩内在价值 0
+    entry = np.array([_ns(2025, 11, 28, 13, 5)])
+    t = (expiry_ns(entry) - entry) / (365 * 24 * 60 * 60e9)
+    assert t[0] < 0
+    assert black_scholes(600.0, 601.0, t, call=True)[0] == 0.0
@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from http_io import HttpClient, HttpError, LocalHttpServer, MAX_RETRY_AFTER, dispatch
+from state_store import GistBackend, StateStore
+
+class Sleeps:
+    # 记录退避等待的秒数，不真的睡
+    def __init__(self):
+        self.waits = []
+
+    def __call__(self, seconds):
+        self.waits.append(seconds)
+
+@pytest.fixture
+def server():
+    with LocalHttpServer() as s:
+        yield s
+
+def _client(**kw):
+    kw.setdefault("sleep", Sleeps())
+    return HttpClient(**kw)
+
+# ==== 重试 / 退避 ====
+def test_retries_5xx_and_dropped_connections(server):
+    server.failures = [503, "drop"]
+    client = _client(retries=2, backoff=0.5)
+    r = client.patch(server.url + "/gists/abc", json={"files": {}})
+    assert r.status_code == 200
+    assert len(server.requests) == 3
+    assert client.sleep.waits == [0.5, 1.0]
+
+def test_gives_up_after_retries(server):
+    server.failures = [500, 502, 504]
+    client = _client(retries=2)
+    with pytest.raises(HttpError) as e:
+        client.patch(server.url + "/gists/abc", json={"files": {}})
+    assert e.value.status == 504
+    assert len(server.requests) == 3
+
+def test_client_error_is_not_retried(server):
+    client = _client()
+    with pytest.raises(HttpError) as e:
+        client.get(server.url + "/gists/missing")
+    assert e.value.status == 404
+    assert len(server.requests) == 1
+
+def test_short_retry_after_is_honoured(server):
+    server.failures = [(429, 2)]
+    client = _client(backoff=0.5)
+    client.post(server.url + "/webhook", json={})
+    assert client.sleep.waits == [2.0]
+
+def test_long_retry_after_is_raised_to_caller(server):
+    server.failures = [(429, MAX_RETRY_AFTER + 25)]
+    client = _client()
+    with pytest.raises(HttpError) as e:
+        client.post(server.url + "/webhook", json={})
+    assert e.value.status == 429 and e.value.retry_after == MAX_RETRY_AFTER + 25
+    assert client.sleep.waits == [] and len(server.requests) == 1
+
+def test_post_without_retry_after_is_not_resent(server):
+    # webhook 可能已经收到了，重发会推两遍
+    server.failures = [500]
+    client = _client()
+    with pytest.raises(HttpError) as e:
+        client.post(server.url + "/webhook", json={})
+    assert e.value.status == 500 and e.value.maybe_sent
+    assert len(server.requests) == 1
+
+def test_post_read_timeout_is_not_resent():
+    with LocalHttpServer(latency=1.0) as slow:
+        client = _client(timeout=(1, 0.2), retries=2)
+        with pytest.raises(HttpError) as e:
+            client.post(slow.url + "/webhook", json={"content": "hi"})
+        assert e.value.maybe_sent
+        assert len(slow.requests) == 1 and client.sleep.waits == []
+
+def test_read_timeout_is_bounded():
+    with LocalHttpServer(latency=1.0) as slow:
+        client = _client(timeout=(1, 0.2), retries=1)
+        t = time.perf_counter()
+        with pytest.raises(HttpError) as e:
+            client.get(slow.url + "/gists/x")
+        assert time.perf_counter() - t < 1.0
+        assert e.value.status is None
+        assert len(slow.requests) == 2
+
+# ==== 并发发出 / Gist 状态 ====
+def test_dispatch_isolates_failures():
+    def boom():
+        raise ValueError("x")
+    assert dispatch(lambda: 1, boom, lambda: 3)[::2] == [1, 3]
+    assert isinstance(dispatch(boom)[0], ValueError)
+
+def test_gist_state_round_trip(server):
+    server.gists["abc"] = {}
+    client = _client()
+    store = StateStore(GistBackend("abc", "last_signal.json", "token", api=server.url, client=client))
+    assert store.state["position"] == "none"
+    store.state["position"] = "call"
+    store.flush()
+    again = StateStore(GistBackend("abc", "last_signal.json", "token", api=server.url, client=client))
+    assert again.state["position"] == "call"
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from benchmark import synthetic_bars
+from indicators import stoch
+from stream_indicators import IndicatorEngine
+from strategy import INDICATOR_COLUMNS, compute_indicators
+
+# ==== 实盘引擎 vs 批量内核 ====
+WARMUP = 40  # 引擎在预热期把 K / D 填成 50，批量计算留 NaN 由调用方填
+
+def _engine_frame(df):
+    eng = IndicatorEngine(history=len(df))
+    rows = [row for _, row in eng.update_frame(df)]
+    return pd.DataFrame(rows, index=df.index)[INDICATOR_COLUMNS]
+
+def test_engine_matches_batch_bitwise():
+    df = synthetic_bars(3, seed=7)
+    live = _engine_frame(df).iloc[WARMUP:]
+    batch = compute_indicators(df).iloc[WARMUP:]
+    for c in INDICATOR_COLUMNS:
+        assert np.array_equal(live[c].to_numpy(), batch[c].to_numpy(), equal_nan=True), c
+
+def test_engine_matches_batch_per_minute_with_zero_range():
+    # 出现零区间后批量计算整体加 epsilon；实盘对比的是每分钟重算 [开盘, 当前 bar] 的最后一行
+    df = synthetic_bars(1, seed=3).iloc[:240].copy()
+    df.iloc[100:115, [1, 2, 3]] = 600.0
+    eng = IndicatorEngine()
+    for t, (ts, bar) in enumerate(df.iterrows()):
+        row = eng.update(ts, bar['High'], bar['Low'], bar['Close'])
+        if t >= WARMUP and t % 7 == 0:
+            ref = compute_indicators(df.iloc[:t + 1]).iloc[-1]
+            got = np.array([row[c] for c in INDICATOR_COLUMNS])
+            assert np.array_equal(got, ref[INDICATOR_COLUMNS].to_numpy(dtype=np.float64), equal_nan=True), t
+
+def test_chunked_state_matches_whole():
+    df = synthetic_bars(3, seed=1)
+    whole = compute_indicators(df)
+    state = {"zero_range": False}
+    parts = [compute_indicators(df.iloc[a:a + 700], state=state) for a in range(0, len(df), 700)]
+    chunked = pd.concat(parts)
+    for c in INDICATOR_COLUMNS:
+        assert np.array_equal(chunked[c].to_numpy(), whole[c].to_numpy(), equal_nan=True), c
+
+def test_engine_resumes_from_state():
+    df = synthetic_bars(1, seed=5)
+    full = _engine_frame(df)
+    eng = IndicatorEngine(history=len(df))
+    eng.update_frame(df.iloc[:500])
+    eng = IndicatorEngine.loads(eng.dumps())
+    rows = [row for _, row in eng.update_frame(df.iloc[:900])][1:]
+    resumed = pd.DataFrame(rows, index=df.index[500:900])[INDICATOR_COLUMNS]
+    assert np.array_equal(resumed.to_numpy(), full.iloc[500:900].to_numpy(), equal_nan=True)
+
+def test_stoch_smoothing_survives_zero_range_and_state():
+    # K / D 的平滑窗口增量维护：零区间翻转时重算、落盘恢复后续算，都与每分钟批量 stoch 一致
+    df = synthetic_bars(1, seed=9).iloc[:160].copy()
+    df.iloc[90:100, [1, 2, 3]] = 600.0
+    high, low, close = (df[c].to_numpy() for c in ("High", "Low", "Close"))
+    eng = IndicatorEngine(stoch_k=5, stoch_d=4, stoch_smooth=2)
+    for t, ts in enumerate(df.index):
+        row = eng.update(ts, high[t], low[t], close[t])
+        k, d = (np.nan_to_num(a[-1], nan=50.0) for a in stoch(high[:t + 1], low[:t + 1], close[:t + 1], 5, 4, 2))
+        assert (row['K'], row['D']) == (k, d), t
+        if t % 25 == 0:
+            eng = IndicatorEngine.loads(eng.dumps())
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_store import BarStore, FrameProvider
+from bar_validation import BarValidator
+from conftest import minute_bars
+from parallel_backtest import parallel_backtest
+from stream_backtest import stream_backtest
+from strategy import Strategy
+
+DAYS = [d.date() for d in pd.bdate_range("2025-10-06", "2025-10-24")]
+
+@pytest.fixture(scope="module")
+def bars():
+    raw = minute_bars(DAYS, seed=7)
+    raw.iloc[3000:3012, [1, 2, 3]] = 600.0   # 零区间：stoch 整段加 epsilon
+    raw.iloc[7000, 3] = np.nan
+    # 几天截掉收盘前 20 分钟，收盘清仓信号不出现，仓位跨日带到下一天
+    tod = raw.index.hour * 60 + raw.index.minute
+    cut = np.isin(raw.index.date, [DAYS[i] for i in (2, 5, 6, 11)]) & (tod >= 15 * 60 + 40)
+    return raw[~cut]
+
+# ==== 并行回测与逐日串行（stream_backtest）逐位一致 ====
+@pytest.mark.parametrize("version", ["threshold", "decay"])
+@pytest.mark.parametrize("confirm", [(), (5, 15)])
+def test_parallel_matches_stream(tmp_path, calendar, bars, version, confirm):
+    store = BarStore(str(tmp_path), FrameProvider(bars), BarValidator(verbose=False))
+    strategy = Strategy(version, confirm=confirm)
+    ref = []
+    ledger, minutes, n_signals, n_bars = stream_backtest(store, "SPY", DAYS[0], DAYS[-1], strategy, on_signal=ref.append)
+    assert len(ledger) > 0 and ref
+    day = lambda ts: pd.DatetimeIndex(ts.view("datetime64[ns]")).tz_localize("UTC").tz_convert("America/New_York").date
+    assert (day(ledger.entry_ts) != day(ledger.exit_ts)).any()  # 有跨日持仓，分段边界要接得上
+    for workers in (1, 3):
+        sig = []
+        got = parallel_backtest(store, "SPY", DAYS[0], DAYS[-1], strategy, on_signal=sig.append, workers=workers)
+        assert sig == ref, workers
+        assert got[1:] == (minutes, n_signals, n_bars), workers
+        for f in ledger.FIELDS:
+            a, b = getattr(got[0], f), getattr(ledger, f)
+            assert a.dtype == b.dtype and np.array_equal(a, b), (workers, f)
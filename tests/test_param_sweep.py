@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import param_sweep
+import spy_backtest as bt
+from bar_store import BarStore, FrameProvider
+from bar_validation import BarValidator
+from conftest import minute_bars
+from trade_ledger import compute_metrics
+
+DAYS = [d.date() for d in pd.bdate_range("2025-10-13", "2025-10-16")]
+
+# ==== 扫描结果与 backtest() 同一组参数一致 ====
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_sweep_matches_backtest_with_missing_values(tmp_path, calendar, monkeypatch, capsys, seed):
+    # 中途的 NaN 让指标重新进入预热，扫描必须和 fetch_data 一样把这些 bar 去掉
+    raw = minute_bars(DAYS, seed=seed)
+    rng = np.random.default_rng(seed)
+    raw.iloc[rng.integers(0, len(raw), 6), 3] = np.nan
+    raw.iloc[rng.integers(0, len(raw), 3), 1] = np.nan
+    store = BarStore(str(tmp_path), FrameProvider(raw), BarValidator(verbose=False))
+    monkeypatch.setattr(bt, "bar_store", store)
+    df = store.fetch("SPY", DAYS[0], DAYS[-1])
+    table = param_sweep.sweep(df[param_sweep.BAR_COLUMNS], {"version": ["threshold", "decay"]},
+                              calendar=calendar, workers=1)
+    for version in ("threshold", "decay"):
+        m = compute_metrics(bt.backtest(str(DAYS[0]), str(DAYS[-1]), version=version))
+        row = table[table.version == version].iloc[0]
+        assert (row.trades, row.pnl, row.max_drawdown) == (m["trades"], m["total_pnl"], m["max_drawdown"])
+
+# ==== worker 任务结束后不留共享内存映射 ====
+def test_tasks_close_attached_blocks(calendar):
+    df = minute_bars(DAYS, seed=0)[param_sweep.BAR_COLUMNS]
+    active, near_close = param_sweep.session_masks(df.index, calendar)
+    bars = param_sweep.BarColumns.allocate(len(df), prices=param_sweep.BAR_COLUMNS, indicators=[],
+                                           flags=param_sweep.SESSION_FLAGS, shared=True)
+    ind = param_sweep.BarColumns.allocate(len(df), prices=[], indicators=param_sweep.INDICATOR_COLUMNS,
+                                          flags=[], shared=True)
+    try:
+        bars.ts[:] = df.index.as_unit("ns").asi8
+        for c in param_sweep.BAR_COLUMNS:
+            bars[c] = df[c].to_numpy(dtype=np.float64)
+        bars["active"], bars["near_close"] = active, near_close
+        params = dict(param_sweep.INDICATOR_PARAMS)
+        # 在本进程里跑任务：挂载出的第二份映射必须随任务关掉
+        assert param_sweep._indicator_task(bars.spec(), ind.spec(), params)
+        rows = param_sweep._evaluate_task(bars.spec(), ind.spec(), params, [{}])
+        assert len(rows) == 1
+        with open("/proc/self/maps") as f:
+            maps = f.read()
+        for block in (bars, ind):
+            assert maps.count(block.shm.name) == 1
+    finally:
+        bars.close(unlink=True)
+        ind.close(unlink=True)
@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+
+import pandas as pd
+
+import spy_signal_bot_v4 as bot
+from conftest import minute_bars
+from strategy import Strategy
+
+DAY = date(2025, 10, 15)
+
+class Bars:
+    # 假仓库：每个标的一份分钟线，BAD 模拟数据源出错
+    def __init__(self):
+        self.frames = {"SPY": minute_bars([DAY], seed=1), "QQQ": minute_bars([DAY], seed=2) / 1.5}
+
+    def fetch(self, symbol, start, end, now=None):
+        if symbol == "BAD":
+            raise ConnectionError("feed down")
+        df = self.frames[symbol]
+        return df[df.index < now] if now is not None else df
+
+def _scan(state, symbols, engines, bars, now):
+    return bot.scan_symbols(state, symbols, now=now, engines=engines, bars=bars, closed_only=True,
+                            strategy=Strategy("threshold"))
+
+# ==== 多标的并发扫描 ====
+def test_concurrent_scan_matches_one_symbol_at_a_time(calendar):
+    bars = Bars()
+    multi_state, multi_engines = {"position": "call"}, {}
+    single = {"SPY": ({"position": "call"}, {}), "QQQ": ({}, {})}
+    start = pd.Timestamp(DAY, tz=bot.EST) + pd.Timedelta(hours=10)
+    seen = set()
+    for i in range(240):
+        now = (start + timedelta(minutes=i)).to_pydatetime()
+        got = _scan(multi_state, ["SPY", "QQQ"], multi_engines, bars, now)
+        want = []
+        for sym in ("SPY", "QQQ"):
+            state, engines = single[sym]
+            want += _scan(state, [sym], engines, bars, now)
+        assert got == want, now
+        seen.update(sym for sym, _ in got)
+    assert seen == {"SPY", "QQQ"}
+    # 旧格式顶层的 position 归到 SPY 名下
+    assert "position" not in multi_state and set(multi_state["symbols"]) == {"SPY", "QQQ"}
+
+def test_one_failing_symbol_does_not_block_others(calendar, capsys):
+    bars = Bars()
+    state, engines = {}, {}
+    now = (pd.Timestamp(DAY, tz=bot.EST) + pd.Timedelta(hours=11)).to_pydatetime()
+    alerts = _scan(state, ["SPY", "BAD", "QQQ"], engines, bars, now)
+    assert "[错误] BAD" in capsys.readouterr().out
+    assert all(sym in ("SPY", "QQQ") for sym, _ in alerts)
+    assert engines["SPY"].last_ts is not None and engines["QQQ"].last_ts is not None
+    assert set(state["symbols"]) == {"SPY", "BAD", "QQQ"}
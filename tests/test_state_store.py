@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from http_io import HttpError, HttpClient, LocalHttpServer
+from state_store import DEFAULT_STATE, FileBackend, GistBackend, MemoryBackend, StateStore
+
+# ==== 只读一次、有变化才写 ====
+def test_loads_once_and_skips_clean_flush():
+    backend = MemoryBackend({"position": "call"})
+    store = StateStore(backend)
+    assert not store.flush()  # 没读过也就没变化
+    assert store.state["position"] == "call"
+    store.state
+    assert backend.loads == 1
+    assert not store.dirty and not store.flush()
+    assert backend.saves == []
+
+def test_reversal_writes_once():
+    backend = MemoryBackend()
+    store = StateStore(backend)
+    store.state["position"] = "call"
+    store.state["position"] = "put"   # 同一次运行里反手
+    assert store.dirty
+    assert store.flush()
+    assert backend.saves == [{"position": "put"}]
+    assert not store.flush()
+
+def test_change_back_to_loaded_value_is_not_written():
+    backend = MemoryBackend({"position": "none"})
+    store = StateStore(backend)
+    store.state["position"] = "call"
+    store.state["position"] = "none"
+    assert not store.dirty and not store.flush()
+    assert backend.saves == []
+
+def test_file_backend_round_trip(tmp_path):
+    path = str(tmp_path / "state" / "last_signal.json")
+    assert StateStore(FileBackend(path)).state == DEFAULT_STATE
+    store = StateStore(FileBackend(path))
+    store.state["position"] = "put"
+    store.flush()
+    assert json.load(open(path)) == {"position": "put"}
+    assert StateStore(FileBackend(path)).state["position"] == "put"
+
+def test_gist_load_failure_is_raised_not_treated_as_flat():
+    with LocalHttpServer(failures=[500, 500, 500]) as server:
+        client = HttpClient(retries=2, sleep=lambda s: None)
+        store = StateStore(GistBackend("abc", "last_signal.json", "token", api=server.url, client=client))
+        with pytest.raises(HttpError):
+            store.state
+        assert not store.dirty
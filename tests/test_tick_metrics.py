@@ -0,0 +1,64 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+from live_clock import EST, FakeClock
+from tick_metrics import NULL_TIMER, TickTimer, delivery_record, percentile, summarize, update_metrics_file
+
+# ==== 分段计时：FakeClock 下可复现 ====
+def test_stages_and_lag_follow_the_clock():
+    clock = FakeClock(datetime(2025, 10, 15, 10, 0, 5, tzinfo=EST), real_perf=False)
+    timer = TickTimer(clock)
+    with timer.stage("fetch"):
+        clock.advance(0.25)
+    fetch = timer.timed("indicators", lambda: clock.advance(0.5) or "done")
+    assert fetch() == "done"
+    timer.add("notify", 0.125)
+    timer.add("notify", 0.125)  # 多标的并发时同名阶段累加
+    rec = timer.record(symbols=2)
+    assert rec["bar_close"] == "2025-10-15T10:00:00-04:00"
+    assert rec["stages_ms"] == {"fetch": 250.0, "indicators": 500.0, "notify": 250.0}
+    assert rec["total_ms"] == 750.0
+    assert rec["lag_ms"] == 5750.0  # 唤醒时已离收盘 5 秒，再加处理耗时
+    assert rec["symbols"] == 2
+
+def test_null_timer_is_a_no_op():
+    fn = lambda x: x + 1
+    assert NULL_TIMER.timed("signal", fn) is fn
+    with NULL_TIMER.stage("fetch"):
+        pass
+
+def test_summary_percentiles():
+    assert [percentile(range(1, 101), p) for p in (50, 95, 99)] == [50, 95, 99]
+    ticks = [{"total_ms": float(i), "lag_ms": 2.0 * i, "stages_ms": {"fetch": 1.0}} for i in range(1, 11)]
+    s = summarize(ticks, deliveries=[7.0])
+    assert s["total"] == {"p50": 5.0, "p95": 10.0, "p99": 10.0, "n": 10}
+    assert s["lag"]["p50"] == 10.0 and s["fetch"]["n"] == 10 and s["delivery"]["n"] == 1
+
+# ==== 指标文件：主线程写 tick、发送线程写送达 ====
+def _tick(i):
+    return {"bar_close": f"t{i}", "stages_ms": {"fetch": 1.0}, "total_ms": 2.0, "lag_ms": float(i)}
+
+def test_concurrent_writers_keep_every_record(tmp_path):
+    path = str(tmp_path / "metrics.json")
+    n = 60
+
+    def ticks():
+        for i in range(n):
+            update_metrics_file(_tick(i), path)
+
+    def deliveries():
+        for i in range(n):
+            update_metrics_file(delivery_record([i / 1000]), path)
+
+    threads = [threading.Thread(target=ticks), threading.Thread(target=deliveries)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    saved = json.load(open(path))
+    assert [t["lag_ms"] for t in saved["ticks"]] == [float(i) for i in range(n)]
+    assert saved["deliveries"] == [float(i) for i in range(n)]
+    assert saved["summary"]["delivery"]["n"] == n
+    assert os.listdir(tmp_path) == ["metrics.json"]
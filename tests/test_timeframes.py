@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from benchmark import synthetic_bars
+from timeframes import MINUTE_NS, TimeframeEngine, _align, compute_timeframes, resample_bars, trend_column
+
+# ==== 大周期对齐不看未来 ====
+def test_minute_bar_sees_only_closed_higher_bars():
+    # 09:30 开始的 5 分钟 bar 在 09:35 结束：09:33 的 1 分钟 bar（09:34 收盘）还看不到它，09:34 的刚好看到
+    t0 = pd.Timestamp("2025-10-13 09:30", tz="America/New_York").value
+    ts = t0 + np.arange(10) * MINUTE_NS
+    aligned = _align(ts, np.array([t0 + 5 * MINUTE_NS, t0 + 10 * MINUTE_NS]), np.array([1, -1], dtype=np.int8))
+    assert aligned.tolist() == [0, 0, 0, 0, 1, 1, 1, 1, 1, -1]
+
+def test_prefix_recompute_matches_full_series():
+    # 截到第 i 根重算的最后一行 == 整段里的第 i 行：后面的数据不影响前面的结果
+    df = synthetic_bars(1, seed=2)
+    full = compute_timeframes(df)
+    for i in range(300, len(df), 37):
+        prefix = compute_timeframes(df.iloc[:i + 1])
+        assert prefix.iloc[-1].equals(full.iloc[i]), i
+
+def test_live_engine_matches_batch():
+    df = synthetic_bars(1, seed=6)
+    full = compute_timeframes(df)
+    eng = TimeframeEngine()
+    for i in range(400, 700):
+        now = df.index[i] + pd.Timedelta(minutes=1)
+        eng.update_frame(df.iloc[:i + 2], now=now)  # 第 i + 1 根还在走，不能喂进去
+        got = eng.compute(df.index[i:i + 1])
+        for m in eng.frames:
+            assert got[trend_column(m)].iloc[0] == full[trend_column(m)].iloc[i], (i, m)
+
+def test_resample_buckets_by_clock():
+    df = synthetic_bars(1, seed=1).iloc[:30]
+    five = resample_bars(df, 5)
+    assert df.index[0].minute % 5 == 0
+    first = df.iloc[:5]
+    assert five['Open'].iloc[0] == first['Open'].iloc[0] and five['Close'].iloc[0] == first['Close'].iloc[-1]
+    assert five['High'].iloc[0] == first['High'].max() and five['Low'].iloc[0] == first['Low'].min()
+    assert (five.index.minute % 5 == 0).all()
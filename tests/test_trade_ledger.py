@@ -0,0 +1,49 @@
+import math
+
+import numpy as np
+
+from fast_backtest import EVT_CALL, EVT_CALL_EXIT, EVT_PUT, EVT_PUT_EXIT, EVT_REV_PUT
+from trade_ledger import (REASON_CLEAR, REASON_EXIT, REASON_REVERSAL, LedgerBuilder, TradeLedger,
+                          compute_metrics, format_metrics)
+
+MINUTE_NS = 60_000_000_000
+TS = np.arange(10, dtype=np.int64) * MINUTE_NS
+CLOSE = np.array([100.0, 101, 102, 101, 100, 99, 100, 101, 102, 103])
+
+# ==== 台账 ====
+def test_reversal_and_open_position_at_end():
+    # bar 1 买 call，bar 3 出场同时反手 put，bar 5 平 put，bar 7 再买 call 到最后仍持仓
+    events = [(1, EVT_CALL), (3, EVT_CALL_EXIT), (3, EVT_REV_PUT), (5, EVT_PUT_EXIT), (7, EVT_CALL)]
+    ledger = TradeLedger.from_events(events, 1, TS, CLOSE)
+    assert ledger.side.tolist() == [1, -1, 1]
+    assert ledger.exit_reason.tolist() == [REASON_REVERSAL, REASON_EXIT, REASON_CLEAR]
+    assert ledger.pnl.tolist() == [0.0, 2.0, 2.0]
+    assert ledger.exit_ts[-1] == TS[-1]
+
+def test_chunked_feed_matches_whole():
+    events = [(1, EVT_CALL), (3, EVT_CALL_EXIT), (3, EVT_REV_PUT), (5, EVT_PUT_EXIT), (7, EVT_CALL)]
+    whole = TradeLedger.from_events(events, 1, TS, CLOSE)
+    builder = LedgerBuilder()
+    builder.feed([e for e in events if e[0] < 4], TS[:4], CLOSE[:4])
+    builder.feed([(i - 4, e) for i, e in events if i >= 4], TS[4:], CLOSE[4:])
+    chunked = builder.finish(1)
+    for f in TradeLedger.FIELDS:
+        assert np.array_equal(getattr(chunked, f), getattr(whole, f)), f
+
+# ==== 统计边界 ====
+def test_metrics_of_empty_ledger():
+    for ledger in (TradeLedger.concat([]), TradeLedger.from_events([], 0, TS, CLOSE)):
+        m = compute_metrics(ledger, session_minutes=390)
+        assert m["trades"] == 0 and m["total_pnl"] == 0.0 and m["max_drawdown"] == 0.0
+        assert math.isnan(m["win_rate"]) and math.isnan(m["expectancy"])
+        assert m["exposure"] == 0.0
+        assert "胜率：-" in format_metrics(m)
+        assert ledger.to_frame().empty
+
+def test_metrics_of_only_losing_trades():
+    events = [(2, EVT_CALL), (4, EVT_CALL_EXIT), (6, EVT_PUT), (9, EVT_PUT_EXIT)]
+    m = compute_metrics(TradeLedger.from_events(events, 0, TS, CLOSE))
+    assert m["trades"] == 2 and m["win_rate"] == 0.0
+    assert m["total_pnl"] == -5.0 and m["avg_loss"] == -2.5 and math.isnan(m["avg_win"])
+    assert m["max_drawdown"] == -5.0
+    assert m["calls"] == 1 and m["puts"] == 1
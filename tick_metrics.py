@@ -0,0 +1,134 @@
+import os
+import json
+import math
+import tempfile
+import threading
+from contextlib import contextmanager, nullcontext
+
+# ==== 单次 tick 分段计时 ====
+# 每个阶段（读状态、日历、拉数据、指标、信号、写状态、推送）只在进出时各取一次 perf 计数，
+# 开销可以忽略，线上常开。每个 tick 输出一行 JSON；设置 METRICS_FILE 时另把最近若干个 tick
+# 存到本地文件并算好滚动 p50/p95/p99。计时全部走注入的时钟，FakeClock 下结果可复现。
+# tick 的 lag_ms 只到告警交出（进 alert_queue 或同步推送完成）为止；webhook 真正收到的时刻由
+# alert_queue 送达后另报一行 delivery_ms（每条告警从 bar 收盘到送达），同样进滚动统计。
+METRICS_FILE = os.environ.get("METRICS_FILE")
+METRICS_WINDOW = 500
+PERCENTILES = (50, 95, 99)
+_file_lock = threading.Lock()  # 主线程写 tick、alert_queue 发送线程写送达，读改写要串行
+
+class TickTimer:
+    def __init__(self, clock, bar_close=None):
+        self.clock = clock
+        self.started_at = clock.now()
+        self.bar_close = bar_close or self.started_at.replace(second=0, microsecond=0)
+        self.t0 = clock.perf()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        t = self.clock.perf()
+        try:
+            yield
+        finally:
+            self.add(name, self.clock.perf() - t)
+
+    def add(self, name, seconds):
+        # 同名阶段累加（多标的并发时为各标的耗时之和）
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def timed(self, name, fn):
+        def run(*args, **kwargs):
+            with self.stage(name):
+                return fn(*args, **kwargs)
+        return run
+
+    def elapsed(self):
+        return self.clock.perf() - self.t0
+
+    def lag(self):
+        # bar 收盘到此刻（告警已交出）：唤醒时刻距收盘 + 本次处理耗时
+        return (self.started_at - self.bar_close).total_seconds() + self.elapsed()
+
+    def record(self, **extra):
+        rec = {
+            "bar_close": self.bar_close.isoformat(),
+            "started": self.started_at.isoformat(),
+            "stages_ms": {k: round(v * 1000, 3) for k, v in self.stages.items()},
+            "total_ms": round(self.elapsed() * 1000, 3),
+            "lag_ms": round(self.lag() * 1000, 3),
+        }
+        rec.update(extra)
+        return rec
+
+class NullTimer:
+    # 不需要计时的调用方（回测、基准）传这个，接口相同、零开销
+    def stage(self, name):
+        return nullcontext()
+
+    def add(self, name, seconds):
+        pass
+
+    def timed(self, name, fn):
+        return fn
+
+NULL_TIMER = NullTimer()
+
+def delivery_record(lags):
+    # alert_queue 送达一组告警后的记录：每条告警从信号 bar 收盘到 webhook 接收的毫秒数
+    return {"delivered": len(lags), "delivery_ms": [round(s * 1000, 3) for s in lags]}
+
+def emit_delivery(lags, path=None):
+    emit(delivery_record(lags), path)
+
+# ==== 输出 ====
+def emit(record, path=None):
+    print(json.dumps(record, ensure_ascii=False))
+    path = path or METRICS_FILE
+    if path:
+        try:
+            update_metrics_file(record, path)
+        except OSError as e:
+            print("[指标文件写入失败]", e)
+
+def percentile(values, p):
+    # 最近秩法
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def summarize(ticks, deliveries=()):
+    series = {"total": [t["total_ms"] for t in ticks], "lag": [t["lag_ms"] for t in ticks],
+              "delivery": list(deliveries)}
+    for t in ticks:
+        for name, ms in t["stages_ms"].items():
+            series.setdefault(name, []).append(ms)
+    return {name: {f"p{p}": percentile(vals, p) for p in PERCENTILES} | {"n": len(vals)}
+            for name, vals in series.items() if vals}
+
+def update_metrics_file(record, path, window=METRICS_WINDOW):
+    # tick 记录和送达记录（delivery_record）写进同一个文件，各留最近 window 条。
+    # 两个线程都会调这里：读改写整段持锁，临时文件每次单独建，写完原子替换
+    with _file_lock:
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        ticks, deliveries = saved.get("ticks", []), saved.get("deliveries", [])
+        if "delivery_ms" in record:
+            deliveries = (deliveries + record["delivery_ms"])[-window:]
+        else:
+            ticks = (ticks + [{k: record[k] for k in ("bar_close", "stages_ms", "total_ms", "lag_ms")}])[-window:]
+        summary = summarize(ticks, deliveries)
+        folder = os.path.dirname(path) or "."
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"summary": summary, "ticks": ticks, "deliveries": deliveries}, f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return summary
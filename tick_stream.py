@@ -0,0 +1,300 @@
+import json
+import time
+import heapq
+import socket
+import threading
+import socketserver
+import numpy as np
+from bar_store import BAR_DTYPE, COLUMNS, EST, to_frame
+
+# ==== 逐笔行情 ====
+# 行情源推逐笔成交（可选报价），内存里按分钟聚合成 1 分钟 bar，每笔只动正在走的那一根（O(1)）。
+# bar 在下一分钟的第一笔到达、或时钟走过分钟末尾时立即收盘，交给实盘评估（spy_signal_bot_v4.run_stream），
+# 不再等下一次定时拉取。消息是一行一个 JSON（风格同常见行情 websocket）：
+#   {"ev": "T", "sym": "SPY", "t": 纳秒, "p": 价格, "s": 数量}      成交
+#   {"ev": "Q", "sym": "SPY", "t": 纳秒, "bp": 买一, "ap": 卖一}    报价（quotes=True 时按中间价计入，数量 0）
+#   {"ev": "hb", "t": 纳秒}                                         心跳：行情时间已走到 t
+#   {"ev": "end"}                                                   回放结束
+# 客户端连上后先发 {"action": "subscribe", "params": "SPY,QQQ"}。
+MINUTE_NS = 60_000_000_000
+MINUTES_PER_DAY = 16 * 60  # 04:00–19:59
+IDLE = 0.05  # 没有消息时多久交还一次控制权，让调用方按时钟收盘
+RETRIES = 3
+BACKOFF = 0.5
+
+# ==== 消息 ====
+def encode_tick(symbol, ts, price, size=0.0):
+    return json.dumps({"ev": "T", "sym": symbol, "t": int(ts), "p": float(price), "s": float(size)})
+
+def encode_heartbeat(ts):
+    return json.dumps({"ev": "hb", "t": int(ts)})
+
+def decode_message(msg, quotes=False):
+    # -> (标的, 纳秒, 价格, 数量)；心跳的标的为 None；其他消息返回 None
+    ev = msg.get("ev")
+    if ev == "T":
+        return msg["sym"], int(msg["t"]), float(msg["p"]), float(msg.get("s") or 0.0)
+    if ev == "Q" and quotes:
+        return msg["sym"], int(msg["t"]), (float(msg["bp"]) + float(msg["ap"])) / 2, 0.0
+    if ev == "hb":
+        return None, int(msg["t"]), float("nan"), 0.0
+    return None
+
+# ==== 聚合 ====
+class BarAggregator:
+    # 每个标的只保留正在走的那根 [分钟起点纳秒, O, H, L, C, V]；收盘的 bar 以
+    # (标的, 分钟起点纳秒, O, H, L, C, V) 返回。已收盘分钟里迟到的成交丢弃并计数
+    def __init__(self, grace=0.0):
+        self.grace_ns = int(grace * 1e9)  # 按时钟收盘时多等一会儿迟到的成交
+        self.current = {}
+        self.closed_until = {}  # 标的 -> 已收盘到的纳秒
+        self.late = 0
+
+    def on_tick(self, symbol, ts, price, size=0.0):
+        start = ts - ts % MINUTE_NS
+        bar = self.current.get(symbol)
+        if bar is not None and bar[0] == start:
+            if price > bar[2]:
+                bar[2] = price
+            if price < bar[3]:
+                bar[3] = price
+            bar[4] = price
+            bar[5] += size
+            return None
+        if start < self.closed_until.get(symbol, start) or (bar is not None and start < bar[0]):
+            self.late += 1
+            return None
+        closed = self._close(symbol) if bar is not None else None
+        self.current[symbol] = [start, price, price, price, price, size]
+        return closed
+
+    def _close(self, symbol):
+        bar = self.current.pop(symbol)
+        self.closed_until[symbol] = bar[0] + MINUTE_NS
+        return (symbol, *bar)
+
+    def close_due(self, now_ns):
+        # 分钟已走完（再加 grace）还没等到下一笔的标的，按时钟收盘
+        due = [s for s, bar in self.current.items() if bar[0] + MINUTE_NS + self.grace_ns <= now_ns]
+        return [self._close(s) for s in due]
+
+    def forming(self, symbol):
+        bar = self.current.get(symbol)
+        return (symbol, *bar) if bar is not None else None
+
+# ==== 内存 K 线 ====
+class LiveBars:
+    # 当天的 1 分钟线，接口同 BarStore.fetch，可直接注入 get_data / scan_symbols。
+    # 收盘的 bar 追加进预分配的结构数组（满了翻倍）；intrabar 模式下正在走的那根放在 forming，fetch 时接在最后。
+    # 没有成交的分钟聚合不出 bar，fetch 时与 BarStore 一样过 bar_validation（缺失分钟按同一策略标记 / 补齐）
+    def __init__(self, capacity=MINUTES_PER_DAY, validator=None):
+        self.capacity = capacity
+        self.rec = {}
+        self.count = {}
+        self.forming = {}
+        self.validator = validator
+
+    def _ensure(self, symbol, n):
+        rec = self.rec.get(symbol)
+        if rec is None:
+            rec = self.rec[symbol] = np.empty(max(self.capacity, n), dtype=BAR_DTYPE)
+            self.count[symbol] = 0
+        elif n > len(rec):
+            grown = np.empty(max(n, 2 * len(rec)), dtype=BAR_DTYPE)
+            grown[:len(rec)] = rec
+            rec = self.rec[symbol] = grown
+        return rec
+
+    def seed(self, symbol, df):
+        # 开盘前 / 启动前的历史（BarStore.fetch 的结果，只含已收盘的 bar）
+        rec = self._ensure(symbol, len(df))
+        rec["ts"][:len(df)] = df.index.as_unit("ns").asi8
+        for c in COLUMNS:
+            rec[c][:len(df)] = df[c].to_numpy(dtype=np.float64) if c in df.columns else np.nan
+        self.count[symbol] = len(df)
+
+    def append(self, bar):
+        # bar：BarAggregator 收盘的元组；与最后一根同一分钟时覆盖（启动时那一分钟的历史只拉到一半）
+        symbol, start = bar[0], bar[1]
+        n = self.count.get(symbol, 0)
+        rec = self._ensure(symbol, n + 1)
+        if n and rec["ts"][n - 1] >= start:
+            if rec["ts"][n - 1] > start:
+                return
+            n -= 1
+        rec[n] = bar[1:]
+        self.count[symbol] = n + 1
+        self.forming.pop(symbol, None)
+
+    def fetch(self, symbol, start_date=None, end_date=None, now=None):
+        rec = self.rec.get(symbol)
+        rec = rec[:self.count[symbol]] if rec is not None else np.empty(0, dtype=BAR_DTYPE)
+        forming = self.forming.get(symbol)
+        if forming is not None and (not len(rec) or forming[1] > rec["ts"][-1]):
+            rec = np.concatenate([rec, np.array([forming[1:]], dtype=BAR_DTYPE)])
+        if self.validator is not None and len(rec):
+            from market_calendar import get_calendar
+            day = to_frame(rec[-1:]).index[0].date()
+            rec = self.validator.apply(symbol, day, rec, get_calendar(day, day), live=True)
+        return to_frame(rec)
+
+# ==== 行情源 ====
+class TickSource:
+    # 行情源接口：迭代产出 decode_message 的元组；没有新消息时产出 None（调用方借机按时钟收盘）
+    def __iter__(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class ListSource(TickSource):
+    # 内存里的消息列表（dict 或已解码的元组），离线调试用
+    def __init__(self, messages, quotes=False):
+        self.messages = messages
+        self.quotes = quotes
+
+    def __iter__(self):
+        for msg in self.messages:
+            yield decode_message(msg, self.quotes) if isinstance(msg, dict) else msg
+
+class SocketFeed(TickSource):
+    # 推送式行情：TCP 长连接上一行一个 JSON（url 形如 tcp://host:port）。
+    # 断线按指数退避重连（连续失败 retries 次后放弃），重连后重新订阅；断线期间的成交会缺失
+    def __init__(self, url, symbols, quotes=False, idle=IDLE, retries=RETRIES, backoff=BACKOFF, sleep=time.sleep):
+        host, _, port = url.split("://", 1)[-1].rpartition(":")
+        self.address = (host, int(port))
+        self.symbols = list(symbols)
+        self.quotes = quotes
+        self.idle = idle
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.sock = None
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=5)
+        sock.sendall((json.dumps({"action": "subscribe", "params": ",".join(self.symbols)}) + "\n").encode())
+        sock.settimeout(self.idle)
+        return sock
+
+    def __iter__(self):
+        failures = 0
+        try:
+            while True:
+                try:
+                    self.sock = self._connect()
+                except OSError as e:
+                    failures += 1
+                    if failures > self.retries:
+                        raise ConnectionError(f"行情连接失败：{e}")
+                    self.sleep(self.backoff * 2 ** (failures - 1))
+                    continue
+                buf = b""
+                while True:
+                    try:
+                        chunk = self.sock.recv(65536)
+                    except socket.timeout:
+                        yield None
+                        continue
+                    except OSError:
+                        chunk = b""
+                    if not chunk:
+                        break
+                    failures = 0
+                    *lines, buf = (buf + chunk).split(b"\n")
+                    for line in lines:
+                        msg = json.loads(line)
+                        if msg.get("ev") == "end":
+                            return
+                        tick = decode_message(msg, self.quotes)
+                        if tick is not None:
+                            yield tick
+                print("[行情] 连接断开，重连中")
+                self.sock.close()
+        finally:
+            self.close()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+# ==== 本地回放 ====
+def bars_to_ticks(df):
+    # 1 分钟线拆成逐笔：开盘（+0s）、先低后高或先高后低（+15s / +30s）、收盘（+45s，带整根成交量）。
+    # 聚合回来与原 bar 一致；开盘价落在高低区间外的坏 bar 不发开盘那笔
+    df = df[df['Close'].notna()]
+    ts = df.index.as_unit("ns").asi8
+    o, h, l, c = (df[col].to_numpy(dtype=np.float64) for col in ('Open', 'High', 'Low', 'Close'))
+    v = np.nan_to_num(df['Volume'].to_numpy(dtype=np.float64)) if 'Volume' in df.columns else np.zeros(len(df))
+    up = c >= o
+    first, second = np.where(up, l, h), np.where(up, h, l)
+    second_ns = 15_000_000_000
+    ticks = []
+    for i in range(len(ts)):
+        if l[i] <= o[i] <= h[i]:
+            ticks.append((int(ts[i]), float(o[i]), 0.0))
+        ticks.append((int(ts[i]) + second_ns, float(first[i]), 0.0))
+        ticks.append((int(ts[i]) + 2 * second_ns, float(second[i]), 0.0))
+        ticks.append((int(ts[i]) + 3 * second_ns, float(c[i]), float(v[i])))
+    return ticks
+
+class ReplayServer:
+    # 本地行情回放服务：把 {标的: [(纳秒, 价格, 数量)]} 按时间顺序推给订阅的客户端，
+    # 每根有成交的分钟结束时插一条心跳。speed=None 尽快推完，1 为真实节奏，>1 加速
+    def __init__(self, ticks, speed=None):
+        self.ticks = {s: sorted(t) for s, t in ticks.items()}
+        self.speed = speed
+        self.server = None
+        self.url = None
+
+    def start(self):
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _make_handler(self))
+        self.server.daemon_threads = True
+        self.url = f"tcp://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def messages(self, symbols):
+        streams = [[(ts, s, p, v) for ts, p, v in self.ticks.get(s, [])] for s in symbols]
+        minute = None
+        for ts, symbol, price, size in heapq.merge(*streams):
+            start = ts - ts % MINUTE_NS
+            if minute is not None and start > minute:
+                yield minute + MINUTE_NS, encode_heartbeat(minute + MINUTE_NS)
+            minute = start
+            yield ts, encode_tick(symbol, ts, price, size)
+        if minute is not None:
+            yield minute + MINUTE_NS, encode_heartbeat(minute + MINUTE_NS)
+        yield None, json.dumps({"ev": "end"})
+
+def _make_handler(replay):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline() or b"{}")
+            symbols = [s for s in str(request.get("params", "")).split(",") if s]
+            t0 = first = None
+            try:
+                for ts, line in replay.messages(symbols):
+                    if replay.speed and ts is not None:
+                        first = ts if first is None else first
+                        t0 = t0 or time.perf_counter()
+                        delay = t0 + (ts - first) / 1e9 / replay.speed - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                    self.wfile.write(line.encode() + b"\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 客户端已断开
+
+    return Handler
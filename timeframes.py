@@ -0,0 +1,192 @@
+import json
+import numpy as np
+import pandas as pd
+import indicators as ind
+
+# ==== 多周期确认 ====
+# 5 / 15 分钟线由 1 分钟线向量化聚合（时间戳按周期取整分桶，reduceat 一次求出每桶 OHLCV），
+# 大周期上只算一次趋势（快慢 EMA 谁在上），再对齐回 1 分钟索引。不看未来：
+# 1 分钟 bar t 在 t+1 分钟收盘，只能用结束时间 <= t+1 分钟的大周期 bar。
+# 实盘的 TimeframeEngine 随 1 分钟 bar 收盘只喂新 bar，大周期 bar 走完才推进一次 EMA，
+# 与整段批量计算逐位一致（indicators.ema 的逐点递推与切分方式无关）。
+TIMEFRAMES = (5, 15)
+# 实盘每天从 04:00 开始喂：15 分钟 × 21 根 = 5 小时 15 分，9:15 前就绪
+TREND_PARAMS = {"fast": 8, "slow": 21}
+MINUTE_NS = 60_000_000_000
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+def trend_column(minutes):
+    return f"TREND_{minutes}M"
+
+def parse_frames(text):
+    # "5,15" -> (5, 15)；空串表示不做多周期确认
+    return tuple(int(m) for m in str(text or "").split(",") if m.strip())
+
+# ==== 聚合 ====
+def _bucket_starts(ts, minutes):
+    # ts：升序纳秒；返回 (每个桶在 ts 里的起始下标, 桶起点纳秒)。5、15 分钟都整除一小时，UTC 取整即美东取整
+    label = ts - ts % (minutes * MINUTE_NS)
+    starts = np.flatnonzero(np.r_[True, label[1:] != label[:-1]]) if len(ts) else np.empty(0, dtype=np.int64)
+    return starts, label[starts]
+
+def resample_bars(df, minutes):
+    # 1 分钟 OHLCV -> N 分钟 OHLCV，索引为桶起点；Close 为 NaN 的 bar 不参与
+    df = df[df['Close'].notna()]
+    ts = df.index.as_unit("ns").asi8
+    starts, labels = _bucket_starts(ts, minutes)
+    index = pd.DatetimeIndex(labels.view("datetime64[ns]"), name=df.index.name)
+    index = index.tz_localize("UTC").tz_convert(df.index.tz)
+    if not len(starts):
+        return pd.DataFrame({c: np.empty(0) for c in BAR_COLUMNS if c in df.columns}, index=index)
+    last = np.r_[starts[1:], len(ts)] - 1
+    out = {}
+    if 'Open' in df.columns:
+        out['Open'] = df['Open'].to_numpy(dtype=np.float64)[starts]
+    if 'High' in df.columns:
+        out['High'] = np.fmax.reduceat(df['High'].to_numpy(dtype=np.float64), starts)
+    if 'Low' in df.columns:
+        out['Low'] = np.fmin.reduceat(df['Low'].to_numpy(dtype=np.float64), starts)
+    out['Close'] = df['Close'].to_numpy(dtype=np.float64)[last]
+    if 'Volume' in df.columns:
+        out['Volume'] = np.add.reduceat(np.nan_to_num(df['Volume'].to_numpy(dtype=np.float64)), starts)
+    return pd.DataFrame(out, index=index)
+
+# ==== 大周期趋势 ====
+def _trend(fast, slow):
+    # 快线在上 1 / 在下 -1 / 预热期或相等 0
+    with np.errstate(invalid='ignore'):
+        return np.where(fast > slow, 1, np.where(fast < slow, -1, 0)).astype(np.int8)
+
+def _advance(ts, close, minutes, p, st):
+    # 把一段新的 1 分钟 (时间戳, 收盘价) 接到 st 上，返回这段里新走完的大周期 bar 的 (结束纳秒, 趋势)。
+    # 最后一个桶还没到结束时间就先挂在 st["pending"]，下一段来了再一起聚合
+    keep = ~np.isnan(close)
+    ts, close = ts[keep], close[keep]
+    pending = st.get("pending")
+    if pending:
+        ts = np.concatenate([np.asarray(pending[0], dtype=np.int64), ts])
+        close = np.concatenate([np.asarray(pending[1], dtype=np.float64), close])
+    starts, labels = _bucket_starts(ts, minutes)
+    ends = labels + minutes * MINUTE_NS
+    done = len(starts)
+    if done and ends[-1] > ts[-1] + MINUTE_NS:
+        done -= 1
+    rest = starts[done] if done < len(starts) else len(ts)
+    st["pending"] = [ts[rest:].tolist(), close[rest:].tolist()]
+    last = np.r_[starts[1:], len(ts)][:done] - 1
+    closes = close[last]
+    fast = ind.ema(closes, p["fast"], state=st.setdefault("fast", {}))
+    slow = ind.ema(closes, p["slow"], state=st.setdefault("slow", {}))
+    return ends[:done], _trend(fast, slow)
+
+def _align(ts, ends, trend):
+    # 1 分钟 bar t 可用的最近一根已收盘大周期 bar；之前没有则为 0
+    pos = np.searchsorted(ends, ts + MINUTE_NS, side="right") - 1
+    out = np.zeros(len(ts), dtype=np.int8)
+    ok = pos >= 0
+    out[ok] = trend[pos[ok]]
+    return out
+
+def _step(ts, close, minutes, p, st):
+    # 同 _advance，另把上一段最后一根已收盘的大周期 bar 放在最前面，供这一段开头几行对齐
+    ends, trend = _advance(ts, close, minutes, p, st)
+    last = st.get("last")
+    if last:
+        ends, trend = np.r_[last[0], ends], np.r_[np.int8(last[1]), trend]
+    if len(ends):
+        st["last"] = [int(ends[-1]), int(trend[-1])]
+    return ends, trend
+
+def compute_timeframes(df, frames=TIMEFRAMES, p=None, state=None):
+    # 返回只含 TREND_5M / TREND_15M 等列的 DataFrame（int8：1 多 / -1 空 / 0 未定）。
+    # state 为 dict 时按块续算（多日流式回测），与 compute_indicators 的 state 一样各块拼起来与整段一致
+    p = dict(TREND_PARAMS, **(p or {}))
+    ts = df.index.as_unit("ns").asi8
+    close = np.asarray(df['Close'], dtype=np.float64)  # df 也可以是 bar_columns.BarColumns
+    out = {}
+    for m in frames:
+        st = state.setdefault(str(m), {}) if state is not None else {}
+        out[trend_column(m)] = _align(ts, *_step(ts, close, m, p, st))
+    return pd.DataFrame(out, index=df.index)
+
+def advance_timeframes(ts, close, frames=TIMEFRAMES, p=None, state=None):
+    # 只推进 compute_timeframes 的续算状态、不对齐（并行回测快速走到每段开头）；ts 为纳秒
+    p = dict(TREND_PARAMS, **(p or {}))
+    for m in frames:
+        _step(ts, np.asarray(close, dtype=np.float64), m, p, state.setdefault(str(m), {}))
+    return state
+
+def _join(df, trends):
+    return pd.concat([df.drop(columns=trends.columns, errors="ignore"), trends], axis=1)
+
+def add_timeframes(df, frames=TIMEFRAMES, p=None, state=None):
+    return _join(df, compute_timeframes(df, frames, p, state))
+
+def agreement_masks(df, frames):
+    # (多头一致, 空头一致)：所有大周期趋势同向
+    up = np.ones(len(df), dtype=bool)
+    down = np.ones(len(df), dtype=bool)
+    for m in frames:
+        trend = np.asarray(df[trend_column(m)])
+        up &= trend > 0
+        down &= trend < 0
+    return up, down
+
+# ==== 实盘增量 ====
+class TimeframeEngine:
+    # 每个 tick 只喂上次之后已收盘的 1 分钟 bar；只保留最近几根大周期 bar 的趋势供对齐
+    def __init__(self, frames=TIMEFRAMES, p=None, history=8):
+        self.frames = tuple(frames)
+        self.p = dict(TREND_PARAMS, **(p or {}))
+        self.history = history
+        self.state = {}
+        self.recent = {str(m): [] for m in self.frames}  # [(结束纳秒, 趋势)]
+        self.last_ns = None
+
+    def reset(self):
+        # 清空状态（已喂过的 bar 被数据源修订时，从头重喂）
+        self.__init__(self.frames, self.p, self.history)
+
+    def update_frame(self, df, now=None):
+        # now 给定时只喂 t + 1 分钟 <= now 的 bar（正在走的那一分钟不算收盘）
+        ts = df.index.as_unit("ns").asi8
+        lo = int(np.searchsorted(ts, self.last_ns, side="right")) if self.last_ns is not None else 0
+        hi = len(ts)
+        if now is not None:
+            hi = int(np.searchsorted(ts, pd.Timestamp(now).as_unit("ns").value - MINUTE_NS, side="right"))
+        if hi <= lo:
+            return
+        close = df['Close'].to_numpy(dtype=np.float64)[lo:hi]
+        for m in self.frames:
+            ends, trend = _advance(ts[lo:hi], close, m, self.p, self.state.setdefault(str(m), {}))
+            recent = self.recent[str(m)] + list(zip(ends.tolist(), trend.tolist()))
+            self.recent[str(m)] = recent[-self.history:]
+        self.last_ns = int(ts[hi - 1])
+
+    def compute(self, index):
+        ts = index.as_unit("ns").asi8
+        out = {}
+        for m in self.frames:
+            recent = self.recent[str(m)]
+            ends = np.array([e for e, _ in recent], dtype=np.int64)
+            trend = np.array([t for _, t in recent], dtype=np.int8)
+            out[trend_column(m)] = _align(ts, ends, trend)
+        return pd.DataFrame(out, index=index)
+
+    def attach(self, df):
+        # 给 df（实盘最近几行）加上各周期趋势列
+        return _join(df, self.compute(df.index))
+
+    def dumps(self):
+        return json.dumps({"frames": self.frames, "p": self.p, "history": self.history, "state": self.state,
+                           "recent": self.recent, "last_ns": self.last_ns},
+                          default=lambda o: o.item())
+
+    @classmethod
+    def loads(cls, text):
+        payload = json.loads(text)
+        engine = cls(payload["frames"], payload["p"], payload["history"])
+        engine.state = payload["state"]
+        engine.recent = {k: [tuple(r) for r in v] for k, v in payload["recent"].items()}
+        engine.last_ns = payload["last_ns"]
+        return engine
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+from zoneinfo import ZoneInfo
+from fast_backtest import (EVT_CALL_EXIT, EVT_PUT_EXIT, EVT_REV_PUT, EVT_REV_CALL,
+                           EVT_CALL, EVT_PUT, EVT_CLEAR, session_masks)
+
+# ==== 交易台账 ====
+# 结构数组（每个字段一列 ndarray），由状态机事件流一次生成；
+# 指标统计全部向量化，多年 1 分钟回测也只是几次数组运算。
+EST = ZoneInfo("America/New_York")
+FILL_WINDOW_NS = 5 * 60_000_000_000  # 下一根 bar 离信号超过 5 分钟（数据缺口 / 当天最后一根）就按信号价成交
+REASON_EXIT, REASON_REVERSAL, REASON_CLEAR = 0, 1, 2
+REASON_TEXT = {REASON_EXIT: "exit", REASON_REVERSAL: "reversal", REASON_CLEAR: "clear"}
+SIDE_TEXT = {1: "call", -1: "put"}
+
+class TradeLedger:
+    FIELDS = ("entry_ts", "exit_ts", "side", "entry_price", "exit_price", "exit_reason", "entry_fill", "exit_fill")
+
+    def __init__(self, entry_ts, exit_ts, side, entry_price, exit_price, exit_reason, entry_fill, exit_fill):
+        self.entry_ts = np.asarray(entry_ts, dtype=np.int64)      # epoch ns (UTC)
+        self.exit_ts = np.asarray(exit_ts, dtype=np.int64)
+        self.side = np.asarray(side, dtype=np.int8)                # +1 call / -1 put
+        self.entry_price = np.asarray(entry_price, dtype=np.float64)
+        self.exit_price = np.asarray(exit_price, dtype=np.float64)
+        self.exit_reason = np.asarray(exit_reason, dtype=np.uint8)
+        # 信号之后下一根 bar 的开盘价（成交模拟用，见 execution.py）；price 仍是信号 bar 的收盘价
+        self.entry_fill = np.asarray(entry_fill, dtype=np.float64)
+        self.exit_fill = np.asarray(exit_fill, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.side)
+
+    @property
+    def pnl(self):
+        return self.side * (self.exit_price - self.entry_price)
+
+    @classmethod
+    def from_events(cls, events, position, ts_ns, close, open_=None):
+        builder = LedgerBuilder()
+        builder.feed(events, ts_ns, close, open_)
+        return builder.finish(position)
+
+    @classmethod
+    def concat(cls, ledgers):
+        ledgers = list(ledgers)
+        if not ledgers:
+            return cls(*([[]] * len(cls.FIELDS)))
+        merged = cls(*(np.concatenate([getattr(l, f) for l in ledgers]) for f in cls.FIELDS))
+        order = np.argsort(merged.entry_ts, kind="stable")
+        return cls(*(getattr(merged, f)[order] for f in cls.FIELDS))
+
+    def to_frame(self, extra=None):
+        # extra：附加列（如 execution.Fills.columns()）
+        return pd.DataFrame({
+            "entry_ts": pd.to_datetime(self.entry_ts, utc=True).tz_convert(EST),
+            "exit_ts": pd.to_datetime(self.exit_ts, utc=True).tz_convert(EST),
+            "side": pd.Categorical.from_codes((self.side > 0).astype(np.int8), ["put", "call"]),
+            "entry_price": self.entry_price,
+            "exit_price": self.exit_price,
+            "exit_reason": pd.Categorical.from_codes(self.exit_reason.astype(np.int8), ["exit", "reversal", "clear"]),
+            "pnl": self.pnl,
+            "entry_fill": self.entry_fill,
+            "exit_fill": self.exit_fill,
+            **(extra or {}),
+        })
+
+    def to_csv(self, path, extra=None):
+        self.to_frame(extra).to_csv(path, index=False)
+
+    def to_parquet(self, path, extra=None):
+        # 需要 pyarrow / fastparquet
+        self.to_frame(extra).to_parquet(path, index=False)
+
+    def export(self, path, extra=None):
+        if path.endswith(".parquet"):
+            self.to_parquet(path, extra)
+        else:
+            self.to_csv(path, extra)
+
+class LedgerBuilder:
+    # 事件发生在哪根 bar 就按那根收盘价记价；出场后同一根 bar 反手记为 reversal；
+    # 末尾仍持仓的按最后一根 bar 平仓（对应原循环结尾的“收盘前清仓”）。
+    # 另记成交价：下一根 bar 的开盘价，下一根不在 FILL_WINDOW_NS 内（或没给开盘价）时用信号价。
+    # 可以分块喂入（流式多日回测），未平的仓位跨块延续；块尾的下一根总在隔夜之后，按信号价，分块方式不影响结果
+    def __init__(self):
+        self.rows = {f: [] for f in TradeLedger.FIELDS}
+        self.open = None  # (入场时间, 入场价, 方向, 入场成交价)
+        self.last = None  # 最后一根 bar 的 (时间, 收盘价)
+
+    def _close(self, ts, price, reason, fill=None):
+        entry_ts, entry_price, side, entry_fill = self.open
+        values = (entry_ts, ts, side, entry_price, price, reason, entry_fill, price if fill is None else fill)
+        for f, v in zip(TradeLedger.FIELDS, values):
+            self.rows[f].append(v)
+        self.open = None
+
+    def feed(self, events, ts_ns, close, open_=None):
+        ts_ns, close = np.asarray(ts_ns), np.asarray(close, dtype=np.float64)
+        n = len(close)
+
+        def fill(i):
+            if open_ is not None and i + 1 < n and ts_ns[i + 1] - ts_ns[i] <= FILL_WINDOW_NS \
+                    and open_[i + 1] == open_[i + 1]:
+                return float(open_[i + 1])
+            return close[i]
+
+        for k, (i, e) in enumerate(events):
+            if e in (EVT_CALL_EXIT, EVT_PUT_EXIT, EVT_CLEAR) and self.open is not None:
+                reason = REASON_CLEAR if e == EVT_CLEAR else REASON_EXIT
+                if k + 1 < len(events) and events[k + 1][0] == i and events[k + 1][1] in (EVT_REV_PUT, EVT_REV_CALL):
+                    reason = REASON_REVERSAL
+                self._close(ts_ns[i], close[i], reason, fill(i))
+            elif e in (EVT_CALL, EVT_REV_CALL):
+                self.open = (ts_ns[i], close[i], 1, fill(i))
+            elif e in (EVT_PUT, EVT_REV_PUT):
+                self.open = (ts_ns[i], close[i], -1, fill(i))
+        if n:
+            self.last = (ts_ns[-1], close[-1])
+
+    def finish(self, position):
+        if self.open is not None and position != 0:
+            self._close(*self.last, REASON_CLEAR)
+        return TradeLedger(*(self.rows[f] for f in TradeLedger.FIELDS))
+
+def backtest_ledger(df, strategy, calendar, masks=None):
+    # 向量化回测直接出台账，返回 (台账, 常规时段分钟数)；strategy 为 strategy.Strategy
+    active, near_close = session_masks(df.index, calendar)
+    events, position = strategy.run(df, active, near_close, masks=masks)
+    ledger = TradeLedger.from_events(events, position, df.index.as_unit("ns").asi8,
+                                     np.asarray(df['Close'], dtype=np.float64), np.asarray(df['Open'], dtype=np.float64))
+    return ledger, int(active.sum())
+
+# ==== 统计 ====
+def compute_metrics(ledger, session_minutes=None, pnl=None):
+    # pnl 默认是台账的信号价盈亏；成交模拟后传 execution.Fills.pnl
+    pnl = ledger.pnl if pnl is None else pnl
+    n = len(pnl)
+    held_min = (ledger.exit_ts - ledger.entry_ts) / 60e9
+    equity = np.cumsum(pnl)
+    peak = np.maximum.accumulate(np.concatenate(([0.0], equity)))[1:]
+    wins, losses = pnl[pnl > 0], pnl[pnl < 0]
+    metrics = {
+        "trades": n,
+        "win_rate": float(len(wins) / n) if n else np.nan,
+        "total_pnl": float(pnl.sum()),
+        "expectancy": float(pnl.mean()) if n else np.nan,
+        "avg_win": float(wins.mean()) if len(wins) else np.nan,
+        "avg_loss": float(losses.mean()) if len(losses) else np.nan,
+        "max_drawdown": float((equity - peak).min()) if n else 0.0,
+        "exposure_minutes": float(held_min.sum()),
+        "avg_hold_minutes": float(held_min.mean()) if n else np.nan,
+        "calls": int((ledger.side > 0).sum()),
+        "puts": int((ledger.side < 0).sum()),
+    }
+    if session_minutes:
+        metrics["exposure"] = metrics["exposure_minutes"] / session_minutes
+    return metrics
+
+def format_metrics(m):
+    lines = [f"交易笔数：{m['trades']}（Call {m['calls']} / Put {m['puts']}）",
+             f"胜率：{m['win_rate']:.1%}" if m['trades'] else "胜率：-",
+             f"总盈亏：{m['total_pnl']:.2f}  期望：{m['expectancy']:.4f}" if m['trades'] else f"总盈亏：{m['total_pnl']:.2f}",
+             f"最大回撤：{m['max_drawdown']:.2f}",
+             f"持仓时间：{m['exposure_minutes']:.0f} 分钟"
+             + (f"（{m['exposure']:.1%}）" if 'exposure' in m else "")]
+    return "\n".join(lines)